@@ -0,0 +1,48 @@
+import tempfile
+from pathlib import Path
+
+from popdbgen import GeoParquetSink, get_batched_households_population_gdf
+
+from .inputs import SEED, ban, filo
+
+
+class EndToEnd:
+    """
+    Generation of the households and population databases of synthetic territories, exported as GeoParquet.
+
+    The 1M tiles case (about half of Metropolitan France) takes hours: select the smaller cases with e.g.
+    `asv run --bench "EndToEnd.*10000"`.
+    """
+
+    params = [10_000, 100_000, 1_000_000]
+    param_names = ["nb_tiles"]
+    number = 1
+    repeat = 1
+    rounds = 1
+    warmup_time = 0
+    timeout = 24 * 3600
+
+    def setup(self, nb_tiles):
+        self.filo, self.ban = filo(nb_tiles), ban(nb_tiles)
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def teardown(self, nb_tiles):
+        self.tmpdir.cleanup()
+
+    def _generate(self):
+        output = Path(self.tmpdir.name)
+        with (
+            GeoParquetSink(output / "households.parquet") as hh_sink,
+            GeoParquetSink(output / "population.parquet") as pop_sink,
+        ):
+            for households, population in get_batched_households_population_gdf(
+                batch_size=100_000, filo_df=self.filo, ban_df=self.ban, seed=SEED, tile_aligned=True
+            ):
+                hh_sink.write(households)
+                pop_sink.write(population)
+
+    def time_generate(self, nb_tiles):
+        self._generate()
+
+    def peakmem_generate(self, nb_tiles):
+        self._generate()
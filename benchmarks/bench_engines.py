@@ -0,0 +1,52 @@
+from popdbgen import ENGINES, AddressIndex, generate_households
+
+from .inputs import SEED, ban, raw_filo
+
+
+class RefineEngines:
+    """
+    Refinement of the FILO by each generation engine, up to 1M tiles (about half of Metropolitan France).
+    The kernels of the numba engine are compiled in the setup.
+    """
+
+    params = [list(ENGINES), [100_000, 1_000_000]]
+    param_names = ["engine", "nb_tiles"]
+    number = 1
+    repeat = 1
+    timeout = 3600
+
+    def setup(self, engine, nb_tiles):
+        self.raw = raw_filo(nb_tiles)
+        self.refine = ENGINES[engine].refine
+        self.refine(raw_filo(10), SEED)
+
+    def time_refine(self, engine, nb_tiles):
+        self.refine(self.raw, SEED)
+
+
+class HouseholdsEngines:
+    """Generation of the households of 100k tiles by each generation engine."""
+
+    params = [list(ENGINES), [100_000]]
+    param_names = ["engine", "nb_tiles"]
+    number = 1
+    repeat = 1
+    timeout = 3600
+
+    def setup(self, engine, nb_tiles):
+        self.engine = ENGINES[engine]
+        self.filo = self.engine.refine(raw_filo(nb_tiles), SEED)
+        self.addresses = AddressIndex(ban(nb_tiles))
+        self._generate(self.filo.iloc[:10])
+
+    def _generate(self, filo):
+        for _ in generate_households(
+            filo_df=filo,
+            ban_df=self.addresses,
+            tile_households_generator=self.engine.tile_households_generator,
+            seed=SEED,
+        ):
+            pass
+
+    def time_generate_households(self, engine, nb_tiles):
+        self._generate(self.filo)
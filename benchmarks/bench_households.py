@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from popdbgen.households_gen import (
+    AddressIndex,
+    draw_addresses,
+    generate_household_sizes,
+    generate_households,
+    generate_population,
+    get_households_with_ages,
+)
+from popdbgen.utils import mkHouseholdsDataFrame, mkPopulationDataFrame
+
+from .inputs import SEED, ban, filo
+
+NB_TILES = 1000
+
+
+class TileFunctions:
+    """Per tile steps of the households generation, on 1000 tiles."""
+
+    def setup(self):
+        self.tiles = [s for _, s in filo(NB_TILES).iterrows()]
+        tiled_ban = ban(NB_TILES).groupby("tile_id")
+        self.addresses = [
+            tiled_ban.get_group(s.tile_id).reset_index(drop=True)
+            if s.tile_id in tiled_ban.groups
+            else pd.DataFrame(columns=["x", "y"])
+            for s in self.tiles
+        ]
+        # Addresses weighted by a number of dwellings, drawn with the alias tables of the index
+        weighted_ban = ban(NB_TILES).assign(dwellings=np.random.default_rng(SEED).integers(1, 50, len(ban(NB_TILES))))
+        weighted_index = AddressIndex(weighted_ban, weights="dwellings")
+        self.weighted_addresses = [weighted_index(s.tile_id) for s in self.tiles]
+        self.rng = np.random.default_rng(SEED)
+
+    def time_generate_household_sizes(self):
+        for s in self.tiles:
+            generate_household_sizes(s, self.rng)
+
+    def time_get_households_with_ages(self):
+        for s in self.tiles:
+            get_households_with_ages(s, self.rng)
+
+    def time_draw_addresses(self):
+        for s, addresses in zip(self.tiles, self.addresses, strict=True):
+            draw_addresses(s, addresses, "METRO", self.rng)
+
+    def time_draw_weighted_addresses(self):
+        for s, addresses in zip(self.tiles, self.weighted_addresses, strict=True):
+            draw_addresses(s, addresses, "METRO", self.rng)
+
+
+class Households:
+    """Generation of the households of 1000 tiles, of their individuals, and data frames construction."""
+
+    def setup(self):
+        self.households = list(generate_households(filo_df=filo(NB_TILES), ban_df=ban(NB_TILES), seed=SEED))
+        self.population = [ind for hh in self.households for ind in generate_population(hh, SEED)]
+
+    def time_generate_households(self):
+        for _ in generate_households(filo_df=filo(NB_TILES), ban_df=ban(NB_TILES), seed=SEED):
+            pass
+
+    def time_generate_population(self):
+        for hh in self.households:
+            for _ in generate_population(hh, SEED):
+                pass
+
+    def time_mkHouseholdsDataFrame(self):
+        mkHouseholdsDataFrame(self.households, "METRO")
+
+    def time_mkPopulationDataFrame(self):
+        mkPopulationDataFrame(self.population, "METRO")
+
+    def peakmem_mkPopulationDataFrame(self):
+        mkPopulationDataFrame(self.population, "METRO")
+
+    def time_mkPopulationDataFrame_integer_ids(self):
+        mkPopulationDataFrame(self.population, "METRO", id_format="integer")
+
+    def peakmem_mkPopulationDataFrame_integer_ids(self):
+        mkPopulationDataFrame(self.population, "METRO", id_format="integer")
+
+
+class AddressIndexes:
+    """
+    Index of the addresses of 100k tiles, each address being repeated 1 to 4 times (several numbers of a building),
+    with or without compaction of the addresses sharing the same coordinates.
+    """
+
+    params = [False, True]
+    param_names = ["compact"]
+    timeout = 600
+
+    def setup(self, compact):
+        addresses = ban(100_000)
+        self.ban = addresses.loc[addresses.index.repeat(np.random.default_rng(SEED).integers(1, 5, len(addresses)))]
+
+    def time_AddressIndex(self, compact):
+        AddressIndex(self.ban, compact=compact)
+
+    def peakmem_AddressIndex(self, compact):
+        AddressIndex(self.ban, compact=compact)
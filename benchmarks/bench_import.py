@@ -0,0 +1,24 @@
+"""
+Import time of the package and of some of its attributes, each measured in a fresh interpreter:
+the heavy dependencies (pandas, geopandas...) must only be imported when the generation needs them.
+"""
+
+
+def timeraw_import_popdbgen():
+    return "import popdbgen"
+
+
+def timeraw_import_territory_code():
+    return "from popdbgen import territory_code"
+
+
+def timeraw_import_download_BAN():
+    return "from popdbgen import DATA_DIR, download_BAN"
+
+
+def timeraw_import_download_FILO():
+    return "from popdbgen import DATA_DIR, download_extract_FILO"
+
+
+def timeraw_import_generation():
+    return "from popdbgen import get_batched_households_population_gdf"
@@ -0,0 +1,33 @@
+import numpy as np
+
+from popdbgen import refine_FILO
+from popdbgen.download_filo import refine_FILO_tile
+
+from .inputs import SEED, raw_filo
+
+
+class RefineFILOTile:
+    """Refinement of 1000 tiles, one by one."""
+
+    def setup(self):
+        self.tiles = [s for _, s in raw_filo(1000).iterrows()]
+        self.rng = np.random.default_rng(SEED)
+
+    def time_refine_FILO_tile(self):
+        for s in self.tiles:
+            refine_FILO_tile(s, self.rng)
+
+
+class RefineFILO:
+    params = [1_000, 10_000]
+    param_names = ["nb_tiles"]
+    timeout = 600
+
+    def setup(self, nb_tiles):
+        self.raw = raw_filo(nb_tiles)
+
+    def time_refine_FILO(self, nb_tiles):
+        refine_FILO(self.raw, seed=SEED)
+
+    def peakmem_refine_FILO(self, nb_tiles):
+        refine_FILO(self.raw, seed=SEED)
@@ -0,0 +1,45 @@
+import tempfile
+from pathlib import Path
+
+from popdbgen import GeoJSONSeqSink, GeoPackageSink, GeoParquetSink, get_households_population_gdf
+
+from .inputs import SEED, ban, filo
+
+NB_TILES = 2000
+
+
+class Writers:
+    """Export of the households and population of 2000 tiles, in 4 batches."""
+
+    params = ["gpkg", "parquet", "geojsons"]
+    param_names = ["format"]
+    timeout = 600
+
+    def setup_cache(self):
+        return get_households_population_gdf(filo_df=filo(NB_TILES), ban_df=ban(NB_TILES), seed=SEED)
+
+    def setup(self, databases, fmt):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def teardown(self, databases, fmt):
+        self.tmpdir.cleanup()
+
+    def _sink(self, fmt, name):
+        path = Path(self.tmpdir.name) / f"{name}.{fmt}"
+        if fmt == "gpkg":
+            return GeoPackageSink(path, layer=name)
+        if fmt == "parquet":
+            return GeoParquetSink(path)
+        return GeoJSONSeqSink(path)
+
+    def _write(self, databases, fmt):
+        for name, gdf in zip(["households", "population"], databases, strict=True):
+            with self._sink(fmt, name) as sink:
+                for i in range(4):
+                    sink.write(gdf.iloc[i * len(gdf) // 4 : (i + 1) * len(gdf) // 4])
+
+    def time_write(self, databases, fmt):
+        self._write(databases, fmt)
+
+    def peakmem_write(self, databases, fmt):
+        self._write(databases, fmt)
@@ -0,0 +1,26 @@
+"""Synthetic inputs shared by the benchmarks (no download needed)."""
+
+from functools import cache
+
+import geopandas as gpd
+import pandas as pd
+
+from popdbgen import refine_FILO
+from popdbgen.synthetic import synthetic_BAN, synthetic_raw_FILO
+
+SEED = 1703
+
+
+@cache
+def raw_filo(nb_tiles: int) -> gpd.GeoDataFrame:
+    return synthetic_raw_FILO(nb_tiles, seed=SEED)
+
+
+@cache
+def filo(nb_tiles: int) -> gpd.GeoDataFrame:
+    return refine_FILO(raw_filo(nb_tiles), seed=SEED)
+
+
+@cache
+def ban(nb_tiles: int) -> pd.DataFrame:
+    return synthetic_BAN(raw_filo(nb_tiles), seed=SEED)
@@ -1,89 +1,212 @@
 # from .build_population import generate_individuals
-from .download_ban import download_BAN, get_BAN_URL, load_BAN
-from .download_filo import (
-    ADULT_AGE_COLUMNS,
-    ALL_AGE_COLUMNS,
-    MINOR_AGE_COLUMNS,
-    download_extract_FILO,
-    get_FILO_filename,
-    load_FILO,
-    load_raw_FILO,
-    refine_FILO,
-)
-from .households_gen import (
-    generate_batched_households,
-    generate_households,
-    get_batched_households_gdf,
-    get_batched_households_population_gdf,
-    get_batched_population_gdf,
-    get_households_gdf,
-    get_households_population_gdf,
-    get_population_gdf,
-)
-from .metadata import (
-    HouseholdsFeature,
-    PopulationFeature,
-    households_dtype,
-    households_gpkg_schema,
-    population_dtype,
-    population_gpkg_schema,
-    save_households_metadata,
-    save_population_metadata,
-)
-from .utils import (
-    DATA_DIR,
-    PROJECT_DIR,
-    TerritoryCode,
-    filo_crs,
-    filo_epsg,
-    round_alea,
-    territory_code,
-    territory_crs,
-    territory_epsg,
-)
+# The attributes of the package are imported from its submodules on first access (see `lazy_attributes`),
+# so that importing popdbgen (e.g. for a light helper or the command line parsing of a script)
+# does not import pandas, geopandas and the other heavy dependencies of the generation.
+from typing import TYPE_CHECKING
 
-__all__ = [
-    # metadata
-    "HouseholdsFeature",
-    "PopulationFeature",
-    "households_dtype",
-    "population_dtype",
-    "households_gpkg_schema",
-    "population_gpkg_schema",
-    "save_population_metadata",
-    "save_households_metadata",
-    # utils
-    "DATA_DIR",
-    "PROJECT_DIR",
-    "TerritoryCode",
-    "territory_code",
-    "filo_epsg",
-    "filo_crs",
-    "territory_epsg",
-    "territory_crs",
-    "households_gpkg_schema",
-    "population_gpkg_schema",
-    "round_alea",
-    # download BAN data source
-    "download_BAN",
-    "get_BAN_URL",
-    "load_BAN",
-    # download FILO data source
-    "get_FILO_filename",
-    "download_extract_FILO",
-    "refine_FILO",
-    "load_FILO",
-    "MINOR_AGE_COLUMNS",
-    "ADULT_AGE_COLUMNS",
-    "ALL_AGE_COLUMNS",
-    "load_raw_FILO",
-    # Households generation (merging FILO <-> BAN)
-    "generate_households",
-    "get_households_gdf",
-    "get_population_gdf",
-    "get_households_population_gdf",
-    "generate_batched_households",
-    "get_batched_households_gdf",
-    "get_batched_population_gdf",
-    "get_batched_households_population_gdf",
-]
+from .lazy_imports import lazy_attributes
+
+if TYPE_CHECKING:
+    from .area import area_mask, generate_area
+    from .batching import AdaptiveBatchSizer, current_rss, parse_memory_size, variable_batched
+    from .checkpoint import (
+        MANIFEST_FILENAME,
+        RunManifest,
+        checkpoint_dir,
+        load_inputs_checkpoint,
+        remove_inputs_checkpoint,
+        save_inputs_checkpoint,
+    )
+    from .download_ban import build_BAN_cache, download_BAN, get_BAN_URL, load_BAN, load_BAN_tiles
+    from .download_filo import (
+        ADULT_AGE_COLUMNS,
+        ALL_AGE_COLUMNS,
+        MINOR_AGE_COLUMNS,
+        download_extract_FILO,
+        get_FILO_filename,
+        load_FILO,
+        load_raw_FILO,
+        load_raw_FILO_area,
+        refine_FILO,
+    )
+    from .download_inputs import DownloadProgress, download_inputs
+    from .downloads import DOWNLOADS_MANIFEST_FILENAME, check_file, download_file, read_downloads_manifest
+    from .equivalence import (
+        ENGINES,
+        ChiSquareTest,
+        EquivalenceReport,
+        GenerationEngine,
+        compare_engines,
+        households_invariant_violations,
+        tile_invariant_violations,
+    )
+    from .export import BatchSink, FlatGeobufSink, GeoJSONSeqSink, GeoPackageSink, GeoParquetSink, plain_categories
+    from .households_gen import (
+        AddressIndex,
+        TileBatch,
+        compact_addresses,
+        generate_batched_households,
+        generate_households,
+        generate_tile_batches,
+        generate_tiles_households,
+        get_batched_households_gdf,
+        get_batched_households_population_gdf,
+        get_batched_population_gdf,
+        get_households_gdf,
+        get_households_population_gdf,
+        get_population_gdf,
+        load_inputs,
+    )
+    from .incremental import PartitionedOutputManifest, generate_incremental, partition_keys, tile_fingerprints
+    from .instrumentation import Instrumentation, count, stage
+    from .jit import NUMBA_AVAILABLE, alias_tables, generate_tile_households_jit, refine_FILO_jit
+    from .lazy_population import (
+        PopulationRecipe,
+        households_features,
+        load_population,
+        read_population,
+        recipe_path,
+    )
+    from .metadata import (
+        HouseholdsFeature,
+        IdFormat,
+        PopulationFeature,
+        SchemaProfile,
+        compact_households_dtype,
+        compact_population_dtype,
+        households_dtype,
+        households_dtypes,
+        households_gpkg_schema,
+        population_dtype,
+        population_dtypes,
+        population_gpkg_schema,
+        save_households_metadata,
+        save_population_metadata,
+    )
+    from .server import SyntheticTiles, SyntheticTilesServer, TilesLRUCache, serve
+    from .synthetic import synthetic_BAN, synthetic_raw_FILO, synthetic_raw_FILO_chunks, write_synthetic_inputs
+    from .tiling import VectorTilesBuilder, VectorTilesSink
+    from .utils import (
+        DATA_DIR,
+        PROJECT_DIR,
+        TerritoryCode,
+        filo_crs,
+        filo_epsg,
+        household_id,
+        individual_id,
+        keyed_random,
+        render_ids,
+        resolve_seed,
+        round_alea,
+        territory_code,
+        territory_crs,
+        territory_epsg,
+        tile_key,
+        tile_keys,
+        tile_rng,
+        unpack_household_ids,
+        unpack_individual_ids,
+    )
+    from .validation import ValidationReport, read_columns, run_tile_keys, validate_households, validate_population
+
+_submodules_attributes: dict[str, list[str]] = {
+    "area": ["area_mask", "generate_area"],
+    "batching": ["AdaptiveBatchSizer", "current_rss", "parse_memory_size", "variable_batched"],
+    "checkpoint": [
+        "MANIFEST_FILENAME",
+        "RunManifest",
+        "checkpoint_dir",
+        "load_inputs_checkpoint",
+        "remove_inputs_checkpoint",
+        "save_inputs_checkpoint",
+    ],
+    "download_inputs": ["DownloadProgress", "download_inputs"],
+    "downloads": ["DOWNLOADS_MANIFEST_FILENAME", "check_file", "download_file", "read_downloads_manifest"],
+    "download_ban": ["build_BAN_cache", "download_BAN", "get_BAN_URL", "load_BAN", "load_BAN_tiles"],
+    "download_filo": [
+        "ADULT_AGE_COLUMNS",
+        "ALL_AGE_COLUMNS",
+        "MINOR_AGE_COLUMNS",
+        "download_extract_FILO",
+        "get_FILO_filename",
+        "load_FILO",
+        "load_raw_FILO",
+        "load_raw_FILO_area",
+        "refine_FILO",
+    ],
+    "equivalence": [
+        "ENGINES",
+        "ChiSquareTest",
+        "EquivalenceReport",
+        "GenerationEngine",
+        "compare_engines",
+        "households_invariant_violations",
+        "tile_invariant_violations",
+    ],
+    "export": ["BatchSink", "FlatGeobufSink", "GeoJSONSeqSink", "GeoPackageSink", "GeoParquetSink", "plain_categories"],
+    "households_gen": [
+        "AddressIndex",
+        "TileBatch",
+        "compact_addresses",
+        "generate_batched_households",
+        "generate_households",
+        "generate_tile_batches",
+        "generate_tiles_households",
+        "get_batched_households_gdf",
+        "get_batched_households_population_gdf",
+        "get_batched_population_gdf",
+        "get_households_gdf",
+        "get_households_population_gdf",
+        "get_population_gdf",
+        "load_inputs",
+    ],
+    "incremental": ["PartitionedOutputManifest", "generate_incremental", "partition_keys", "tile_fingerprints"],
+    "instrumentation": ["Instrumentation", "count", "stage"],
+    "jit": ["NUMBA_AVAILABLE", "alias_tables", "generate_tile_households_jit", "refine_FILO_jit"],
+    "lazy_population": ["PopulationRecipe", "households_features", "load_population", "read_population", "recipe_path"],
+    "metadata": [
+        "HouseholdsFeature",
+        "IdFormat",
+        "PopulationFeature",
+        "SchemaProfile",
+        "compact_households_dtype",
+        "compact_population_dtype",
+        "households_dtype",
+        "households_dtypes",
+        "households_gpkg_schema",
+        "population_dtype",
+        "population_dtypes",
+        "population_gpkg_schema",
+        "save_households_metadata",
+        "save_population_metadata",
+    ],
+    "server": ["SyntheticTiles", "SyntheticTilesServer", "TilesLRUCache", "serve"],
+    "synthetic": ["synthetic_BAN", "synthetic_raw_FILO", "synthetic_raw_FILO_chunks", "write_synthetic_inputs"],
+    "tiling": ["VectorTilesBuilder", "VectorTilesSink"],
+    "utils": [
+        "DATA_DIR",
+        "PROJECT_DIR",
+        "TerritoryCode",
+        "filo_crs",
+        "filo_epsg",
+        "household_id",
+        "individual_id",
+        "keyed_random",
+        "render_ids",
+        "resolve_seed",
+        "round_alea",
+        "territory_code",
+        "territory_crs",
+        "territory_epsg",
+        "tile_key",
+        "tile_keys",
+        "tile_rng",
+        "unpack_household_ids",
+        "unpack_individual_ids",
+    ],
+    "validation": ["ValidationReport", "read_columns", "run_tile_keys", "validate_households", "validate_population"],
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _submodules_attributes)
+
+__all__ = [name for names in _submodules_attributes.values() for name in names]
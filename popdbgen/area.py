@@ -0,0 +1,83 @@
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+from .download_ban import load_BAN_tiles
+from .download_filo import load_raw_FILO_area, refine_FILO
+from .households_gen import get_households_population_gdf
+from .instrumentation import REFINE_FILO, stage
+from .metadata import IdFormat, SchemaProfile
+from .utils import DATA_DIR, filo_crs, mkHouseholdsDataFrame, mkPopulationDataFrame, resolve_seed, territory_code
+
+
+def area_mask(
+    territory: str | int = "METRO",
+    bbox: tuple[float, float, float, float] | None = None,
+    polygon: BaseGeometry | None = None,
+    crs: str = "EPSG:4326",
+) -> BaseGeometry | None:
+    """
+    Returns the geometry of an area (a bounding box `(xmin, ymin, xmax, ymax)` and/or a polygon, in `crs`)
+    projected in the CRS of the FILO of the territory, or None if neither is given.
+    """
+    geometries = ([shapely.box(*bbox)] if bbox is not None else []) + ([polygon] if polygon is not None else [])
+    if not geometries:
+        return None
+    area = shapely.intersection_all(geometries)
+    return gpd.GeoSeries([area], crs=crs).to_crs(filo_crs(territory_code(territory))).iloc[0]
+
+
+def generate_area(
+    territory: str | int = "METRO",
+    bbox: tuple[float, float, float, float] | None = None,
+    polygon: BaseGeometry | None = None,
+    tiles: Iterable[str] | None = None,
+    crs: str = "EPSG:4326",
+    dataDir: Path = DATA_DIR,
+    seed: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """
+    Generates the households and the population of the FILO tiles of an area only, without loading
+    the whole FILO and BAN: the tiles are read through the spatial index of the FILO GeoPackage
+    and their addresses from the BAN cache (see `load_raw_FILO_area` and `load_BAN_tiles`).
+    Each tile having its own random streams, derived from the seed, the result is identical to the rows
+    of the same tiles in a national generation with the same seed, profile and identifiers format.
+
+    Args:
+        territory (str | int): territory of the area: 'METRO' (default), '974' or '972'
+        bbox (tuple[float, float, float, float], optional): bounding box (xmin, ymin, xmax, ymax) of the area, in `crs`
+        polygon (BaseGeometry, optional): (multi)polygon of the area, in `crs`
+        tiles (Iterable[str], optional): identifiers of the FILO tiles of the area
+        crs (str): CRS of `bbox` and `polygon` (WGS 84 by default)
+        dataDir (Path): data folder of the FILO and BAN files
+        seed (int, optional): seed of the generation, drawn from numpy's global random state if omitted
+        profile (SchemaProfile): column types of the generated data frames (see `households_dtypes`)
+        id_format (IdFormat): "string" or "integer" identifiers
+
+    Returns:
+        tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]: households and population of the tiles of the area
+    """
+    if bbox is None and polygon is None and tiles is None:
+        raise ValueError("An area (bounding box, polygon or list of tiles) is required")
+    terr_code = territory_code(territory)
+    seed = resolve_seed(seed)
+    mask = area_mask(terr_code, bbox=bbox, polygon=polygon, crs=crs)
+    raw_filo = load_raw_FILO_area(terr_code, dataDir, mask=mask, tiles=tiles)
+    logging.info(f"{len(raw_filo)} FILO tiles in the area")
+    if raw_filo.empty:
+        return (
+            mkHouseholdsDataFrame([], terr_code, profile, id_format),
+            mkPopulationDataFrame([], terr_code, profile, id_format),
+        )
+    with stage(REFINE_FILO):
+        filo = refine_FILO(raw_filo, seed=seed)
+    ban = load_BAN_tiles(terr_code, dataDir, filo["tile_id"])
+    return get_households_population_gdf(
+        territory=terr_code, filo_df=filo, ban_df=ban, seed=seed, profile=profile, id_format=id_format
+    )
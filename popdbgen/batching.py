@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_SIZE_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def parse_memory_size(size: str) -> int:
+    """
+    Parses a memory size such as "8G", "512M" or "1.5GB" into a number of bytes.
+    """
+    value = size.strip().upper().removesuffix("B").removesuffix("I")
+    unit = value[-1] if value and value[-1] in _SIZE_UNITS else ""
+    return int(float(value.removesuffix(unit)) * _SIZE_UNITS[unit])
+
+
+def current_rss() -> int:
+    """
+    Returns the resident set size of the process in bytes (its peak value on non-Linux systems,
+    0 where it cannot be measured, e.g. on Windows).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def dataframe_bytes(df: pd.DataFrame) -> int:
+    """Memory used by a data frame, including the content of its object and string columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class AdaptiveBatchSizer:
+    """
+    Chooses the number of households of the next batch so that the memory used by the generation
+    stays under a budget, while keeping batches as large as possible for throughput.
+
+    The memory needed by a batch is estimated from the batches already produced: their bytes per household
+    and bytes per individual (each smoothed over the batches), and the number of individuals of the households
+    of the next batch, multiplied by an overhead factor accounting for the intermediate copies (features
+    dictionaries, data frames, export buffers). The individuals of the next households are expected from the
+    numbers of `households` and `individuals` of the upcoming tiles (e.g. the `men` and `ind` columns of
+    the FILO, in generation order), or from the individuals per household measured so far if they are omitted.
+    The budget left for a batch is the budget minus the memory used before the generation started
+    (FILO and BAN databases), and is reduced when the process resident set size exceeds the budget.
+
+    The sizer is called (without argument) to get the size of the next batch.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int,
+        initial_size: int = 10_000,
+        min_size: int = 100,
+        max_size: int = 10_000_000,
+        overhead: float = 4.0,
+        smoothing: float = 0.5,
+        households: np.ndarray | None = None,
+        individuals: np.ndarray | None = None,
+        start_household: int = 0,
+    ):
+        self.memory_budget = memory_budget
+        self.min_size = min_size
+        self.max_size = max_size
+        self.overhead = overhead
+        self.smoothing = smoothing
+        self.baseline = current_rss()
+        if self.baseline >= memory_budget:
+            logging.warning(f"Memory budget ({memory_budget} bytes) already exceeded before generation")
+        self.size = max(min_size, min(initial_size, max_size))
+        self.bytes_per_household: float | None = None
+        self.bytes_per_individual: float | None = None
+        # Position of the next household, and numbers of households and individuals of the batches measured so far
+        self.position = start_household
+        self.nb_households = 0
+        self.nb_individuals = 0
+        self._cumulated: tuple[np.ndarray, np.ndarray] | None = None
+        if households is not None and individuals is not None:
+            households, individuals = np.asarray(households, dtype=np.float64), np.asarray(individuals, np.float64)
+            # Cumulated numbers of households and individuals at the end of each (non empty) tile
+            filled = households > 0
+            self._cumulated = (
+                np.r_[0.0, np.cumsum(households[filled])],
+                np.r_[0.0, np.cumsum(individuals[filled])],
+            )
+
+    def __call__(self) -> int:
+        return self.size
+
+    def _smoothed(self, previous: float | None, measured: float) -> float:
+        return measured if previous is None else self.smoothing * measured + (1 - self.smoothing) * previous
+
+    def _households_within(self, budget: float) -> float:
+        """Number of the next households whose households and individuals fit in `budget` bytes."""
+        per_household = self.bytes_per_household or 0.0
+        per_individual = self.bytes_per_individual or 0.0
+        if self._cumulated is None:
+            individuals_per_household = self.nb_individuals / self.nb_households
+            return budget / max(per_household + individuals_per_household * per_individual, 1e-9)
+        # Expected memory of the households up to the end of each tile, interpolated within tiles
+        households, individuals = self._cumulated
+        cost = per_household * households + per_individual * individuals
+        if cost[-1] <= 0:
+            return float(self.max_size)
+        used = np.interp(self.position, households, cost)
+        return float(np.interp(used + budget, cost, households, right=households[-1] + self.max_size)) - self.position
+
+    def update(
+        self, nb_households: int, households_bytes: int, nb_individuals: int = 0, individuals_bytes: int = 0
+    ) -> None:
+        """Records the memory used by a batch and computes the size of the next one."""
+        if nb_households == 0:
+            return
+        self.position += nb_households
+        self.nb_households += nb_households
+        self.nb_individuals += nb_individuals
+        self.bytes_per_household = self._smoothed(self.bytes_per_household, households_bytes / nb_households)
+        if nb_individuals > 0:
+            self.bytes_per_individual = self._smoothed(self.bytes_per_individual, individuals_bytes / nb_individuals)
+        available = self.memory_budget - self.baseline
+        rss = current_rss()
+        if rss > self.memory_budget:
+            available *= self.memory_budget / rss
+        size = int(self._households_within(max(available, 0) / self.overhead))
+        # Grows progressively, as the next batches may be denser than the measured ones
+        self.size = max(self.min_size, min(size, 2 * self.size, self.max_size))
+        logging.debug(
+            f"Next batch size: {self.size} households ({self.bytes_per_household:.0f} bytes per household,"
+            f" {self.bytes_per_individual or 0:.0f} bytes per individual, RSS {rss / 2**20:.0f} MiB)"
+        )
+
+
+def variable_batched[T](iterable: Iterable[T], batch_size: Callable[[], int]) -> Iterator[tuple[T, ...]]:
+    """Same as `itertools.batched`, with the size of each batch given by a function (e.g. a sizer)."""
+    iterator = iter(iterable)
+    while batch := tuple(islice(iterator, batch_size())):
+        yield batch
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import geopandas as gpd
+import pandas as pd
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def checkpoint_dir(territory: str, dataDir: Path) -> Path:
+    """
+    Returns the folder holding the checkpoints of the generation run of a territory.
+    """
+    return dataDir / f"checkpoint_{territory}"
+
+
+@dataclass
+class RunManifest:
+    """
+    State of a (possibly interrupted) generation run.
+
+    The manifest records the parameters of the run, the tile ranges whose households were committed
+    by each batch, and the state of every output sink after the last committed batch.
+    Since the generation of each tile only depends on the seed and the tile, a run resumed
+    from the manifest produces the same output as an uninterrupted one.
+    """
+
+    territory: str
+    seed: int
+    batch_size: int
+    nb_tiles: int
+    profile: str = "default"
+    id_format: str = "string"
+    engine: str = "legacy"
+    compact_addresses: bool = False
+    nb_households: int = 0
+    nb_individuals: int = 0
+    batches: list[dict[str, int]] = field(default_factory=list)
+    sinks: dict[str, dict[str, Any]] = field(default_factory=dict)
+    complete: bool = False
+
+    def commit_batch(self, first_tile: int, last_tile: int, nb_households: int, nb_individuals: int) -> None:
+        """Records a batch covering the tiles of positions `first_tile` to `last_tile` (included)."""
+        self.batches.append(
+            {
+                "first_tile": first_tile,
+                "last_tile": last_tile,
+                "nb_households": nb_households,
+                "nb_individuals": nb_individuals,
+            }
+        )
+        self.nb_households += nb_households
+        self.nb_individuals += nb_individuals
+
+    def save(self, path: Path) -> None:
+        """Atomically (over)writes the manifest file."""
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(self), file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RunManifest | None":
+        if not path.is_file():
+            return None
+        with open(path, encoding="utf-8") as file:
+            return cls(**json.load(file))
+
+
+def save_inputs_checkpoint(directory: Path, filo: gpd.GeoDataFrame, ban: pd.DataFrame) -> None:
+    """
+    Saves the refined FILO and the BAN, so that a resumed run does not need to reload and refine them.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, df in (("filo", filo.to_wkb()), ("ban", ban)):
+        tmp_path = directory / f"{name}.tmp"
+        df.to_parquet(tmp_path, engine="fastparquet")
+        os.replace(tmp_path, directory / f"{name}.parquet")
+
+
+def load_inputs_checkpoint(directory: Path, crs: str) -> tuple[gpd.GeoDataFrame, pd.DataFrame] | None:
+    """
+    Loads the refined FILO and the BAN saved by `save_inputs_checkpoint`, if any.
+    """
+    filo_path, ban_path = directory / "filo.parquet", directory / "ban.parquet"
+    if not (filo_path.is_file() and ban_path.is_file()):
+        return None
+    logging.info(f"Loading FILO and BAN from checkpoint {directory}")
+    filo = pd.read_parquet(filo_path, engine="fastparquet")
+    filo = gpd.GeoDataFrame(filo, geometry=gpd.GeoSeries.from_wkb(filo["geometry"], index=filo.index), crs=crs)
+    return filo, pd.read_parquet(ban_path, engine="fastparquet")
+
+
+def remove_inputs_checkpoint(directory: Path) -> None:
+    """
+    Removes the inputs saved by `save_inputs_checkpoint` once the run is complete.
+    """
+    for name in ("filo", "ban"):
+        (directory / f"{name}.parquet").unlink(missing_ok=True)
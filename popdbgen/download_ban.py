@@ -1,17 +1,35 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import logging
+import os
+from collections.abc import Callable, Iterable
 from pathlib import Path
-
-import numpy as np
-import pandas as pd
-import requests
-from pyproj import Transformer
-
-from .utils import DATA_DIR, TerritoryCode, filo_crs, filo_epsg, territory_code, territory_crs
+from typing import TYPE_CHECKING
+
+from .downloads import download_file
+from .instrumentation import LOAD_BAN, stage
+from .lazy_imports import lazy_module
+from .utils import DATA_DIR, TerritoryCode, filo_crs, filo_epsg, territory_code, territory_crs, tile_keys
+
+if TYPE_CHECKING:
+    import fastparquet
+    import numpy as np
+    import pandas as pd
+    import pyproj
+    import requests
+else:
+    fastparquet = lazy_module("fastparquet")
+    np = lazy_module("numpy")
+    pd = lazy_module("pandas")
+    pyproj = lazy_module("pyproj")
 
 # Template d'URL du fichier de la base d'adresses nationale (BAN)
 BAN_TEMPLATE_URL = "https://adresse.data.gouv.fr/data/ban/adresses/latest/csv/adresses-{}.csv.gz"
 BAN_FILENAME_TEMPLATE = "adresses-{}.csv.gz"
+# Addresses sorted by tile key, in row groups covering ranges of tiles (see `build_BAN_cache`)
+BAN_CACHE_FILENAME_TEMPLATE = "adresses-{}.tiles.parquet"
+BAN_CACHE_ROW_GROUP_SIZE = 50_000
 
 _BAN_territory_code = {
     "METRO": "france",
@@ -34,40 +52,29 @@ def get_BAN_filename(territory: str | int = "METRO", dataDir: Path = DATA_DIR) -
     return dataDir / BAN_FILENAME_TEMPLATE.format(_BAN_territory_code[territory_code(territory)])
 
 
-def download_BAN(territory: str | int = "METRO", dataDir: Path = DATA_DIR, overwriteIfExists: bool = False) -> Path:
+def download_BAN(
+    territory: str | int = "METRO",
+    dataDir: Path = DATA_DIR,
+    overwriteIfExists: bool = False,
+    session: requests.Session | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+) -> Path:
     """
-    Downloads the open data BAN file for argument territory.
+    Downloads the open data BAN file for argument territory (see `download_file`: an interrupted
+    download is resumed and a corrupted file is downloaded again). With `overwriteIfExists`,
+    an existing file is revalidated against the server and only downloaded again if it changed.
+    The `session` and `progress` arguments are passed to `download_file`.
     Returns the pathlib.Path to the saved file.
     """
-    logging.info("Downloading and extracting BAN file...")
-
-    if not dataDir.exists():
-        logging.info("Creating data folder")
-        dataDir.mkdir(exist_ok=True)
-
-    # Chemin complet du fichier à télécharger
-    file_path = get_BAN_filename(territory, dataDir)
-
-    if file_path.is_file():
-        if overwriteIfExists:
-            logging.info("Overwriting already existing data file")
-        else:
-            logging.info("Data file already exists, skipping download.")
-            return file_path
-
-    url = get_BAN_URL(territory)
-    logging.info(f"Downloading BAN data from {url}")
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(file_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        logging.info(f"File successfully downloaded and saved in {file_path}")
-    else:
-        error_msg = f"BAN download fail! Response status: {response.status_code}"
-        logging.error(error_msg)
-        raise ConnectionError(error_msg)
-    logging.info(f"BAN data successfully downloaded and saved in {file_path}")
+    logging.info("Downloading BAN file...")
+    file_path = download_file(
+        get_BAN_URL(territory),
+        get_BAN_filename(territory, dataDir),
+        refresh=overwriteIfExists,
+        session=session,
+        progress=progress,
+    )
+    logging.info(f"BAN data available in {file_path}")
     return file_path
 
 
@@ -76,20 +83,66 @@ def load_BAN(territory: str | int = "METRO", dataDir: Path = DATA_DIR, overwrite
     terr_code: TerritoryCode = territory_code(territory)
     ban_file = download_BAN(territory=terr_code, dataDir=dataDir, overwriteIfExists=overwriteIfExists)
 
-    ban = pd.read_csv(ban_file, sep=";", usecols=["x", "y"])
+    with stage(LOAD_BAN):
+        ban = pd.read_csv(ban_file, sep=";", usecols=["x", "y"])
 
-    transformer = Transformer.from_crs(territory_crs(terr_code), filo_crs(terr_code), always_xy=True)
-    x, y = transformer.transform(ban.x, ban.y)
+        transformer = pyproj.Transformer.from_crs(territory_crs(terr_code), filo_crs(terr_code), always_xy=True)
+        x, y = transformer.transform(ban.x, ban.y)
 
-    ban["tile_id"] = (
-        f"CRS{filo_epsg[terr_code]}RES200mN"
-        + (200 * np.floor(y / 200).astype(int)).astype(str)
-        + "E"
-        + (200 * np.floor(x / 200).astype(int)).astype(str)
-    )
+        ban["tile_id"] = (
+            f"CRS{filo_epsg[terr_code]}RES200mN"
+            + (200 * np.floor(y / 200).astype(int)).astype(str)
+            + "E"
+            + (200 * np.floor(x / 200).astype(int)).astype(str)
+        )
 
     return ban
 
 
+def build_BAN_cache(territory: str | int = "METRO", dataDir: Path = DATA_DIR, overwriteIfExists: bool = False) -> Path:
+    """
+    Writes the addresses of the BAN (as returned by `load_BAN`, with their tile keys) sorted by tile key
+    in a parquet file, whose row groups thus cover ranges of tiles: the addresses of some tiles can then
+    be read without parsing the whole BAN (see `load_BAN_tiles`). The cache is rebuilt if the BAN file is newer.
+    Returns the pathlib.Path to the cache file.
+    """
+    terr_code: TerritoryCode = territory_code(territory)
+    cache_path = dataDir / BAN_CACHE_FILENAME_TEMPLATE.format(_BAN_territory_code[terr_code])
+    ban_file = get_BAN_filename(terr_code, dataDir)
+    if (
+        cache_path.is_file()
+        and not overwriteIfExists
+        and (not ban_file.is_file() or ban_file.stat().st_mtime <= cache_path.stat().st_mtime)
+    ):
+        return cache_path
+    logging.info(f"Building the BAN cache {cache_path}...")
+    ban = load_BAN(territory=terr_code, dataDir=dataDir, overwriteIfExists=overwriteIfExists)
+    ban["tile_key"] = tile_keys(ban["tile_id"])
+    ban = ban.sort_values("tile_key", kind="stable", ignore_index=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    ban.to_parquet(tmp_path, engine="fastparquet", row_group_offsets=BAN_CACHE_ROW_GROUP_SIZE)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def load_BAN_tiles(
+    territory: str | int = "METRO", dataDir: Path = DATA_DIR, tile_ids: Iterable[str] = ()
+) -> pd.DataFrame:
+    """
+    Loads the addresses of some tiles (same columns as `load_BAN`) from the BAN cache (built if missing),
+    only reading the row groups whose range of tile keys contains one of the tiles.
+    """
+    keys = np.unique(tile_keys(pd.Series(list(tile_ids), dtype="string")))
+    cache_path = build_BAN_cache(territory=territory, dataDir=dataDir)
+    with stage(LOAD_BAN):
+        if len(keys) == 0:
+            ban = fastparquet.ParquetFile(cache_path).head(0)
+        else:
+            ban = fastparquet.ParquetFile(cache_path).to_pandas(filters=[("tile_key", "in", keys.tolist())])
+        ban = ban[ban["tile_key"].isin(keys)].drop(columns="tile_key").reset_index(drop=True)
+    return ban
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p")
     download_BAN()
@@ -1,24 +1,44 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import logging
+import shutil
+import tempfile
 import zipfile
-from pathlib import Path
-from typing import Any
-
-import geopandas as gpd
-import numpy as np
-import pandas as pd
-import py7zr
-import requests
+from collections.abc import Callable, Iterable
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Any
 
+from .downloads import DOWNLOAD_CHUNK_SIZE, check_file, download_file, forget_file, read_downloads_manifest, record_file
+from .instrumentation import LOAD_FILO, REFINE_FILO, stage
+from .lazy_imports import lazy_module
 from .utils import (
     ADULT_AGE_COLUMNS,
     ALL_AGE_COLUMNS,
     ALL_AGE_LITERAL,
     DATA_DIR,
     MINOR_AGE_COLUMNS,
+    REFINE_STREAM,
+    TILE_KEY_BITS,
+    resolve_seed,
     territory_code,
+    tile_keys,
+    tile_rng,
 )
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+    import numpy as np
+    import pandas as pd
+    import py7zr
+    import requests
+    from shapely.geometry.base import BaseGeometry
+else:
+    gpd = lazy_module("geopandas")
+    np = lazy_module("numpy")
+    pd = lazy_module("pandas")
+    py7zr = lazy_module("py7zr")
+
 # URL par défaut du fichier à télécharger
 FILO_URL: str = "https://www.insee.fr/fr/statistiques/fichier/7655475/Filosofi2019_carreaux_200m_gpkg.zip"
 HOUSEHOLD_IND_COLUMNS: list[str] = [
@@ -32,6 +52,16 @@ HOUSEHOLD_BAT_COLUMNS: list[str] = [
     "men_mais",  # Nombre de ménages en maison
 ]
 NUMERIC_COLUMNS: list[str] = ["ind_snv", "men_pauv"]
+# Integer counts of a refined tile, in the order of the output of `refine_FILO_tile`
+REFINED_COLUMNS: list[str] = [
+    "ind",
+    "men",
+    *ALL_AGE_COLUMNS,
+    "men_1ind",
+    "men_5ind",
+    "men_fmp",
+    *HOUSEHOLD_BAT_COLUMNS,
+]
 
 
 _FILO_territory_filename = {
@@ -48,7 +78,22 @@ def get_FILO_filename(territory: str | int = "METRO", dataDir: Path = DATA_DIR)
     return dataDir / _FILO_territory_filename[territory_code(territory)]
 
 
-def download_extract_FILO(dataDir: Path = DATA_DIR, overwriteIfExists: bool = False) -> None:
+def download_extract_FILO(
+    dataDir: Path = DATA_DIR,
+    overwriteIfExists: bool = False,
+    territories: Iterable[str | int] | None = None,
+    url: str = FILO_URL,
+    session: requests.Session | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+) -> None:
+    """
+    Downloads the FILO archive and extracts the GeoPackage files of some territories (all by default).
+    The archive is downloaded with `download_file` (resumed if interrupted), only the GeoPackage files
+    of the territories are extracted from the 7z archive it contains, and the intermediate archives
+    are deleted as soon as they are extracted. The extracted files are recorded with their checksums
+    in the downloads manifest of the data folder: a missing or corrupted file is extracted again.
+    The `session` and `progress` arguments are passed to `download_file`.
+    """
     logging.info("Downloading and extracting FILO resources...")
 
     if not dataDir.exists():
@@ -56,34 +101,45 @@ def download_extract_FILO(dataDir: Path = DATA_DIR, overwriteIfExists: bool = Fa
         dataDir.mkdir(exist_ok=True)
 
     # Chemin pour enregistrer le fichier zip téléchargé
-    zip_path: Path = dataDir / "carreaux_200m.7z"
-    # Chemin pour enregistrer le fichier 7z téléchargé
+    zip_path: Path = dataDir / "Filosofi2019_carreaux_200m_gpkg.zip"
+    # Chemin pour enregistrer le fichier 7z extrait du zip
     seven_zip_path = dataDir / "Filosofi2019_carreaux_200m_gpkg.7z"
 
-    # Check that the files were not already created
-    met_gpkg_zip_path = dataDir / get_FILO_filename()
-    if met_gpkg_zip_path.is_file():
-        if overwriteIfExists:
-            logging.info("Overwriting already existing data files")
-        else:
+    # Check that the files were not already created (and are not corrupted)
+    terr_codes = _FILO_territory_filename if territories is None else [territory_code(t) for t in territories]
+    gpkg_paths = list(dict.fromkeys(get_FILO_filename(t, dataDir=dataDir) for t in terr_codes))
+    if overwriteIfExists:
+        logging.info("Overwriting already existing data files")
+    else:
+        gpkg_paths = [path for path in gpkg_paths if not check_file(path)]
+        if not gpkg_paths:
             logging.info("Data files already exists, skipping download.")
             return
 
-    logging.info(f"Downloading data file from {FILO_URL}")
-    response = requests.get(FILO_URL)
-    with open(zip_path, "wb") as file:
-        file.write(response.content)
+    download_file(url, zip_path, refresh=overwriteIfExists, session=session, progress=progress)
+    archive = read_downloads_manifest(dataDir)[zip_path.name]
 
-    logging.info("Extracting from zip file")
+    logging.info("Extracting the 7z file from the zip file")
     with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        zip_ref.extractall(dataDir)
+        seven_zip_member = next(name for name in zip_ref.namelist() if name.endswith(".7z"))
+        with zip_ref.open(seven_zip_member) as source, open(seven_zip_path, "wb") as target:
+            shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
 
     logging.info("Removing zip file")
     zip_path.unlink()
+    forget_file(zip_path)
 
-    logging.info("Extracting from 7z file")
+    logging.info(f"Extracting {', '.join(path.name for path in gpkg_paths)} from the 7z file")
     with py7zr.SevenZipFile(seven_zip_path, mode="r") as z:
-        z.extractall(path=dataDir)
+        members = {PurePosixPath(name).name: name for name in z.getnames()}
+        missing = [path.name for path in gpkg_paths if path.name not in members]
+        if missing:
+            raise FileNotFoundError(f"Files missing from the FILO archive: {', '.join(missing)}")
+        with tempfile.TemporaryDirectory(dir=dataDir) as extract_dir:
+            z.extract(path=extract_dir, targets=[members[path.name] for path in gpkg_paths])
+            for path in gpkg_paths:
+                (Path(extract_dir) / members[path.name]).replace(path)
+                record_file(path, **{key: archive[key] for key in ("url", "etag", "last_modified") if key in archive})
 
     logging.info("Removing 7z file")
     seven_zip_path.unlink()
@@ -100,15 +156,16 @@ def divmod1(x: float) -> tuple[int, float]:
     return int(i), d
 
 
-def single_round_alea(x: float) -> int:
+def single_round_alea(x: float, rng: np.random.Generator) -> int:
     i, d = divmod1(x)
-    return i + (np.random.random() < d)
+    return i + (rng.random() < d)
 
 
-def refine_FILO_tile(s: pd.Series) -> dict[str, Any]:
+def refine_FILO_tile(s: pd.Series, rng: np.random.Generator | None = None) -> dict[str, Any]:
+    rng = np.random.default_rng() if rng is None else rng
     o: dict[str, Any] = {}
-    o["ind"] = max(1, single_round_alea(s.ind))
-    o["men"] = min(o["ind"], max(1, single_round_alea(s.men)))
+    o["ind"] = max(1, single_round_alea(s.ind, rng))
+    o["men"] = min(o["ind"], max(1, single_round_alea(s.men, rng)))
 
     bumps: dict[ALL_AGE_LITERAL, float] = {}
     for c in ALL_AGE_COLUMNS:
@@ -116,7 +173,7 @@ def refine_FILO_tile(s: pd.Series) -> dict[str, Any]:
         # Keep the rounded down value for now
         o[c] = i
         # A score for this column's likelihood to be bumped +1
-        bumps[c] = d * np.random.random()
+        bumps[c] = d * rng.random()
 
     age_adult = sum(int(o[k]) for k in ADULT_AGE_COLUMNS)
     missing_adults = o["men"] - age_adult
@@ -173,9 +230,7 @@ def refine_FILO_tile(s: pd.Series) -> dict[str, Any]:
         o["men_1ind"] += 1
         remain_men_1ind = 0
         # note: technically this "if" should be a "while"...
-    if (
-        o["men_5ind"] > 0 or 3 * (1 + o["men_1ind"]) <= 3 * o["men"] - o["ind"]
-    ) and np.random.random() < remain_men_1ind:
+    if (o["men_5ind"] > 0 or 3 * (1 + o["men_1ind"]) <= 3 * o["men"] - o["ind"]) and rng.random() < remain_men_1ind:
         # Otherwise, we do it only if
         # - it is acceptable with regard to c)
         # - we are "lucky enough" (proportionally to the remainder rem_men_1ind)
@@ -185,22 +240,43 @@ def refine_FILO_tile(s: pd.Series) -> dict[str, Any]:
         # If c) is not verified, then we must bump men_5ind
         o["men_5ind"] = 1
         remain_men_5ind = 0
-    if 3 * (1 + o["men_5ind"]) <= o["ind"] - 2 * o["men"] + o["men_1ind"] and np.random.random() < remain_men_5ind:
+    if 3 * (1 + o["men_5ind"]) <= o["ind"] - 2 * o["men"] + o["men_1ind"] and rng.random() < remain_men_5ind:
         # Otherwise, we do it only if
         # - it is acceptable with regard to b)
         # - we are "lucky enough" (proportionally to the remainder rem_men_5ind)
         o["men_5ind"] += 1
 
     for bat_col in HOUSEHOLD_BAT_COLUMNS:
-        o[bat_col] = min(o["men"], single_round_alea(s[bat_col]))
+        o[bat_col] = min(o["men"], single_round_alea(s[bat_col], rng))
 
     return o
 
 
-def refine_FILO(raw_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def refine_FILO(raw_gdf: gpd.GeoDataFrame, seed: int | None = None) -> gpd.GeoDataFrame:
+    """
+    Rounds the FILO counts to integers consistent with each other.
+    Each tile is refined with its own random generator (derived from the seed and the tile key),
+    so that the refinement of a tile does not depend on the rest of the input.
+    """
     logging.info("Refining FILO...")
+    seed = resolve_seed(seed)
+    keys = pd.Series(tile_keys(raw_gdf["idcar_200m"]), index=raw_gdf.index)
+    refined = raw_gdf.apply(
+        lambda s: refine_FILO_tile(s, tile_rng(seed, keys[s.name], REFINE_STREAM)), axis=1, result_type="expand"
+    ).astype(int)
+    gdf = assemble_refined_FILO(raw_gdf, refined, keys)
+    logging.info("FILO refinement done.")
+    return gdf
+
+
+def assemble_refined_FILO(raw_gdf: gpd.GeoDataFrame, refined: pd.DataFrame, keys: pd.Series) -> gpd.GeoDataFrame:
+    """
+    Builds the refined FILO from the raw FILO and the integer counts of its tiles (the `REFINED_COLUMNS`,
+    see `refine_FILO_tile`): adds the geometry and the numeric columns of the tiles, their numbers of minors
+    and adults, their identifiers and keys and the coordinates of their corners.
+    """
     gdf = gpd.GeoDataFrame(geometry=raw_gdf.geometry, index=raw_gdf.index)
-    gdf = gdf.join(raw_gdf.apply(refine_FILO_tile, axis=1, result_type="expand").astype(int))
+    gdf = gdf.join(refined)
     gdf[NUMERIC_COLUMNS] = raw_gdf[NUMERIC_COLUMNS]
     gdf["moins18"] = gdf[MINOR_AGE_COLUMNS].sum(axis=1)
     gdf["plus18"] = gdf[ADULT_AGE_COLUMNS].sum(axis=1)
@@ -213,28 +289,66 @@ def refine_FILO(raw_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
 
     # Coordonnées des points NE et SO - le point de référence est le point en bas à gauche
     gdf["tile_id"] = raw_gdf["idcar_200m"]
+    gdf["tile_key"] = keys
 
     e = gdf["tile_id"].str.extract("200mN(.*)E(.*)").astype(int)
     gdf["YSO"] = e[0]
     gdf["XSO"] = e[1]
     gdf["YNE"] = gdf["YSO"] + 200
     gdf["XNE"] = gdf["XSO"] + 200
-    logging.info("FILO refinement done.")
     return gdf
 
 
 def load_raw_FILO(territory: str | int = "METRO", dataDir: Path = DATA_DIR) -> gpd.GeoDataFrame:
-    download_extract_FILO()
     file_path = get_FILO_filename(territory, dataDir=dataDir)
+    if not file_path.is_file():
+        download_extract_FILO(dataDir=dataDir, territories=[territory])
     logging.info("Loading FILO data...")
     return gpd.read_file(file_path)
 
 
-def load_FILO(territory: str | int = "METRO", dataDir: Path = DATA_DIR) -> gpd.GeoDataFrame:
-    raw_filo: gpd.GeoDataFrame = load_raw_FILO(territory=territory, dataDir=dataDir)
-    refined_filo: gpd.GeoDataFrame = refine_FILO(raw_filo)
+def load_raw_FILO_area(
+    territory: str | int = "METRO",
+    dataDir: Path = DATA_DIR,
+    mask: BaseGeometry | None = None,
+    tiles: Iterable[str] | None = None,
+) -> gpd.GeoDataFrame:
+    """
+    Loads the FILO tiles intersecting `mask` (in the FILO CRS) and/or whose identifiers are listed in `tiles`.
+    Only the matching rows are read, using the spatial index of the FILO GeoPackage
+    (the tiles of a list being looked up in their bounding box), and they keep the order of the file.
+    """
+    file_path = get_FILO_filename(territory, dataDir=dataDir)
+    if not file_path.is_file():
+        download_extract_FILO(dataDir=dataDir, territories=[territory])
+    where, bbox = None, None
+    if tiles is not None:
+        tile_ids = pd.Series(list(tiles), dtype="string")
+        quoted_ids = ",".join("'" + tile_ids.str.replace("'", "''") + "'")
+        where = f"idcar_200m IN ({quoted_ids})" if len(tile_ids) else "0"
+        if mask is None and len(tile_ids):
+            keys = tile_keys(tile_ids)
+            north, east = keys >> TILE_KEY_BITS, keys & ((1 << TILE_KEY_BITS) - 1)
+            bbox = (200 * east.min(), 200 * north.min(), 200 * (east.max() + 1), 200 * (north.max() + 1))
+    logging.info("Loading FILO data of the area...")
+    with stage(LOAD_FILO):
+        raw_gdf = gpd.read_file(file_path, mask=mask, bbox=bbox, where=where, fid_as_index=True)
+    return raw_gdf.sort_index().reset_index(drop=True)
+
+
+def load_FILO(
+    territory: str | int = "METRO",
+    dataDir: Path = DATA_DIR,
+    seed: int | None = None,
+    refine_function: Callable[[gpd.GeoDataFrame, int | None], gpd.GeoDataFrame] = refine_FILO,
+) -> gpd.GeoDataFrame:
+    with stage(LOAD_FILO):
+        raw_filo: gpd.GeoDataFrame = load_raw_FILO(territory=territory, dataDir=dataDir)
+    with stage(REFINE_FILO):
+        refined_filo: gpd.GeoDataFrame = refine_function(raw_filo, seed)
     return refined_filo
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p")
     download_extract_FILO()
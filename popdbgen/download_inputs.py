@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import functools
+import logging
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO, get_args
+from urllib.parse import urlparse
+
+from .download_ban import download_BAN, get_BAN_URL
+from .download_filo import FILO_URL, download_extract_FILO
+from .lazy_imports import lazy_module
+from .utils import DATA_DIR, TerritoryCode, territory_code
+
+if TYPE_CHECKING:
+    import requests
+else:
+    requests = lazy_module("requests")
+
+DOWNLOAD_MAX_PER_HOST = 2
+
+
+class DownloadProgress:
+    """
+    Aggregate progress of concurrent downloads: number of completed downloads, downloaded and total sizes
+    and throughput. It is displayed on a single (rewritten) line when `stream` is a terminal,
+    and logged every `interval` seconds otherwise (e.g. when the logs are redirected to a file).
+    """
+
+    def __init__(self, interval: float = 10.0, stream: TextIO | None = None):
+        self.interval = interval
+        self.stream = sys.stderr if stream is None else stream
+        self._tty = self.stream.isatty()
+        self._files: dict[str, tuple[int, int | None]] = {}
+        self._done: set[str] = set()
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_display = 0.0
+
+    def add(self, name: str) -> Callable[[int, int | None], None]:
+        """
+        Registers a download and returns its `progress` callback (see `download_file`).
+        """
+        with self._lock:
+            self._files[name] = (0, None)
+
+        def update(size: int, total: int | None) -> None:
+            with self._lock:
+                self._files[name] = (size, total)
+                self._display()
+
+        return update
+
+    def finish(self, name: str) -> None:
+        """
+        Marks a download as completed (or failed).
+        """
+        with self._lock:
+            self._done.add(name)
+            self._display(force=True)
+
+    def summary(self) -> str:
+        downloaded = sum(size for size, _ in self._files.values())
+        totals = [total for _, total in self._files.values()]
+        size = f"{downloaded / 1e6:.1f} MB"
+        if all(total is not None for total in totals) and sum(totals) > 0:
+            size = f"{downloaded / 1e6:.1f}/{sum(totals) / 1e6:.1f} MB ({downloaded / sum(totals):.0%})"
+        rate = downloaded / 1e6 / max(time.perf_counter() - self._start, 1e-9)
+        return f"{len(self._done)}/{len(self._files)} downloads done, {size}, {rate:.1f} MB/s"
+
+    def _display(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_display < (0.2 if self._tty else self.interval):
+            return
+        self._last_display = now
+        if self._tty:
+            end = "\n" if len(self._done) == len(self._files) else ""
+            self.stream.write(f"\r{self.summary()}\033[K{end}")
+            self.stream.flush()
+        else:
+            logging.info(self.summary())
+
+
+def download_inputs(
+    territories: Iterable[str | int] = get_args(TerritoryCode),
+    dataDir: Path = DATA_DIR,
+    overwriteIfExists: bool = False,
+    filo: bool = True,
+    ban: bool = True,
+    max_per_host: int = DOWNLOAD_MAX_PER_HOST,
+    filo_url: str = FILO_URL,
+    progress: DownloadProgress | None = None,
+) -> None:
+    """
+    Downloads the inputs of some territories (all by default) concurrently: the FILO archive
+    (see `download_extract_FILO`) and the BAN file of each territory (see `download_BAN`).
+    The downloads share a session, whose connections are pooled and reused, and at most `max_per_host`
+    downloads run at the same time from each server. Their aggregate progress is displayed
+    (see `DownloadProgress`). Every download is carried out even if another one fails,
+    a ConnectionError listing the failed downloads being raised at the end.
+
+    Args:
+        territories (Iterable[str | int]): territories whose inputs are downloaded
+        dataDir (Path): data folder of the inputs
+        overwriteIfExists (bool): revalidate or download again the existing files (see `download_BAN`)
+        filo (bool): download the FILO archive and extract the files of the territories
+        ban (bool): download the BAN files of the territories
+        max_per_host (int): maximum number of simultaneous downloads from a server
+        filo_url (str): URL of the FILO archive
+        progress (DownloadProgress, optional): display of the aggregate progress
+    """
+    terr_codes = list(dict.fromkeys(territory_code(t) for t in territories))
+    jobs: dict[str, tuple[str, Callable[..., object]]] = {}
+    if filo:
+        jobs["FILO"] = (
+            filo_url,
+            functools.partial(download_extract_FILO, dataDir, overwriteIfExists, terr_codes, filo_url),
+        )
+    if ban:
+        for terr_code in terr_codes:
+            jobs[f"BAN {terr_code}"] = (
+                get_BAN_URL(terr_code),
+                functools.partial(download_BAN, terr_code, dataDir, overwriteIfExists),
+            )
+    if not jobs:
+        return
+    dataDir.mkdir(parents=True, exist_ok=True)
+    hosts = {urlparse(url).netloc for url, _ in jobs.values()}
+    host_slots = {host: threading.BoundedSemaphore(max_per_host) for host in hosts}
+    progress = DownloadProgress() if progress is None else progress
+    callbacks = {name: progress.add(name) for name in jobs}
+
+    def run(name: str, url: str, job: Callable[..., object], session: requests.Session) -> None:
+        with host_slots[urlparse(url).netloc]:
+            try:
+                job(session=session, progress=callbacks[name])
+            finally:
+                progress.finish(name)
+
+    logging.info(f"Downloading {', '.join(jobs)} ({max_per_host} simultaneous downloads per server)")
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(hosts), pool_maxsize=max_per_host)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="download") as executor:
+            futures = {name: executor.submit(run, name, url, job, session) for name, (url, job) in jobs.items()}
+    failures = []
+    for name, future in futures.items():
+        if future.exception() is not None:
+            logging.error(f"{name} download failed: {future.exception()}")
+            failures.append(name)
+    if failures:
+        raise ConnectionError(f"Failed downloads: {', '.join(failures)}")
+    logging.info(f"Inputs downloaded in {dataDir}: {progress.summary()}")
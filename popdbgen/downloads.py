@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .lazy_imports import lazy_module
+
+if TYPE_CHECKING:
+    import requests
+    import urllib3
+else:
+    requests = lazy_module("requests")
+    urllib3 = lazy_module("urllib3")
+
+# Sidecar manifest of the files downloaded in a data folder: {file name: entry}
+DOWNLOADS_MANIFEST_FILENAME = "downloads.json"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Suffix of the files being downloaded, renamed to their final name once complete
+PART_SUFFIX = ".part"
+
+# Serializes the updates of the manifests by the threads of a process
+_manifest_lock = threading.Lock()
+
+
+def downloads_manifest_path(dataDir: Path) -> Path:
+    """
+    Returns the path of the manifest of the files downloaded in a data folder.
+    """
+    return dataDir / DOWNLOADS_MANIFEST_FILENAME
+
+
+def read_downloads_manifest(dataDir: Path) -> dict[str, dict[str, Any]]:
+    """
+    Reads the manifest of the files downloaded in a data folder: for each file name, the URL it was
+    downloaded from, its validators (`etag`, `last_modified`), `size`, `sha256` checksum and `mtime_ns`.
+    The entries of the partial downloads (`<name>.part`) only hold the URL and the validators.
+    """
+    path = downloads_manifest_path(dataDir)
+    if not path.is_file():
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _update_downloads_manifest(dataDir: Path, entries: dict[str, dict[str, Any] | None]) -> None:
+    """
+    Atomically updates the entries of the manifest of a data folder (None removes an entry).
+    """
+    with _manifest_lock:
+        manifest = read_downloads_manifest(dataDir)
+        updated = {name: entry for name, entry in manifest.items() if entries.get(name, entry) is not None}
+        updated.update({name: entry for name, entry in entries.items() if entry is not None})
+        if updated == manifest:
+            return
+        manifest = updated
+        path = downloads_manifest_path(dataDir)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Returns the hexadecimal SHA-256 checksum of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(DOWNLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_file(path: Path, sha256: str | None = None, **metadata: Any) -> dict[str, Any]:
+    """
+    Records a file in the manifest of its folder, with its size, checksum (computed if not given),
+    modification time and some metadata (URL, validators...). Returns the entry of the file.
+    """
+    stat = path.stat()
+    entry = {
+        **metadata,
+        "size": stat.st_size,
+        "sha256": file_sha256(path) if sha256 is None else sha256,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    _update_downloads_manifest(path.parent, {path.name: entry})
+    return entry
+
+
+def forget_file(path: Path) -> None:
+    """
+    Removes a file (and its partial download) from the manifest of its folder.
+    """
+    _update_downloads_manifest(path.parent, {path.name: None, path.name + PART_SUFFIX: None})
+
+
+def check_file(path: Path, entry: dict[str, Any] | None = None) -> bool:
+    """
+    Checks that a file exists and matches the size and checksum recorded in the manifest of its folder
+    (`entry`, read from the manifest if not given). The checksum is only computed again if the file
+    was modified since it was recorded. Files missing from the manifest (not downloaded through
+    `download_file`, like synthetic inputs) are trusted.
+    """
+    if not path.is_file():
+        return False
+    if entry is None:
+        entry = read_downloads_manifest(path.parent).get(path.name)
+    if entry is None or "sha256" not in entry:
+        return True
+    stat = path.stat()
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry.get("mtime_ns"):
+        return True
+    if file_sha256(path) != entry["sha256"]:
+        return False
+    _update_downloads_manifest(path.parent, {path.name: {**entry, "mtime_ns": stat.st_mtime_ns}})
+    return True
+
+
+def _validators(headers: Any) -> dict[str, str]:
+    return {
+        key: headers[header]
+        for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+        if headers.get(header) is not None
+    }
+
+
+def download_file(
+    url: str,
+    file_path: Path,
+    refresh: bool = False,
+    sha256: str | None = None,
+    session: requests.Session | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+) -> Path:
+    """
+    Downloads a file, resumably, atomically and with integrity checks:
+    - the file is streamed to `<file_path>.part`, which is only renamed to `file_path` once complete,
+      so that an interrupted download never leaves a truncated file behind;
+    - an interrupted download is resumed with an HTTP Range request (with an If-Range validator
+      so that a file modified on the server is downloaded again from the start);
+    - the size, checksum and validators (ETag, Last-Modified) of the file are recorded in the manifest
+      of its folder (see `read_downloads_manifest`).
+
+    An existing file is kept if it matches the manifest (see `check_file`) and downloaded again otherwise.
+    With `refresh`, a file already downloaded is revalidated with a conditional request
+    (If-None-Match / If-Modified-Since), and only downloaded again if it changed on the server.
+
+    Args:
+        url (str): URL of the file
+        file_path (Path): path of the downloaded file
+        refresh (bool): revalidate an already downloaded file against the server
+        sha256 (str, optional): expected SHA-256 checksum of the file
+        session (requests.Session, optional): session whose pooled connections are used
+        progress (Callable[[int, int | None], None], optional): called after each chunk with the number
+            of bytes of the file downloaded so far (including a resumed part) and its size, if known
+
+    Returns:
+        Path: the path of the downloaded file
+    """
+    dataDir = file_path.parent
+    dataDir.mkdir(parents=True, exist_ok=True)
+    part_path = file_path.with_name(file_path.name + PART_SUFFIX)
+    manifest = read_downloads_manifest(dataDir)
+    entry, part_entry = manifest.get(file_path.name), manifest.get(part_path.name)
+
+    # The body is written as received (not decoded), so that its size and byte ranges are the ones of the file
+    headers: dict[str, str] = {"Accept-Encoding": "identity"}
+    if check_file(file_path, entry):
+        if not refresh:
+            logging.info(f"{file_path} already downloaded, skipping download.")
+            return file_path
+        if entry is not None and entry.get("url") == url:
+            if "etag" in entry:
+                headers["If-None-Match"] = entry["etag"]
+            if "last_modified" in entry:
+                headers["If-Modified-Since"] = entry["last_modified"]
+    elif file_path.is_file():
+        logging.warning(
+            f"{file_path} does not match its checksum in {DOWNLOADS_MANIFEST_FILENAME}, downloading it again"
+        )
+
+    offset = 0
+    if part_path.is_file() and part_entry is not None and part_entry.get("url") == url:
+        validator = part_entry.get("etag", part_entry.get("last_modified"))
+        if validator is not None and part_path.stat().st_size > 0:
+            offset = part_path.stat().st_size
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+
+    logging.info(f"Downloading {url}" + (f" (resuming after {offset} bytes)" if offset else ""))
+    with (requests if session is None else session).get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            logging.info(f"{file_path} is up to date")
+            return file_path
+        resumed = response.status_code == 206 and response.headers.get("Content-Range", "").startswith(
+            f"bytes {offset}-"
+        )
+        if offset and (response.status_code == 416 or (response.status_code == 206 and not resumed)):
+            # The partial file is not a prefix of the file on the server: downloaded again from the start
+            logging.info(f"Discarding the partial download {part_path}")
+            part_path.unlink()
+            _update_downloads_manifest(dataDir, {part_path.name: None})
+            return download_file(url, file_path, refresh=refresh, sha256=sha256, session=session, progress=progress)
+        if response.status_code not in (200, 206):
+            error_msg = f"Download of {url} failed! Response status: {response.status_code}"
+            logging.error(error_msg)
+            raise ConnectionError(error_msg)
+
+        digest = hashlib.sha256()
+        if resumed:
+            with open(part_path, "rb") as file:
+                while chunk := file.read(DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+            total = response.headers["Content-Range"].rpartition("/")[2]
+            expected_size = int(total) if total.isdigit() else None
+            mode = "ab"
+            validators = part_entry
+        else:
+            # Full response: the file changed on the server, or the server ignored the Range request
+            offset = 0
+            expected_size = int(response.headers["Content-Length"]) if "Content-Length" in response.headers else None
+            mode = "wb"
+            validators = {"url": url, **_validators(response.headers)}
+            _update_downloads_manifest(dataDir, {part_path.name: validators})
+
+        size = offset
+        with open(part_path, mode) as file:
+            # Raw bytes as served, the ranges applying to them (not to a decoded Content-Encoding)
+            try:
+                for chunk in response.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if progress is not None:
+                        progress(size, expected_size)
+            except (urllib3.exceptions.HTTPError, requests.RequestException) as e:
+                error_msg = f"Download of {url} interrupted after {size} bytes, run again to resume: {e}"
+                logging.error(error_msg)
+                raise ConnectionError(error_msg) from e
+            finally:
+                file.flush()
+                os.fsync(file.fileno())
+
+    if expected_size is not None and size != expected_size:
+        error_msg = f"Incomplete download of {url}: {size} bytes out of {expected_size}, run again to resume"
+        logging.error(error_msg)
+        raise ConnectionError(error_msg)
+    checksum = digest.hexdigest()
+    if sha256 is not None and checksum != sha256:
+        part_path.unlink()
+        forget_file(file_path)
+        raise ValueError(f"Checksum mismatch for {url}: {checksum} instead of {sha256}")
+    os.replace(part_path, file_path)
+    stat = file_path.stat()
+    _update_downloads_manifest(
+        dataDir,
+        {
+            file_path.name: {**validators, "size": stat.st_size, "sha256": checksum, "mtime_ns": stat.st_mtime_ns},
+            part_path.name: None,
+        },
+    )
+    logging.info(f"File successfully downloaded and saved in {file_path}")
+    return file_path
@@ -0,0 +1,330 @@
+import logging
+import math
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .download_filo import HOUSEHOLD_BAT_COLUMNS, refine_FILO
+from .households_gen import generate_households, generate_tile_households
+from .metadata import HouseholdsFeature
+from .utils import ADULT_AGE_COLUMNS, ALL_AGE_COLUMNS, MINOR_AGE_COLUMNS, TerritoryCode
+
+# Categories of the distributional tests
+MAX_SIZE = 8  # household sizes above are grouped
+MAX_COMPOSITION = 4  # numbers of adults and of minors above are grouped
+ROUNDING_COLUMNS = ["men", "men_1ind", "men_5ind", *HOUSEHOLD_BAT_COLUMNS, *ALL_AGE_COLUMNS]
+INCOME_BINS = np.linspace(0, 3, 31)  # share of the income of the tile, relative to an equal split between households
+MIN_EXPECTED = 10  # categories with less observations (in both engines) are grouped for the chi-square tests
+
+
+@dataclass
+class GenerationEngine:
+    """
+    Implementation of the steps of the generation: the refinement of the FILO counts
+    and the generation of the households of a tile (household sizes, age allocation, income split, addresses).
+    """
+
+    name: str
+    refine: Callable[[gpd.GeoDataFrame, int | None], gpd.GeoDataFrame] = refine_FILO
+    tile_households_generator: Callable[
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
+    ] = generate_tile_households
+
+
+# The kernels of the numba engine are imported on first use, so that selecting another engine does not load Numba
+def _refine_FILO_numba(raw_gdf: gpd.GeoDataFrame, seed: int | None = None) -> gpd.GeoDataFrame:
+    from .jit import refine_FILO_jit
+
+    return refine_FILO_jit(raw_gdf, seed)
+
+
+def _generate_tile_households_numba(
+    tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode, rng: np.random.Generator | None = None
+) -> Iterator[HouseholdsFeature]:
+    from .jit import generate_tile_households_jit
+
+    return generate_tile_households_jit(tile, addresses, territory, rng)
+
+
+# Engines that can be selected by name
+ENGINES: dict[str, GenerationEngine] = {
+    "legacy": GenerationEngine("legacy"),
+    # Numba-compiled kernels (plain Python without Numba), see popdbgen.jit
+    "numba": GenerationEngine(
+        "numba", refine=_refine_FILO_numba, tile_households_generator=_generate_tile_households_numba
+    ),
+}
+
+
+def _chi2_sf(x: float, dof: int) -> float:
+    """Survival function of the chi-square law (regularized upper incomplete gamma function Q(dof/2, x/2))."""
+    a, x = dof / 2, x / 2
+    if x <= 0:
+        return 1.0
+    log_prefactor = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series of the lower function P
+        term = total = 1 / a
+        n = 0
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / (a + n)
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+    # Continued fraction of Q (modified Lentz's method)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10_000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(log_prefactor) * h
+
+
+@dataclass
+class ChiSquareTest:
+    """Chi-square test of homogeneity of the distributions of a categorical variable in the outputs of two engines."""
+
+    name: str
+    statistic: float
+    dof: int
+    p_value: float
+
+    @classmethod
+    def compute(cls, name: str, counts_a: np.ndarray, counts_b: np.ndarray) -> "ChiSquareTest":
+        table = np.stack([counts_a.ravel(), counts_b.ravel()]).astype(float)
+        # Sparse categories are grouped together, so that the expected counts are large enough
+        sparse = table.sum(axis=0) < MIN_EXPECTED
+        table = np.column_stack([table[:, ~sparse], table[:, sparse].sum(axis=1)])
+        table = table[:, table.sum(axis=0) > 0]
+        if table.shape[1] < 2 or (table.sum(axis=1) == 0).any():
+            return cls(name, 0.0, 0, 1.0)
+        expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / table.sum()
+        statistic = float(((table - expected) ** 2 / expected).sum())
+        dof = table.shape[1] - 1
+        return cls(name, statistic, dof, _chi2_sf(statistic, dof))
+
+
+def tile_invariant_violations(raw_filo: pd.DataFrame, tiles: pd.DataFrame) -> dict[str, int]:
+    """
+    Counts the refined tiles violating the invariants of the refinement of the FILO counts (see `refine_FILO_tile`).
+
+    Args:
+        raw_filo (pd.DataFrame): raw FILO tiles
+        tiles (pd.DataFrame): same tiles, refined
+
+    Returns:
+        dict[str, int]: number of tiles violating each invariant
+    """
+    ind, men = tiles["ind"].to_numpy(), tiles["men"].to_numpy()
+    men_1ind, men_5ind = tiles["men_1ind"].to_numpy(), tiles["men_5ind"].to_numpy()
+    checks = {
+        "1 <= men <= ind": (men >= 1) & (men <= ind),
+        "ind rounded from FILO": np.abs(ind - raw_filo["ind"].to_numpy()) < 1,
+        "age classes sum to ind": tiles[ALL_AGE_COLUMNS].sum(axis=1).to_numpy() == ind,
+        "at least one adult per household": tiles[ADULT_AGE_COLUMNS].sum(axis=1).to_numpy() >= men,
+        "household counts <= men": (
+            tiles[["men_1ind", "men_5ind", *HOUSEHOLD_BAT_COLUMNS]].to_numpy() <= men[:, None]
+        ).all(axis=1),
+        "room for the households of 1 and 5+": men_1ind + men_5ind <= men,
+        "ind >= sizes lower bound": ind >= 2 * men + 3 * men_5ind - men_1ind,
+    }
+    return {name: int((~ok).sum()) for name, ok in checks.items()}
+
+
+def households_invariant_violations(tiles: pd.DataFrame, households: pd.DataFrame) -> dict[str, int]:
+    """
+    Counts the households, and the tiles, violating the invariants of the generation of households
+    (see `get_households_with_ages` and `generate_tile_households`). The totals of the tiles are aggregated
+    with `np.bincount` on the position of the tile of each household.
+
+    Args:
+        tiles (pd.DataFrame): refined FILO tiles (with `tile_id`)
+        households (pd.DataFrame): households generated for these tiles
+
+    Returns:
+        dict[str, int]: number of households or tiles violating each invariant
+    """
+    nb_tiles = len(tiles)
+    positions = pd.Categorical(households["TILE_ID"], categories=tiles["tile_id"]).codes
+    known = positions >= 0
+
+    def per_tile(weights: pd.Series | np.ndarray | None = None) -> np.ndarray:
+        if weights is not None:
+            weights = np.asarray(weights)[known]
+        return np.bincount(positions[known], weights=weights, minlength=nb_tiles)
+
+    size = households["SIZE"].to_numpy()
+    adults, minors = households["NB_ADULTS"].to_numpy(), households["NB_MINORS"].to_numpy()
+    checks = {
+        "household of a known tile": known,
+        "unique household ID": ~households["ID"].duplicated().to_numpy(),
+        "SIZE == NB_ADULTS + NB_MINORS": size == adults + minors,
+        "NB_ADULTS >= 1": adults >= 1,
+        "adult age classes sum to NB_ADULTS": households[ADULT_AGE_COLUMNS].sum(axis=1).to_numpy() == adults,
+        "minor age classes sum to NB_MINORS": households[MINOR_AGE_COLUMNS].sum(axis=1).to_numpy() == minors,
+        "GRD_MENAGE == (SIZE >= 5)": households["GRD_MENAGE"].to_numpy() == (size >= 5),
+        "MONOPARENT == single adult with minors": households["MONOPARENT"].to_numpy() == ((adults == 1) & (minors > 0)),
+        "tile: households count == men": per_tile() == tiles["men"].to_numpy(),
+        "tile: sizes sum to ind": per_tile(size) == tiles["ind"].to_numpy(),
+        "tile: age classes sum to FILO": np.all(
+            [per_tile(households[c]) == tiles[c].to_numpy() for c in ALL_AGE_COLUMNS], axis=0
+        ),
+        "tile: incomes sum to ind_snv": np.isclose(
+            per_tile(households["NIVEAU_VIE"] * size), tiles["ind_snv"].to_numpy(), rtol=1e-6
+        ),
+    }
+    return {name: int((~ok).sum()) for name, ok in checks.items()}
+
+
+def _distribution_counts(
+    raw_filo: pd.DataFrame, tiles: pd.DataFrame, households: pd.DataFrame
+) -> dict[str, np.ndarray]:
+    """Counts of the categories compared by the distributional tests."""
+    size = households["SIZE"].to_numpy()
+    size_class = np.minimum(size, 5) - 1
+    # Households (not individuals, which are dependent within a household) by size class and age class
+    # of their oldest member (age classes are sorted by age)
+    nb_ages = len(ALL_AGE_COLUMNS)
+    oldest = nb_ages - 1 - np.argmax(households[ALL_AGE_COLUMNS].to_numpy()[:, ::-1] > 0, axis=1)
+    age_by_size = np.bincount(size_class * nb_ages + oldest, minlength=5 * nb_ages).reshape(5, nb_ages)
+    composition = np.minimum(households["NB_ADULTS"], MAX_COMPOSITION) * (MAX_COMPOSITION + 1) + np.minimum(
+        households["NB_MINORS"], MAX_COMPOSITION
+    )
+    # Income of the first household of each tile relative to an equal split of the income of the tile
+    # (the shares of the households of a tile are dependent, so only one per tile is kept)
+    first = households[~households["TILE_ID"].duplicated()]
+    indexed_tiles = tiles.set_index("tile_id")
+    tile_income = first["TILE_ID"].map(indexed_tiles["ind_snv"] / indexed_tiles["men"])
+    income_share = (first["NIVEAU_VIE"] * first["SIZE"] / tile_income).to_numpy()
+    # Rounding of the FILO counts: refined count minus rounded down raw count
+    rounding = np.clip(tiles[ROUNDING_COLUMNS].to_numpy() - np.floor(raw_filo[ROUNDING_COLUMNS].to_numpy()), -2, 2) + 2
+    return {
+        "household size": np.bincount(np.minimum(size, MAX_SIZE), minlength=MAX_SIZE + 1),
+        "household composition (adults x minors)": np.bincount(composition, minlength=(MAX_COMPOSITION + 1) ** 2),
+        "oldest member's age class by household size": age_by_size,
+        "income split": np.histogram(np.minimum(income_share, INCOME_BINS[-1]), bins=INCOME_BINS)[0],
+        "rounding of FILO counts": np.stack([np.bincount(r.astype(int), minlength=5) for r in rounding.T]),
+    }
+
+
+@dataclass
+class EquivalenceReport:
+    """Results of the comparison of two engines by `compare_engines`."""
+
+    engines: tuple[str, str]
+    alpha: float
+    nb_tiles: int = 0
+    nb_households: list[int] = field(default_factory=lambda: [0, 0])
+    elapsed: float = 0.0
+    violations: list[dict[str, int]] = field(default_factory=lambda: [{}, {}])
+    tests: list[ChiSquareTest] = field(default_factory=list)
+
+    @property
+    def invariants_hold(self) -> bool:
+        return all(count == 0 for violations in self.violations for count in violations.values())
+
+    @property
+    def distributions_match(self) -> bool:
+        """No test rejects the homogeneity of the distributions (at level `alpha`, with Bonferroni's correction)."""
+        return all(test.p_value >= self.alpha / len(self.tests) for test in self.tests)
+
+    @property
+    def passed(self) -> bool:
+        return self.invariants_hold and self.distributions_match
+
+    def summary(self) -> str:
+        lines = [
+            f"Engines {self.engines[0]} and {self.engines[1]} compared on {self.nb_tiles} tiles"
+            f" ({self.nb_households[0]} and {self.nb_households[1]} households) in {self.elapsed:.1f}s:"
+            f" {'PASSED' if self.passed else 'FAILED'}"
+        ]
+        for engine, violations in zip(self.engines, self.violations, strict=True):
+            failed = {name: count for name, count in violations.items() if count}
+            lines.append(f"  invariants of {engine}: " + (f"VIOLATED {failed}" if failed else "ok"))
+        for test in self.tests:
+            lines.append(
+                f"  {test.name}: chi2 = {test.statistic:.2f}, dof = {test.dof}, p-value = {test.p_value:.4f}"
+                + ("" if test.p_value >= self.alpha / len(self.tests) else " REJECTED")
+            )
+        return "\n".join(lines)
+
+
+def compare_engines(
+    engine_a: GenerationEngine,
+    engine_b: GenerationEngine,
+    raw_filo: gpd.GeoDataFrame,
+    ban: pd.DataFrame,
+    territory: TerritoryCode = "METRO",
+    seed: int = 0,
+    time_budget: float = 60.0,
+    chunk_tiles: int = 500,
+    alpha: float = 0.01,
+) -> EquivalenceReport:
+    """
+    Runs two engines on the same FILO and BAN inputs, and checks that their outputs satisfy the exact invariants
+    of the generation and follow the same distributions (chi-square tests of homogeneity on the household sizes,
+    compositions and oldest members' age classes, the income split and the rounding of the FILO counts).
+
+    The tiles are processed by chunks, in a random order, until all of them are processed or the time budget
+    is exhausted. The engines use different seeds (`seed` and `seed + 1`), so that identical engines
+    pass the distributional tests with probability at least `1 - alpha` (the tests are conservative,
+    as both engines share the same input tiles).
+
+    Args:
+        engine_a (GenerationEngine): reference engine (e.g. `ENGINES["legacy"]`)
+        engine_b (GenerationEngine): engine to compare to the reference
+        raw_filo (gpd.GeoDataFrame): raw FILO database, as returned by `load_raw_FILO`
+        ban (pd.DataFrame): BAN database, as returned by `load_BAN`
+        territory (TerritoryCode): territory of the inputs
+        seed (int): seed of the comparison
+        time_budget (float): time budget of the comparison, in seconds
+        chunk_tiles (int): number of tiles processed at once
+        alpha (float): (family-wise) level of the distributional tests
+
+    Returns:
+        EquivalenceReport: invariant violations and tests results
+    """
+    start = time.perf_counter()
+    engines = (engine_a, engine_b)
+    report = EquivalenceReport(engines=(engine_a.name, engine_b.name), alpha=alpha)
+    counts: list[dict[str, np.ndarray]] = [{}, {}]
+    order = np.random.default_rng(seed).permutation(len(raw_filo))
+    tiled_ban = ban.set_index("tile_id")
+    for chunk_start in range(0, len(order), chunk_tiles):
+        raw_chunk = raw_filo.iloc[order[chunk_start : chunk_start + chunk_tiles]]
+        ban_chunk = tiled_ban.loc[tiled_ban.index.isin(raw_chunk["idcar_200m"])].reset_index()
+        for i, engine in enumerate(engines):
+            tiles = engine.refine(raw_chunk, seed + i)
+            households = pd.DataFrame(
+                generate_households(territory, tiles, ban_chunk, engine.tile_households_generator, seed + i)
+            )
+            violations = report.violations[i]
+            for name, n in (
+                tile_invariant_violations(raw_chunk, tiles) | households_invariant_violations(tiles, households)
+            ).items():
+                violations[name] = violations.get(name, 0) + n
+            for name, c in _distribution_counts(raw_chunk, tiles, households).items():
+                counts[i][name] = counts[i].get(name, 0) + c
+            report.nb_households[i] += len(households)
+        report.nb_tiles += len(raw_chunk)
+        if time.perf_counter() - start > time_budget:
+            logging.info(f"Time budget exhausted after {report.nb_tiles} tiles out of {len(raw_filo)}")
+            break
+    report.tests = [ChiSquareTest.compute(name, counts[0][name], counts[1][name]) for name in counts[0]]
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import sqlite3
+import struct
+import sys
+from abc import ABC, abstractmethod
+from contextlib import closing
+from pathlib import Path
+from typing import IO, Any
+
+import geopandas as gpd
+import pandas as pd
+
+from .instrumentation import stage
+
+
+def plain_categories(gdf: gpd.GeoDataFrame, keep_ordered: bool = False) -> gpd.GeoDataFrame:
+    """
+    Converts the categorical columns of a data frame (see the "compact" schema profile) to plain values,
+    for writers that do not support them. With `keep_ordered`, the ordered categorical columns
+    (fixed enumerations such as `AGE_CAT`, whose categories are the same in every batch) are kept.
+    """
+    columns = {
+        c: dtype.categories.dtype
+        for c, dtype in gdf.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype) and not (keep_ordered and dtype.ordered)
+    }
+    if not columns:
+        return gdf
+    # Converted column by column, as `astype` on the whole frame compares the `attrs` of the converted columns
+    gdf = gdf.copy(deep=False)
+    for c, dtype in columns.items():
+        gdf[c] = gdf[c].astype(dtype)
+    return gdf
+
+
+class BatchSink(ABC):
+    """
+    Base class of the writers fed batch by batch by the generation pipeline.
+
+    Sinks are opened once, receive every generated batch through `write`
+    and are finalized by `close` (or by leaving a `with` block).
+
+    Sinks supporting resumable runs describe their committed output with `checkpoint`
+    and can be rolled back to such a state (dropping any partially written batch) with `resume`,
+    which they implement as `_resume`.
+    """
+
+    resumable: bool = False
+
+    def __init__(self, path: Path | str):
+        self.path = path
+        self.nb_rows = 0
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        with stage(f"write {self.path}"):
+            self._write(gdf)
+        self.nb_rows += len(gdf)
+
+    @abstractmethod
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        pass
+
+    def checkpoint(self) -> dict[str, Any]:
+        """Returns the (JSON serializable) state of the output committed so far."""
+        return {"nb_rows": self.nb_rows}
+
+    def resume(self, state: dict[str, Any]) -> None:
+        """Restores the output to a state returned by `checkpoint`."""
+        if not self.resumable:
+            raise ValueError(f"{type(self).__name__} {self.path} cannot resume an interrupted run")
+        self._resume(state)
+
+    def _resume(self, state: dict[str, Any]) -> None:
+        self.nb_rows = state["nb_rows"]
+
+    def close(self) -> None:  # noqa: B027 (sinks without finalization)
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GeoPackageSink(BatchSink):
+    """
+    Writes batches as a single layer of a GeoPackage file.
+
+    Each batch is appended in its own transaction, so an interrupted run leaves
+    the committed batches and the features of the batch being written, which are
+    deleted when resuming.
+    """
+
+    resumable = True
+
+    def __init__(self, path: Path, layer: str):
+        super().__init__(path)
+        self.layer = layer
+
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        gdf.to_file(self.path, layer=self.layer, driver="GPKG", mode="a" if self.nb_rows else "w")
+
+    def _resume(self, state: dict[str, Any]) -> None:
+        self.nb_rows = state["nb_rows"]
+        if self.nb_rows == 0:
+            Path(self.path).unlink(missing_ok=True)
+            return
+        # Features are appended with increasing fids: the ones beyond the checkpoint belong to the interrupted batch
+        with closing(sqlite3.connect(self.path)) as con, con:
+            (fid,) = con.execute(
+                f'SELECT fid FROM "{self.layer}" ORDER BY fid LIMIT 1 OFFSET ?', (self.nb_rows - 1,)
+            ).fetchone()
+            deleted = con.execute(f'DELETE FROM "{self.layer}" WHERE fid > ?', (fid,)).rowcount
+        logging.info(f"Resuming {self.path} after {self.nb_rows} features ({deleted} discarded)")
+
+
+class GeoParquetSink(BatchSink):
+    """
+    Writes batches as row groups of a single (WKB encoded) parquet file.
+
+    Each batch is appended as a row group to `<path>.tmp`, which is renamed to the output file by `close`.
+    The footer of the file is saved by `checkpoint` (as `<path>.footer-<number of row groups>`), so that
+    resuming truncates the file after the last committed row group and restores its footer.
+
+    Categorical columns with fixed categories (ordered, such as `AGE_CAT`) are dictionary encoded.
+    The other ones (such as `TILE_ID`) are written as strings, as fastparquet can only read
+    files whose row groups share the same dictionaries.
+    """
+
+    resumable = True
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.tmp_path = Path(f"{path}.tmp")
+        self.nb_row_groups = 0
+        self._footers: list[Path] = []
+
+    def _footer_path(self, nb_row_groups: int) -> Path:
+        return Path(f"{self.path}.footer-{nb_row_groups:05d}")
+
+    def _remove_footers(self, keep: list[Path]) -> None:
+        for footer_path in Path(self.path).parent.glob(f"{Path(self.path).name}.footer-*"):
+            if footer_path not in keep:
+                footer_path.unlink()
+        self._footers = keep
+
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        plain_categories(gdf, keep_ordered=True).to_wkb().to_parquet(
+            self.tmp_path, engine="fastparquet", append=self.nb_row_groups > 0
+        )
+        self.nb_row_groups += 1
+
+    def checkpoint(self) -> dict[str, Any]:
+        state = {"nb_rows": self.nb_rows, "nb_row_groups": self.nb_row_groups, "offset": 0}
+        if self.nb_row_groups == 0:
+            return state
+        # Parquet files end with their footer, then its size (4 bytes) and a magic number (4 bytes)
+        with open(self.tmp_path, "rb") as file:
+            file.seek(-8, os.SEEK_END)
+            footer_size = struct.unpack("<I", file.read(4))[0] + 8
+            file.seek(-footer_size, os.SEEK_END)
+            state["offset"] = file.tell()
+            footer = file.read()
+        footer_path = self._footer_path(self.nb_row_groups)
+        tmp_path = Path(f"{footer_path}.tmp")
+        tmp_path.write_bytes(footer)
+        os.replace(tmp_path, footer_path)
+        # The footer of the previous checkpoint is kept until this one is recorded
+        self._remove_footers([*self._footers[-1:], footer_path])
+        return state
+
+    def _resume(self, state: dict[str, Any]) -> None:
+        self.nb_rows, self.nb_row_groups = state["nb_rows"], state["nb_row_groups"]
+        if self.nb_row_groups == 0:
+            self.tmp_path.unlink(missing_ok=True)
+            self._remove_footers([])
+        else:
+            # Row groups (possibly partly) written after the checkpoint are dropped
+            footer_path = self._footer_path(self.nb_row_groups)
+            footer = footer_path.read_bytes()
+            with open(self.tmp_path, "r+b") as file:
+                file.truncate(state["offset"])
+                file.seek(state["offset"])
+                file.write(footer)
+            self._remove_footers([footer_path])
+        logging.info(f"Resuming {self.path} after {self.nb_row_groups} row groups ({self.nb_rows} features)")
+
+    def close(self) -> None:
+        if self.nb_row_groups == 0:
+            return
+        os.replace(self.tmp_path, self.path)
+        self._remove_footers([])
+        self.nb_row_groups = 0
+
+
+class GeoJSONSeqSink(BatchSink):
+    """
+    Streams batches as newline-delimited GeoJSON features (GeoJSONSeq), in WGS84 coordinates.
+
+    The output can be a regular file, a named pipe (created beforehand with `mkfifo`)
+    or the standard output ("-"), so that `tippecanoe` can consume the features
+    while they are being generated. Only runs written to a regular file can be resumed.
+    """
+
+    @property
+    def resumable(self) -> bool:  # type: ignore[override]
+        return str(self.path) != "-" and not Path(self.path).is_fifo()
+
+    def __init__(self, path: Path | str, precision: int = 7):
+        super().__init__(path)
+        self.precision = precision
+        self._file: IO[str] | None = None
+
+    def _open(self) -> IO[str]:
+        if self._file is None:
+            self._file = sys.stdout if str(self.path) == "-" else open(self.path, "w", encoding="utf-8")  # noqa: SIM115
+        return self._file
+
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        file = self._open()
+        points = gdf.geometry.to_crs(epsg=4326)
+        properties = gdf.drop(columns=gdf.geometry.name).to_dict("records")
+        p = self.precision
+        file.writelines(
+            f'{{"type":"Feature","geometry":{{"type":"Point","coordinates":[{x:.{p}f},{y:.{p}f}]}},'
+            f'"properties":{json.dumps(props, ensure_ascii=False, separators=(",", ":"))}}}\n'
+            for x, y, props in zip(points.x, points.y, properties, strict=True)
+        )
+        file.flush()
+
+    def checkpoint(self) -> dict[str, Any]:
+        file = self._open()
+        if not file.seekable():
+            # Streams have no position to roll back to
+            return {"nb_rows": self.nb_rows}
+        return {"nb_rows": self.nb_rows, "offset": file.tell()}
+
+    def _resume(self, state: dict[str, Any]) -> None:
+        if "offset" not in state:
+            raise ValueError(f"Cannot resume {self.path} from a checkpoint of a GeoJSONSeq stream")
+        self.nb_rows = state["nb_rows"]
+        self._file = open(self.path, "r+", encoding="utf-8")  # noqa: SIM115
+        self._file.truncate(state["offset"])
+        self._file.seek(state["offset"])
+        logging.info(f"Resuming {self.path} after {self.nb_rows} features")
+
+    def close(self) -> None:
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+        self._file = None
+
+
+class FlatGeobufSink(BatchSink):
+    """
+    Writes batches as a FlatGeobuf file with a packed Hilbert R-tree spatial index.
+
+    GDAL cannot append to an existing FlatGeobuf file, so the layer is kept open
+    for the whole run: features are spooled by the driver and sorted along the Hilbert
+    curve when the sink is closed, giving fast bounding box reads on the output.
+    Requires the optional `fiona` package.
+    """
+
+    def __init__(self, path: Path, layer: str):
+        super().__init__(path)
+        self.layer = layer
+        self._collection = None
+
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        gdf = plain_categories(gdf)
+        if self._collection is None:
+            try:
+                import fiona
+            except ImportError as e:
+                raise ImportError("FlatGeobuf export requires the `fiona` package (pip install fiona)") from e
+            from geopandas.io.file import infer_schema
+
+            self._collection = fiona.open(
+                self.path,
+                mode="w",
+                driver="FlatGeobuf",
+                layer=self.layer,
+                crs=gdf.crs.to_wkt(),
+                schema=infer_schema(gdf),
+                SPATIAL_INDEX="YES",
+            )
+        self._collection.writerecords(gdf.iterfeatures(na="null", drop_id=True))
+
+    def close(self) -> None:
+        if self._collection is not None:
+            logging.info(f"Building FlatGeobuf spatial index of {self.path}")
+            self._collection.close()
+        self._collection = None
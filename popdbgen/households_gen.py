@@ -1,8 +1,13 @@
 import logging
-import random
+import multiprocessing
+import os
+import time
 from collections.abc import Callable, Generator, Iterator
-from itertools import batched
-from typing import TypedDict, cast
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import batched, islice
+from pathlib import Path
+from typing import Any, TypedDict, cast
 
 import geopandas as gpd
 import numpy as np
@@ -10,29 +15,60 @@ import pandas as pd
 from pyproj import Transformer
 from shapely.geometry import Point
 
+from .batching import AdaptiveBatchSizer, dataframe_bytes, variable_batched
 from .download_ban import load_BAN
-from .download_filo import load_FILO
-from .metadata import HouseholdsFeature, PopulationFeature
+from .download_filo import load_FILO, load_raw_FILO, refine_FILO
+from .instrumentation import (
+    ADDRESS_COMPACTION,
+    BAN_INDEX,
+    DATAFRAME_CONSTRUCTION,
+    HOUSEHOLDS_GENERATION,
+    LOAD_FILO,
+    POPULATION_EXPANSION,
+    Instrumentation,
+    add_stages,
+    count,
+    stage,
+)
+from .metadata import HouseholdsFeature, IdFormat, PopulationFeature, SchemaProfile
 from .utils import (
     ADULT_AGE_COLUMNS,
     ADULT_AGE_LITERAL,
     ALL_AGE_COLUMNS,
+    DATA_DIR,
+    HOUSEHOLD_ORDINAL_BITS,
+    HOUSEHOLDS_STREAM,
     MINOR_AGE_COLUMNS,
     MINOR_AGE_LITERAL,
+    POPULATION_STREAM,
     TerritoryCode,
     age_categories,
     filo_crs,
+    household_id,
+    individual_id,
+    keyed_random,
     mkHouseholdsDataFrame,
     mkPopulationDataFrame,
+    resolve_seed,
     territory_crs,
+    tile_key,
+    tile_keys,
+    tile_rng,
 )
 
+# Columns of the alias tables of the addresses of a tile, for weighted draws (see `AddressIndex`)
+ALIAS_PROBABILITY = "alias_probability"
+ALIAS_ROW = "alias_row"
+# Number of addresses of the BAN at the coordinates of a compacted address (see `compact_addresses`)
+MULTIPLICITY = "multiplicity"
+
 
-def generate_household_sizes(tile: pd.Series) -> list[int]:
+def generate_household_sizes(tile: pd.Series, rng: np.random.Generator | None = None) -> list[int]:
     """
     Initialise la liste de tailles des ménages en fonction du
     nombre de ménages d'une personne et de ménages de 5 personnes ou plus.
     """
+    rng = np.random.default_rng() if rng is None else rng
 
     # Start by fixing tile information if they are impossible to comply to
     # note: This should not happen if FILO input dataframe is properly refined
@@ -70,7 +106,7 @@ def generate_household_sizes(tile: pd.Series) -> list[int]:
     # Les individus viennent compléter les ménages de taille intermédiaire (2-3)
     adjustable_indices = [i for i, size in enumerate(sizes) if size in (2, 3)]
     while remaining_ind > 0 and adjustable_indices:
-        index = np.random.choice(adjustable_indices)
+        index = rng.choice(adjustable_indices)
         sizes[index] += 1
         remaining_ind -= 1
         if sizes[index] == 4:
@@ -79,7 +115,7 @@ def generate_household_sizes(tile: pd.Series) -> list[int]:
     # Ajuste la taille des grands ménages (5+) s'il reste des individus à placer
     adjustable_indices = [i for i, size in enumerate(sizes) if size >= 5]
     while remaining_ind > 0 and adjustable_indices:
-        index = np.random.choice(adjustable_indices)
+        index = rng.choice(adjustable_indices)
         sizes[index] += 1
         remaining_ind -= 1
 
@@ -87,7 +123,7 @@ def generate_household_sizes(tile: pd.Series) -> list[int]:
     if remaining_ind > 0:
         adjustable_indices = [i for i in range(len(sizes))]
         while remaining_ind > 0 and adjustable_indices:
-            index = np.random.choice(adjustable_indices)
+            index = rng.choice(adjustable_indices)
             sizes[index] += 1
             remaining_ind -= 1
 
@@ -95,7 +131,7 @@ def generate_household_sizes(tile: pd.Series) -> list[int]:
 
 
 class AlmostHouseholdsFeature(TypedDict):
-    ID: str
+    ID: int
     TILE_ID: str
     SIZE: int
     NB_ADULTS: int
@@ -115,9 +151,9 @@ class AlmostHouseholdsFeature(TypedDict):
     ind_inc: int
 
 
-def emptyHousehold(tile_id, i, size) -> AlmostHouseholdsFeature:
+def emptyHousehold(tile_id, key, i, size) -> AlmostHouseholdsFeature:
     return AlmostHouseholdsFeature(
-        ID=f"{tile_id}_{i+1}",
+        ID=household_id(key, i + 1),
         TILE_ID=tile_id,
         SIZE=size,
         GRD_MENAGE=size >= 5,
@@ -138,14 +174,15 @@ def emptyHousehold(tile_id, i, size) -> AlmostHouseholdsFeature:
     )
 
 
-def get_households_with_ages(tile: pd.Series) -> list[AlmostHouseholdsFeature]:
+def get_households_with_ages(tile: pd.Series, rng: np.random.Generator | None = None) -> list[AlmostHouseholdsFeature]:
     """
     Alloue un nombre d'adultes à chacun des ménages du carreau.
 
     Returns:
         list[HouseholdsFeature]: Liste des ménages générés avec un dictionnaire de features
     """
-    sizes = generate_household_sizes(tile)
+    rng = np.random.default_rng() if rng is None else rng
+    sizes = generate_household_sizes(tile, rng)
     if len(sizes) == 0:
         return []
     if sum(sizes) != tile.ind or len(sizes) != tile.men:
@@ -154,8 +191,8 @@ def get_households_with_ages(tile: pd.Series) -> list[AlmostHouseholdsFeature]:
     # Lists of all age classes to dispatch among households, repeated as many times as they occur and shuffled
     adult_ages: list[ADULT_AGE_LITERAL] = [age_class for age_class in ADULT_AGE_COLUMNS for _ in range(tile[age_class])]
     minor_ages: list[MINOR_AGE_LITERAL] = [age_class for age_class in MINOR_AGE_COLUMNS for _ in range(tile[age_class])]
-    random.shuffle(adult_ages)
-    random.shuffle(minor_ages)
+    rng.shuffle(adult_ages)
+    rng.shuffle(minor_ages)
 
     if (  # Quick sanity check (should not be too much of a strain on overall perf)
         tile.men == 0
@@ -166,7 +203,10 @@ def get_households_with_ages(tile: pd.Series) -> list[AlmostHouseholdsFeature]:
     ):
         raise Exception(f"[allocate_adults] TILE {tile.tile_id}: Incoherent input tile!")
 
-    households: list[AlmostHouseholdsFeature] = [emptyHousehold(tile.tile_id, i, size) for i, size in enumerate(sizes)]
+    key = tile_key(tile.tile_id)
+    households: list[AlmostHouseholdsFeature] = [
+        emptyHousehold(tile.tile_id, key, i, size) for i, size in enumerate(sizes)
+    ]
     for hh in households:
         hh[adult_ages.pop()] += 1
 
@@ -175,7 +215,7 @@ def get_households_with_ages(tile: pd.Series) -> list[AlmostHouseholdsFeature]:
         eligible_indices = [i for i, hh in enumerate(households) if hh["NB_ADULTS"] < hh["SIZE"]]
         if not eligible_indices:
             break
-        chosen_hh = households[np.random.choice(eligible_indices)]
+        chosen_hh = households[rng.choice(eligible_indices)]
         chosen_hh[adult_ages.pop()] += 1
         chosen_hh["NB_ADULTS"] += 1
 
@@ -188,52 +228,56 @@ def get_households_with_ages(tile: pd.Series) -> list[AlmostHouseholdsFeature]:
     return households
 
 
-def draw_addresses(tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode) -> list[Point]:
+def draw_addresses(
+    tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode, rng: np.random.Generator | None = None
+) -> list[Point]:
     """Tire un ensemble d'adresses pour chacun des ménages du carreau.
 
     Args:
         tile (pd.Series): informations sur le carreau
         addresses (pd.DataFrame): adresses contenues dans le carreau
+        rng (np.random.Generator, optional): générateur aléatoire du carreau
 
     Returns:
         list[Point]: Points (x, y) des adresses tirées pour les ménages du carreau.
         Contient autant de lignes que le carreau contient de ménages.
     """
+    rng = np.random.default_rng() if rng is None else rng
     # Si aucune adresses n'est disponible, des points fictifs sont créés au sein du carreau
     if tile.men == 0:
         return []
     elif addresses.empty:
         transformer = Transformer.from_crs(filo_crs(territory), territory_crs(territory), always_xy=True)
         return [
-            Point(
-                transformer.transform(
-                    np.random.uniform(tile["XSO"], tile["XNE"]), np.random.uniform(tile["YSO"], tile["YNE"])
-                )
-            )
+            Point(transformer.transform(rng.uniform(tile["XSO"], tile["XNE"]), rng.uniform(tile["YSO"], tile["YNE"])))
             for _ in range(tile.men)
         ]
     else:
         # Tirage des adresses:
         # Possibilité de tirer plusieurs fois la même adresse.
-        return [
-            Point(addresses.x[i], addresses.y[i])
-            for i in np.random.randint(low=addresses.shape[0], high=None, size=tile.men)
-        ]
+        rows = rng.integers(low=addresses.shape[0], high=None, size=tile.men)
+        if ALIAS_PROBABILITY in addresses.columns:
+            # Tirage pondéré (tables d'alias des adresses du carreau, cf. AddressIndex):
+            # chaque adresse tirée est conservée avec sa probabilité, et remplacée par son alias sinon
+            kept = rng.random(tile.men) < addresses[ALIAS_PROBABILITY].to_numpy()[rows]
+            rows = np.where(kept, rows, addresses[ALIAS_ROW].to_numpy()[rows])
+        return [Point(addresses.x[i], addresses.y[i]) for i in rows]
 
 
 def generate_tile_households(
-    tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode
+    tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode, rng: np.random.Generator | None = None
 ) -> Generator[HouseholdsFeature]:
     """
     Génère une base de ménages d'un carreau
     """
-    households = get_households_with_ages(tile)
-    drawn_addresses = draw_addresses(tile, addresses, territory)
+    rng = np.random.default_rng() if rng is None else rng
+    households = get_households_with_ages(tile, rng)
+    drawn_addresses = draw_addresses(tile, addresses, territory, rng)
 
     # Le niveau de vie des individus dans le ménage
     # On répartit le total des niveaux de vie entre les ménages
     # Les niveaux de vie des individus d'un même ménage sont identiques
-    parts = np.random.uniform(0, 1, tile.men)  # tirage uniforme, potentiellement trop perturbateur...
+    parts = rng.uniform(0, 1, tile.men)  # tirage uniforme, potentiellement trop perturbateur...
     norm_parts = sum(parts)
 
     for hh, part, addr in zip(households, parts, drawn_addresses, strict=True):
@@ -243,22 +287,26 @@ def generate_tile_households(
         yield res
 
 
-def generate_population(hh: HouseholdsFeature) -> Generator[PopulationFeature]:
+def generate_population(hh: HouseholdsFeature, seed: int | None = None) -> Generator[PopulationFeature]:
     """
     Génère une base d'individus d'un ménage donné
 
     Args:
         hh (dict): Information sur un ménage
+        seed (int, optional): graine de la génération. Les âges sont tirés de façon
+            déterministe à partir de la graine, du carreau et des rangs du ménage et de l'individu.
 
     Returns:
         Generator[dict]: Base d'individus et leurs caractéristiques.
     """
+    if seed is not None:
+        hh_tile_key, hh_ordinal = divmod(hh["ID"], 1 << HOUSEHOLD_ORDINAL_BITS)
     i = 0
     for age_cat in ALL_AGE_COLUMNS:
         adult, age_min, age_max = age_categories[age_cat]
         for _ in range(hh[age_cat]):
             yield PopulationFeature(
-                ID=f"{hh["ID"]}_{i+1}",
+                ID=individual_id(hh["ID"], i + 1),
                 HOUSEHOLD_ID=hh["ID"],
                 HOUSEHOLD_SIZE=hh["SIZE"],
                 GRD_MENAGE=hh["GRD_MENAGE"],
@@ -266,7 +314,12 @@ def generate_population(hh: HouseholdsFeature) -> Generator[PopulationFeature]:
                 NIVEAU_VIE=hh["NIVEAU_VIE"],
                 TILE_ID=hh["TILE_ID"],
                 AGE_CAT=age_cat,
-                AGE=np.random.randint(age_min, age_max + 1),
+                AGE=(
+                    np.random.randint(age_min, age_max + 1)
+                    if seed is None
+                    else age_min
+                    + int((age_max + 1 - age_min) * keyed_random(seed, POPULATION_STREAM, hh_tile_key, hh_ordinal, i))
+                ),
                 ADULT=adult,
                 STATUT="ADULT" if adult else "MINOR",
                 geometry=hh["geometry"],
@@ -274,13 +327,263 @@ def generate_population(hh: HouseholdsFeature) -> Generator[PopulationFeature]:
             i += 1
 
 
+def compact_addresses(ban: pd.DataFrame, weights: str | None = None) -> pd.DataFrame:
+    """
+    Collapses the addresses of a BAN database sharing the same coordinates (e.g. several numbers of a building)
+    into unique points, sorted by tile and coordinates, along with their MULTIPLICITY: the number of addresses
+    at the point (the sum of their multiplicities if they were already compacted). The `weights` of the addresses
+    (a numeric column), if any, are summed as well; the other columns are dropped.
+    Drawing the compacted addresses proportionally to their multiplicity (see `AddressIndex`) follows the same
+    distribution as drawing the addresses uniformly, from a smaller index.
+    """
+    with stage(ADDRESS_COMPACTION):
+        ban = ban.sort_values(["tile_id", "x", "y"], ignore_index=True)
+        tile_ids, x, y = ban["tile_id"].to_numpy(), ban["x"].to_numpy(), ban["y"].to_numpy()
+        first_rows = np.ones(len(ban), dtype=bool)
+        first_rows[1:] = (tile_ids[1:] != tile_ids[:-1]) | (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+        starts = np.flatnonzero(first_rows)
+        compacted = ban.iloc[starts][["tile_id", "x", "y"]].reset_index(drop=True)
+        multiplicities = (
+            ban[MULTIPLICITY].to_numpy(dtype=np.int32) if MULTIPLICITY in ban.columns else np.ones(len(ban), np.int32)
+        )
+        compacted[MULTIPLICITY] = np.add.reduceat(multiplicities, starts) if len(starts) else multiplicities
+        if weights is not None and weights != MULTIPLICITY:
+            compacted[weights] = np.add.reduceat(ban[weights].to_numpy(), starts) if len(starts) else ban[weights]
+    logging.info(f"{len(ban)} addresses compacted into {len(compacted)} points")
+    return compacted
+
+
+class AddressIndex:
+    """
+    Addresses of a BAN database grouped by tile, and sorted by coordinates within each tile
+    (so that the households of a tile only depend on its set of addresses, not on the BAN order).
+    The index is built once and can be shared by several generations on the same BAN (e.g. replicates).
+
+    The addresses are drawn uniformly by default. With `weights` (a numeric column of the BAN, e.g. a number
+    of dwellings), they are drawn proportionally to their weight, in constant time whatever the number
+    of addresses of the tile: the Walker alias tables of the addresses of each tile (see `alias_tables`)
+    are computed once, as flat arrays aligned with the addresses, and given along with the addresses of a tile
+    (as ALIAS_PROBABILITY and ALIAS_ROW columns).
+
+    With `compact`, the addresses sharing the same coordinates are indexed once (see `compact_addresses`).
+    Compacted addresses (with a MULTIPLICITY column) are weighted by their multiplicity unless other `weights`
+    are given, so that they are drawn like the addresses they stand for.
+
+    With `presorted`, the BAN is taken as already sorted by tile and coordinates (e.g. by the worker of `load_inputs`).
+    """
+
+    def __init__(self, ban: pd.DataFrame, weights: str | None = None, compact: bool = False, presorted: bool = False):
+        if compact:
+            ban = compact_addresses(ban, weights)
+        if weights is None and MULTIPLICITY in ban.columns:
+            weights = MULTIPLICITY
+        with stage(BAN_INDEX):
+            # The compacted addresses are already sorted (and their coordinates unique in their tile)
+            self.addresses = (
+                ban
+                if compact or presorted
+                else ban.sort_values(
+                    ["tile_id", "x", "y"] if weights is None else ["tile_id", "x", "y", weights], ignore_index=True
+                )
+            )
+            tile_ids = self.addresses["tile_id"].to_numpy()
+            first_rows = np.ones(len(tile_ids), dtype=bool)
+            first_rows[1:] = tile_ids[1:] != tile_ids[:-1]
+            starts = np.flatnonzero(first_rows)
+            ends = np.append(starts[1:], len(tile_ids))
+            # Rows of the addresses of each tile
+            self.bounds: dict[str, tuple[int, int]] = {
+                tile_id: (int(start), int(end))
+                for tile_id, start, end in zip(tile_ids[starts], starts, ends, strict=True)
+            }
+            self.weights = weights
+            if weights is not None:
+                from .jit import alias_tables
+
+                address_weights = self.addresses[weights].to_numpy(dtype=np.float64)
+                if not (address_weights >= 0).all():
+                    raise ValueError(f"The weights of the addresses ({weights}) must be non-negative numbers")
+                self.alias_probabilities, self.alias_rows = alias_tables(address_weights, starts, ends)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def __call__(self, tile_id: str) -> pd.DataFrame:
+        """Returns the addresses of a tile."""
+        if tile_id not in self.bounds:
+            return pd.DataFrame(columns=self.addresses.columns)
+        start, end = self.bounds[tile_id]
+        addresses = self.addresses.iloc[start:end].reset_index(drop=True)
+        if self.weights is not None:
+            addresses[ALIAS_PROBABILITY] = self.alias_probabilities[start:end]
+            addresses[ALIAS_ROW] = self.alias_rows[start:end]
+        return addresses
+
+
+def _load_addresses(
+    territory: TerritoryCode, dataDir: Path, index_addresses: bool, compact: bool
+) -> pd.DataFrame | AddressIndex:
+    """Loads the BAN (compacted and indexed as requested, see `load_inputs`) in the current process."""
+    ban = load_BAN(territory=territory, dataDir=dataDir)
+    if compact and not index_addresses:
+        return compact_addresses(ban)
+    return AddressIndex(ban, compact=compact) if index_addresses else ban
+
+
+def _load_address_arrays(
+    territory: TerritoryCode, dataDir: Path, index_addresses: bool, compact: bool
+) -> tuple[dict[str, np.ndarray], np.ndarray, dict[str, int], dict[str, int], float]:
+    """
+    Loads the BAN in the worker process of `load_inputs`, compacted and sorted as its AddressIndex expects.
+    Returns its columns as numpy arrays (the tile ids as codes into the array of the distinct tile ids),
+    which are sent back much faster than a data frame of strings or an AddressIndex,
+    the timers and calls of its stages and the elapsed time.
+    """
+    start = time.perf_counter()
+    with Instrumentation(rss_interval=60.0) as instrumentation:
+        ban = load_BAN(territory=territory, dataDir=dataDir)
+        if compact:
+            ban = compact_addresses(ban)
+        elif index_addresses:
+            with stage(BAN_INDEX):
+                ban = ban.sort_values(["tile_id", "x", "y"], ignore_index=True)
+        columns = {c: ban[c].to_numpy() for c in ban.columns}
+        columns["tile_id"], tile_ids = pd.factorize(columns["tile_id"])
+    return columns, tile_ids, dict(instrumentation.timers), dict(instrumentation.calls), time.perf_counter() - start
+
+
+def load_inputs(
+    territory: TerritoryCode = "METRO",
+    dataDir: Path = DATA_DIR,
+    seed: int | None = None,
+    refine: bool = True,
+    index_addresses: bool = True,
+    parallel: bool | None = None,
+    refine_function: Callable[[gpd.GeoDataFrame, int | None], gpd.GeoDataFrame] = refine_FILO,
+    compact: bool = False,
+) -> tuple[gpd.GeoDataFrame, pd.DataFrame | AddressIndex]:
+    """
+    Loads the inputs of a generation: the FILO (refined with `seed`, see `load_FILO`) and the addresses
+    of the BAN, indexed by tile (see `load_BAN` and `AddressIndex`).
+    With `parallel`, the BAN is loaded (and sorted) in a worker process while the FILO is loaded and refined
+    in the current one, so that the startup takes about the time of the longest of the two loads rather
+    than their sum. A process is used rather than a thread since the refinement of the FILO holds the GIL.
+    The worker sends the addresses back as numpy arrays, which are indexed in the current process.
+    The time of each load is logged, and the stages of both processes are recorded by the active instrumentation.
+
+    Args:
+        territory (TerritoryCode): territory of the inputs: 'METRO' (default), '974' or '972'
+        dataDir (Path): data folder of the FILO and BAN files
+        seed (int, optional): seed of the refinement of the FILO, drawn from numpy's global random state if omitted
+        refine (bool): refine the FILO (see `refine_FILO`), or return the raw FILO (see `load_raw_FILO`)
+        index_addresses (bool): return the AddressIndex of the BAN, or the BAN data frame
+        parallel (bool, optional): load the FILO and the BAN in parallel (by default if several CPUs are available)
+        refine_function (Callable, optional): implementation of the refinement (see `GenerationEngine`)
+        compact (bool): collapse the addresses sharing the same coordinates (see `compact_addresses`)
+
+    Returns:
+        tuple[gpd.GeoDataFrame, pd.DataFrame | AddressIndex]: FILO and BAN (or its AddressIndex)
+    """
+
+    def filo_input() -> gpd.GeoDataFrame:
+        if not refine:
+            with stage(LOAD_FILO):
+                return load_raw_FILO(territory=territory, dataDir=dataDir)
+        return load_FILO(territory=territory, dataDir=dataDir, seed=seed, refine_function=refine_function)
+
+    if parallel is None:
+        parallel = (os.cpu_count() or 1) > 1
+    start = time.perf_counter()
+    if parallel:
+        # Spawned rather than forked, the current process possibly running threads (e.g. the RSS sampler)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            ban_future = executor.submit(_load_address_arrays, territory, dataDir, index_addresses, compact)
+            filo = filo_input()
+            logging.info(f"FILO loaded{' and refined' if refine else ''} in {time.perf_counter() - start:.1f}s")
+            columns, tile_ids, timers, calls, elapsed = ban_future.result()
+        add_stages(timers, calls)
+        ban_start = time.perf_counter()
+        ban = pd.DataFrame({c: tile_ids[values] if c == "tile_id" else values for c, values in columns.items()})
+        addresses = AddressIndex(ban, presorted=True) if index_addresses else ban
+        elapsed += time.perf_counter() - ban_start
+    else:
+        filo = filo_input()
+        logging.info(f"FILO loaded{' and refined' if refine else ''} in {time.perf_counter() - start:.1f}s")
+        ban_start = time.perf_counter()
+        addresses = _load_addresses(territory, dataDir, index_addresses, compact)
+        elapsed = time.perf_counter() - ban_start
+    logging.info(
+        f"BAN loaded{' and compacted' if compact else ''}{' and indexed' if index_addresses else ''} in {elapsed:.1f}s"
+    )
+    logging.info(f"Inputs loaded in {time.perf_counter() - start:.1f}s")
+    return filo, addresses
+
+
+def generate_tiles_households(
+    territory: TerritoryCode = "METRO",
+    filo_df: gpd.GeoDataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
+    tile_households_generator: Callable[
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
+    ] = generate_tile_households,
+    seed: int | None = None,
+    start_household: int = 0,
+) -> Generator[tuple[int, int, list[HouseholdsFeature]]]:
+    """
+    Args:
+        territory (TerritoryCode):
+            A name of the territory to consider: 'METRO' (default), '974' or '972'.
+        filo_df (gpd.GeoDataFrame, optional):
+            FILO database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
+        tile_household_generator (Callable[[pd.Series, pd.DataFrame], Generator[dict]], optional):
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
+
+    Returns:
+        Generator[tuple[int, int, list[dict]]]:
+            A Generator of (position in the FILO database, tile key, households of the tile) triplets
+    """
+    seed = resolve_seed(seed)
+    if filo_df is None and ban_df is None:
+        filo_df, ban_df = load_inputs(territory, seed=seed, parallel=False)
+    filo: pd.DataFrame = load_FILO(territory, seed=seed) if filo_df is None else filo_df
+    ban = load_BAN(territory) if ban_df is None else ban_df
+    # Builds the index of the tiles addresses once for all
+    addresses = ban if isinstance(ban, AddressIndex) else AddressIndex(ban)
+    keys = filo["tile_key"].to_numpy() if "tile_key" in filo.columns else tile_keys(filo["tile_id"])
+
+    # Skips the tiles whose households were all generated, then the first households of the partial tile
+    cumulated_men = filo["men"].to_numpy(dtype=np.int64).cumsum()
+    start_tile = int(np.searchsorted(cumulated_men, start_household, side="right"))
+    skip = start_household - int(cumulated_men[start_tile - 1]) if start_tile else start_household
+
+    for i, (_, row) in enumerate(filo.iloc[start_tile:].iterrows(), start_tile):
+        with stage(HOUSEHOLDS_GENERATION):
+            rng = tile_rng(seed, int(keys[i]), HOUSEHOLDS_STREAM)
+            households = list(
+                islice(tile_households_generator(row, addresses(row.tile_id), territory, rng), skip, None)
+            )
+        count("tiles")
+        count("households", len(households))
+        yield i, int(keys[i]), households
+        skip = 0
+
+
 def generate_households(
     territory: TerritoryCode = "METRO",
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
+    seed: int | None = None,
+    start_household: int = 0,
 ) -> Generator[HouseholdsFeature]:
     """
     Args:
@@ -288,36 +591,169 @@ def generate_households(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Generator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
 
     Returns:
         GeoDataFrame: A Generator for row dictionnaries representing households
     """
-    filo: pd.DataFrame = load_FILO(territory) if filo_df is None else filo_df
-    ban: pd.DataFrame = load_BAN(territory) if ban_df is None else ban_df
-    tiled_ban = ban.groupby("tile_id", sort=False)
+    for _, _, households in generate_tiles_households(
+        territory=territory,
+        filo_df=filo_df,
+        ban_df=ban_df,
+        tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+    ):
+        yield from households
+
+
+@dataclass
+class TileBatch:
+    """
+    A batch of households made of whole tiles (except the first one when resuming mid-tile).
+
+    Attributes:
+        households (list[dict]): households of the batch, tile after tile
+        first_tile (int): position of the first tile of the batch in the FILO database
+        tile_keys (np.ndarray): keys of the tiles of the batch, in the FILO order
+        offsets (np.ndarray): the households of the i-th tile are households[offsets[i]:offsets[i+1]]
+    """
 
-    # Function to apply the tile_household_generator to a given row and the addresses matching it
-    def get_addresses(tile: pd.Series) -> pd.DataFrame:
-        if tile.tile_id in tiled_ban.groups:
-            return tiled_ban.get_group(tile.tile_id).sample(frac=1).reset_index(drop=True)
-        else:
-            return pd.DataFrame(columns=ban.columns)
+    households: list[HouseholdsFeature]
+    first_tile: int
+    tile_keys: np.ndarray
+    offsets: np.ndarray
 
-    for _, row in filo.iterrows():
-        yield from tile_households_generator(row, get_addresses(row), territory)
+    def __len__(self) -> int:
+        return len(self.households)
+
+    def __iter__(self) -> Iterator[HouseholdsFeature]:
+        return iter(self.households)
+
+    @property
+    def last_tile(self) -> int:
+        """Position of the last tile of the batch in the FILO database."""
+        return self.first_tile + len(self.tile_keys) - 1
+
+    @property
+    def key_range(self) -> tuple[int, int]:
+        """Keys of the first and last tiles of the batch."""
+        return int(self.tile_keys[0]), int(self.tile_keys[-1])
+
+    def individual_offsets(self) -> np.ndarray:
+        """Offsets of the tiles in the population generated from the batch households."""
+        sizes = np.fromiter((hh["SIZE"] for hh in self.households), dtype=np.int64, count=len(self.households))
+        return np.concatenate([[0], sizes.cumsum()])[self.offsets]
+
+    def attrs(self, individuals: bool = False) -> dict[str, Any]:
+        """
+        Description of the batch, attached to the `attrs` of the data frames generated from it.
+        Arrays are stored as tuples of ints, as pandas compares the `attrs` of the frames it combines.
+        """
+        offsets = self.individual_offsets() if individuals else self.offsets
+        return {
+            "first_tile": int(self.first_tile),
+            "tile_keys": tuple(self.tile_keys.tolist()),
+            "offsets": tuple(offsets.tolist()),
+        }
+
+
+def generate_tile_batches(
+    territory: TerritoryCode = "METRO",
+    batch_size: int | Callable[[], int] = 1000,
+    filo_df: gpd.GeoDataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
+    tile_households_generator: Callable[
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
+    ] = generate_tile_households,
+    seed: int | None = None,
+    start_household: int = 0,
+) -> Generator[TileBatch]:
+    """
+    Batches the generated households without splitting tiles: tiles are added to a batch
+    until it reaches at least `batch_size` households.
+
+    Args:
+        territory (TerritoryCode):
+            A name of the territory to consider: 'METRO' (default), '974' or '972'.
+        batch_size (int | Callable[[], int]):
+            Minimal number of households of a batch (but the last one), or a function returning it
+            (called for each batch, e.g. an `AdaptiveBatchSizer`).
+        filo_df (gpd.GeoDataFrame, optional):
+            FILO database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
+        tile_household_generator (Callable[[pd.Series, pd.DataFrame], Generator[dict]], optional):
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
+
+    Returns:
+        Generator[TileBatch]: A Generator of batches of whole tiles
+    """
+    next_batch_size = batch_size if callable(batch_size) else lambda: batch_size
+    households: list[HouseholdsFeature] = []
+    keys: list[int] = []
+    offsets: list[int] = [0]
+    first_tile = 0
+    target = next_batch_size()
+    for i, key, tile_households in generate_tiles_households(
+        territory=territory,
+        filo_df=filo_df,
+        ban_df=ban_df,
+        tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+    ):
+        if not keys:
+            first_tile = i
+        households.extend(tile_households)
+        keys.append(key)
+        offsets.append(len(households))
+        if len(households) >= target:
+            yield TileBatch(households, first_tile, np.array(keys, dtype=np.int64), np.array(offsets))
+            households, keys, offsets = [], [], [0]
+            target = next_batch_size()
+    if keys:
+        yield TileBatch(households, first_tile, np.array(keys, dtype=np.int64), np.array(offsets))
+
+
+def _batch_sizer(
+    memory_budget: int | None, batch_size: int, filo_df: gpd.GeoDataFrame | None, start_household: int
+) -> AdaptiveBatchSizer | None:
+    """Sizer of the batches of a generation with a memory budget, expecting the individuals of the FILO tiles."""
+    if memory_budget is None:
+        return None
+    return AdaptiveBatchSizer(
+        memory_budget,
+        initial_size=batch_size,
+        households=None if filo_df is None else filo_df["men"].to_numpy(),
+        individuals=None if filo_df is None else filo_df["ind"].to_numpy(),
+        start_household=start_household,
+    )
 
 
 def get_households_gdf(
     territory: TerritoryCode = "METRO",
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
+    seed: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> gpd.GeoDataFrame:
     """
     Args:
@@ -325,29 +761,45 @@ def get_households_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         GeoDataFrame: A GeoDataFrame households database
     """
     logging.info("Generating households database...")
     households = generate_households(
-        filo_df=filo_df, ban_df=ban_df, territory=territory, tile_households_generator=tile_households_generator
+        filo_df=filo_df,
+        ban_df=ban_df,
+        territory=territory,
+        tile_households_generator=tile_households_generator,
+        seed=seed,
     )
-    return mkHouseholdsDataFrame(list(households), territory)
+    return mkHouseholdsDataFrame(list(households), territory, profile, id_format)
 
 
 def get_population_gdf(
     territory: TerritoryCode = "METRO",
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
-    population_generator: Callable[[HouseholdsFeature], Iterator[PopulationFeature]] = generate_population,
+    population_generator: Callable[[HouseholdsFeature, int], Iterator[PopulationFeature]] = generate_population,
+    seed: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> gpd.GeoDataFrame:
     """
     Args:
@@ -355,31 +807,49 @@ def get_population_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
-        population_generator (Callable[[dict], Iterator[dict]], optional):
-            Function generating population information from household details.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        population_generator (Callable[[dict, int], Iterator[dict]], optional):
+            Function generating population information from household details and the generation seed.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         GeoDataFrame: A GeoDataFrame population database
     """
     logging.info("Generating population database...")
+    seed = resolve_seed(seed)
     households = generate_households(
-        filo_df=filo_df, ban_df=ban_df, territory=territory, tile_households_generator=tile_households_generator
+        filo_df=filo_df,
+        ban_df=ban_df,
+        territory=territory,
+        tile_households_generator=tile_households_generator,
+        seed=seed,
     )
-    return mkPopulationDataFrame([ind for hh in households for ind in population_generator(hh)], territory)
+    population = [ind for hh in households for ind in population_generator(hh, seed)]
+    return mkPopulationDataFrame(population, territory, profile, id_format)
 
 
 def get_households_population_gdf(
     territory: TerritoryCode = "METRO",
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
-    population_generator: Callable[[HouseholdsFeature], Iterator[PopulationFeature]] = generate_population,
+    population_generator: Callable[[HouseholdsFeature, int], Iterator[PopulationFeature]] = generate_population,
+    seed: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
     """
     Args:
@@ -387,54 +857,123 @@ def get_households_population_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
-        population_generator (Callable[[dict], Iterator[dict]], optional):
-            Function generating population information from household details.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        population_generator (Callable[[dict, int], Iterator[dict]], optional):
+            Function generating population information from household details and the generation seed.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
             A pair of GeoDataFrames containing the households and population databases in that order.
     """
     logging.info("Generating households and population databases...")
+    seed = resolve_seed(seed)
     households = list(
         generate_households(
-            filo_df=filo_df, ban_df=ban_df, territory=territory, tile_households_generator=tile_households_generator
+            filo_df=filo_df,
+            ban_df=ban_df,
+            territory=territory,
+            tile_households_generator=tile_households_generator,
+            seed=seed,
         )
     )
     return (
-        mkHouseholdsDataFrame(households, territory),
-        mkPopulationDataFrame([ind for hh in households for ind in population_generator(hh)], territory),
+        mkHouseholdsDataFrame(households, territory, profile, id_format),
+        mkPopulationDataFrame(
+            [ind for hh in households for ind in population_generator(hh, seed)], territory, profile, id_format
+        ),
     )
 
 
 def generate_batched_households(
     territory: TerritoryCode = "METRO",
-    batch_size: int = 1000,
+    batch_size: int | Callable[[], int] = 1000,
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
-) -> Iterator[tuple[HouseholdsFeature, ...]]:
-    return batched(
-        generate_households(
-            filo_df=filo_df, ban_df=ban_df, territory=territory, tile_households_generator=tile_households_generator
-        ),
-        batch_size,
+    seed: int | None = None,
+    start_household: int = 0,
+    tile_aligned: bool = False,
+) -> Iterator[tuple[HouseholdsFeature, ...]] | Iterator[TileBatch]:
+    if tile_aligned:
+        return generate_tile_batches(
+            batch_size=batch_size,
+            filo_df=filo_df,
+            ban_df=ban_df,
+            territory=territory,
+            tile_households_generator=tile_households_generator,
+            seed=seed,
+            start_household=start_household,
+        )
+    households = generate_households(
+        filo_df=filo_df,
+        ban_df=ban_df,
+        territory=territory,
+        tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
     )
+    return variable_batched(households, batch_size) if callable(batch_size) else batched(households, batch_size)
+
+
+def _batch_households_gdf(
+    households_batch: tuple[HouseholdsFeature, ...] | TileBatch,
+    territory: TerritoryCode,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
+) -> gpd.GeoDataFrame:
+    with stage(DATAFRAME_CONSTRUCTION):
+        gdf = mkHouseholdsDataFrame(households_batch, territory, profile, id_format)
+    if isinstance(households_batch, TileBatch):
+        gdf.attrs["tile_batch"] = households_batch.attrs()
+    return gdf
+
+
+def _batch_population_gdf(
+    households_batch: tuple[HouseholdsFeature, ...] | TileBatch,
+    territory: TerritoryCode,
+    population_generator: Callable[[HouseholdsFeature, int], Iterator[PopulationFeature]],
+    seed: int,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
+) -> gpd.GeoDataFrame:
+    with stage(POPULATION_EXPANSION):
+        population = [ind for hh in households_batch for ind in population_generator(hh, seed)]
+    count("individuals", len(population))
+    with stage(DATAFRAME_CONSTRUCTION):
+        gdf = mkPopulationDataFrame(population, territory, profile, id_format)
+    if isinstance(households_batch, TileBatch):
+        gdf.attrs["tile_batch"] = households_batch.attrs(individuals=True)
+    return gdf
 
 
 def get_batched_households_gdf(
     territory: TerritoryCode = "METRO",
     batch_size: int = 1000,
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
+    seed: int | None = None,
+    start_household: int = 0,
+    tile_aligned: bool = False,
+    memory_budget: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> Generator[gpd.GeoDataFrame]:
     """
     Args:
@@ -442,34 +981,65 @@ def get_batched_households_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
+        tile_aligned (bool, optional):
+            Cut batches at tile boundaries (see `generate_tile_batches`). The tile keys of each batch and the
+            offsets of their rows are then available in the `attrs["tile_batch"]` of the generated data frames.
+        memory_budget (int, optional):
+            Memory budget of the generation, in bytes. If set, `batch_size` is only the size of the first batch
+            and the size of the following ones is adapted to the measured memory used per household and
+            per individual (see `AdaptiveBatchSizer`).
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         GeoDataFrame: A GeoDataFrame households database
     """
     logging.info("Generating households database...")
+    sizer = _batch_sizer(memory_budget, batch_size, filo_df, start_household)
     for households_batch in generate_batched_households(
-        batch_size=batch_size,
+        batch_size=batch_size if sizer is None else sizer,
         filo_df=filo_df,
         ban_df=ban_df,
         territory=territory,
         tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+        tile_aligned=tile_aligned,
     ):
-        yield mkHouseholdsDataFrame(households_batch, territory)
+        households = _batch_households_gdf(households_batch, territory, profile, id_format)
+        if sizer is not None:
+            sizer.update(len(households), dataframe_bytes(households))
+        yield households
 
 
 def get_batched_population_gdf(
     territory: TerritoryCode = "METRO",
     batch_size: int = 1000,
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
-    population_generator: Callable[[HouseholdsFeature], Iterator[PopulationFeature]] = generate_population,
+    population_generator: Callable[[HouseholdsFeature, int], Iterator[PopulationFeature]] = generate_population,
+    seed: int | None = None,
+    start_household: int = 0,
+    tile_aligned: bool = False,
+    memory_budget: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> Generator[gpd.GeoDataFrame]:
     """
     Args:
@@ -477,36 +1047,68 @@ def get_batched_population_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
-        population_generator (Callable[[dict], Iterator[dict]], optional):
-            Function generating population information from household details.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        population_generator (Callable[[dict, int], Iterator[dict]], optional):
+            Function generating population information from household details and the generation seed.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
+        tile_aligned (bool, optional):
+            Cut batches at tile boundaries (see `generate_tile_batches`). The tile keys of each batch and the
+            offsets of their rows are then available in the `attrs["tile_batch"]` of the generated data frames.
+        memory_budget (int, optional):
+            Memory budget of the generation, in bytes. If set, `batch_size` is only the size of the first batch
+            and the size of the following ones is adapted to the measured memory used per household and
+            per individual (see `AdaptiveBatchSizer`).
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         GeoDataFrame: A GeoDataFrame population database
     """
     logging.info("Generating population database...")
+    seed = resolve_seed(seed)
+    sizer = _batch_sizer(memory_budget, batch_size, filo_df, start_household)
     for households_batch in generate_batched_households(
-        batch_size=batch_size,
+        batch_size=batch_size if sizer is None else sizer,
         filo_df=filo_df,
         ban_df=ban_df,
         territory=territory,
         tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+        tile_aligned=tile_aligned,
     ):
-        yield mkPopulationDataFrame([ind for hh in households_batch for ind in population_generator(hh)], territory)
+        population = _batch_population_gdf(households_batch, territory, population_generator, seed, profile, id_format)
+        if sizer is not None:
+            sizer.update(len(households_batch), 0, len(population), dataframe_bytes(population))
+        yield population
 
 
 def get_batched_households_population_gdf(
     territory: TerritoryCode = "METRO",
     batch_size: int = 1000,
     filo_df: gpd.GeoDataFrame | None = None,
-    ban_df: pd.DataFrame | None = None,
+    ban_df: pd.DataFrame | AddressIndex | None = None,
     tile_households_generator: Callable[
-        [pd.Series, pd.DataFrame, TerritoryCode], Iterator[HouseholdsFeature]
+        [pd.Series, pd.DataFrame, TerritoryCode, np.random.Generator], Iterator[HouseholdsFeature]
     ] = generate_tile_households,
-    population_generator: Callable[[HouseholdsFeature], Iterator[PopulationFeature]] = generate_population,
+    population_generator: Callable[[HouseholdsFeature, int], Iterator[PopulationFeature]] = generate_population,
+    seed: int | None = None,
+    start_household: int = 0,
+    tile_aligned: bool = False,
+    memory_budget: int | None = None,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
 ) -> Generator[tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]]:
     """
     Args:
@@ -514,26 +1116,50 @@ def get_batched_households_population_gdf(
             A name of the territory to consider: 'METRO' (default), '974' or '972'.
         filo_df (gpd.GeoDataFrame, optional):
             FILO database. Will be (down)loaded if omitted.
-        ban_df (pd.DataFrame, optional):
-            BAN database. Will be (down)loaded if omitted.
+        ban_df (pd.DataFrame | AddressIndex, optional):
+            BAN database (or its AddressIndex, to share it between generations). Will be (down)loaded if omitted.
         tile_household_generator (Callable[[pd.Series, pd.DataFrame], Iterator[dict]], optional):
-            Function generating household information from a tile aggregated details and a list of addresses.
-        population_generator (Callable[[dict], Iterator[dict]], optional):
-            Function generating population information from household details.
+            Function generating household information from a tile aggregated details, a list of addresses
+            and the random generator of the tile.
+        population_generator (Callable[[dict, int], Iterator[dict]], optional):
+            Function generating population information from household details and the generation seed.
+        seed (int, optional):
+            Seed of the generation. Drawn from numpy's global random state if omitted.
+        start_household (int, optional):
+            Number of leading households to skip (used to resume an interrupted generation).
+        tile_aligned (bool, optional):
+            Cut batches at tile boundaries (see `generate_tile_batches`). The tile keys of each batch and the
+            offsets of their rows are then available in the `attrs["tile_batch"]` of the generated data frames.
+        memory_budget (int, optional):
+            Memory budget of the generation, in bytes. If set, `batch_size` is only the size of the first batch
+            and the size of the following ones is adapted to the measured memory used per household and
+            per individual (see `AdaptiveBatchSizer`).
+        profile (SchemaProfile, optional):
+            Column types of the generated data frames: "default", or "compact" for smaller
+            integer types, categorical strings and single precision incomes (see `households_dtypes`).
+        id_format (IdFormat, optional):
+            Identifiers of the generated data frames: legacy strings ("string", default), or the packed
+            integers (tile key, household and individual ranks) of the generated features ("integer").
 
     Returns:
         tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
             A pair of GeoDataFrames containing the households and population databases in that order.
     """
     logging.info("Generating households and population databases...")
+    seed = resolve_seed(seed)
+    sizer = _batch_sizer(memory_budget, batch_size, filo_df, start_household)
     for households_batch in generate_batched_households(
-        batch_size=batch_size,
+        batch_size=batch_size if sizer is None else sizer,
         filo_df=filo_df,
         ban_df=ban_df,
         territory=territory,
         tile_households_generator=tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+        tile_aligned=tile_aligned,
     ):
-        yield (
-            mkHouseholdsDataFrame(households_batch, territory),
-            mkPopulationDataFrame([ind for hh in households_batch for ind in population_generator(hh)], territory),
-        )
+        households = _batch_households_gdf(households_batch, territory, profile, id_format)
+        population = _batch_population_gdf(households_batch, territory, population_generator, seed, profile, id_format)
+        if sizer is not None:
+            sizer.update(len(households), dataframe_bytes(households), len(population), dataframe_bytes(population))
+        yield households, population
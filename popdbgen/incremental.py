@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .export import plain_categories
+from .households_gen import generate_households, generate_population
+from .metadata import IdFormat, SchemaProfile
+from .utils import TILE_KEY_BITS, TerritoryCode, mkHouseholdsDataFrame, mkPopulationDataFrame, tile_keys
+
+# Tiles are gathered in square partitions of PARTITION_TILES x PARTITION_TILES tiles (10km with 200m tiles)
+PARTITION_TILES = 50
+FINGERPRINTS_FILENAME = "fingerprints.parquet"
+MANIFEST_FILENAME = "manifest.json"
+
+
+def tile_fingerprints(filo: gpd.GeoDataFrame, ban: pd.DataFrame) -> pd.Series:
+    """
+    Computes a fingerprint of the inputs of each tile: its refined FILO counts and its set of addresses.
+
+    The addresses contribute through an order independent sum of their hashes, so that the fingerprint
+    does not change when the BAN rows are merely reordered.
+
+    Returns:
+        pd.Series: uint64 fingerprints indexed by tile key, in the FILO order
+    """
+    keys = filo["tile_key"].to_numpy() if "tile_key" in filo.columns else tile_keys(filo["tile_id"])
+    counts = pd.util.hash_pandas_object(filo.drop(columns=filo.geometry.name), index=False)
+    addresses = pd.util.hash_pandas_object(ban[["x", "y"]], index=False).groupby(ban["tile_id"].to_numpy())
+    tiles = pd.DataFrame(
+        {
+            "counts": counts.to_numpy(),
+            "addresses": addresses.sum().reindex(filo["tile_id"], fill_value=0).to_numpy(),
+            "nb_addresses": addresses.size().reindex(filo["tile_id"], fill_value=0).to_numpy(),
+        }
+    )
+    return pd.Series(pd.util.hash_pandas_object(tiles, index=False).to_numpy(), index=pd.Index(keys, name="tile_key"))
+
+
+def partition_keys(keys: np.ndarray, partition_tiles: int = PARTITION_TILES) -> np.ndarray:
+    """
+    Returns the key of the partition of each tile key, built the same way as tile keys.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    north, east = keys >> TILE_KEY_BITS, keys & ((1 << TILE_KEY_BITS) - 1)
+    return (north // partition_tiles) << TILE_KEY_BITS | (east // partition_tiles)
+
+
+def partition_filename(partition_key: int) -> str:
+    return f"part-N{partition_key >> TILE_KEY_BITS:05d}E{partition_key & ((1 << TILE_KEY_BITS) - 1):05d}.parquet"
+
+
+@dataclass
+class PartitionedOutputManifest:
+    """Parameters of the run that produced a tile-partitioned output."""
+
+    territory: str
+    seed: int
+    partition_tiles: int
+    profile: SchemaProfile = "default"
+    id_format: IdFormat = "string"
+    nb_tiles: int = 0
+    nb_households: int = 0
+    nb_individuals: int = 0
+
+
+def _replace_parquet(df: pd.DataFrame, path: Path) -> None:
+    """Atomically (over)writes a parquet file, or removes it if the data frame is empty."""
+    if df.empty:
+        path.unlink(missing_ok=True)
+        return
+    tmp_path = path.with_suffix(".tmp")
+    df.to_parquet(tmp_path, engine="fastparquet")
+    os.replace(tmp_path, path)
+
+
+def _partition_rows(partitions: np.ndarray, updated_partitions: np.ndarray) -> list[np.ndarray]:
+    """
+    Groups rows by partition, from the partition key of each row: returns the positions of the rows
+    of each of the (sorted) `updated_partitions`, in increasing order.
+    """
+    order = np.argsort(partitions, kind="stable")
+    sorted_partitions = partitions[order]
+    starts = np.searchsorted(sorted_partitions, updated_partitions, side="left")
+    ends = np.searchsorted(sorted_partitions, updated_partitions, side="right")
+    return [order[start:end] for start, end in zip(starts, ends, strict=True)]
+
+
+def _splice(path: Path, stale_keys: np.ndarray, new: pd.DataFrame | None) -> pd.DataFrame:
+    """
+    Replaces the rows of the stale tiles of a partition file with newly generated ones,
+    keeping the rows ordered by tile.
+    """
+    parts = [] if new is None else [new]
+    if path.is_file():
+        old = pd.read_parquet(path, engine="fastparquet")
+        parts.insert(0, old[~np.isin(tile_keys(old["TILE_ID"]), stale_keys)])
+    if not parts:
+        return pd.DataFrame()
+    spliced = pd.concat(parts, ignore_index=True)
+    return spliced.iloc[np.argsort(tile_keys(spliced["TILE_ID"]), kind="stable")].reset_index(drop=True)
+
+
+def generate_incremental(
+    territory: TerritoryCode,
+    filo: gpd.GeoDataFrame,
+    ban: pd.DataFrame,
+    outputDir: Path,
+    seed: int,
+    partition_tiles: int = PARTITION_TILES,
+    profile: SchemaProfile = "default",
+    id_format: IdFormat = "string",
+) -> PartitionedOutputManifest:
+    """
+    Updates the tile-partitioned households and population databases of `outputDir`,
+    regenerating only the tiles whose inputs changed since the previous run.
+
+    Since the generation of a tile only depends on the seed and its inputs, the tiles whose
+    fingerprint did not change are kept as is, and the partitions holding no modified tile
+    are not rewritten. Each partition (a square of `partition_tiles` x `partition_tiles` tiles)
+    is stored as a `part-N<north>E<east>.parquet` file of the `households` and `population` folders.
+    When the previous output cannot be updated (e.g. it was generated with another seed), its partition files
+    are removed (including the ones of tiles that no longer exist) and all the tiles are regenerated.
+
+    Args:
+        territory (TerritoryCode): territory of the inputs
+        filo (gpd.GeoDataFrame): refined FILO database
+        ban (pd.DataFrame): BAN database
+        outputDir (Path): folder of the tile-partitioned output
+        seed (int): seed of the generation
+        partition_tiles (int, optional): width of the partitions, in tiles
+        profile (SchemaProfile, optional): column types of the output (see `households_dtypes`)
+        id_format (IdFormat, optional): identifiers of the output, as strings or packed integers
+
+    Returns:
+        PartitionedOutputManifest: description of the updated output
+    """
+    hh_dir, pop_dir = outputDir / "households", outputDir / "population"
+    hh_dir.mkdir(parents=True, exist_ok=True)
+    pop_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file, fingerprints_file = outputDir / MANIFEST_FILENAME, outputDir / FINGERPRINTS_FILENAME
+
+    fingerprints = tile_fingerprints(filo, ban)
+    previous = pd.Series(dtype=np.uint64, index=pd.Index([], dtype=np.int64, name="tile_key"))
+    regenerate_all = True
+    if manifest_file.is_file() and fingerprints_file.is_file():
+        with open(manifest_file, encoding="utf-8") as file:
+            old_manifest = PartitionedOutputManifest(**json.load(file))
+        if (
+            old_manifest.territory,
+            old_manifest.seed,
+            old_manifest.partition_tiles,
+            old_manifest.profile,
+            old_manifest.id_format,
+        ) == (territory, seed, partition_tiles, profile, id_format):
+            previous = pd.read_parquet(fingerprints_file, engine="fastparquet")["fingerprint"]
+            regenerate_all = False
+        else:
+            logging.info("Previous output was generated with other parameters, regenerating all tiles")
+            # So that an interrupted regeneration is not taken for an update of the previous output
+            fingerprints_file.unlink()
+            manifest_file.unlink()
+
+    if regenerate_all:
+        # Partitions of a previous output, including the ones of tiles that no longer exist
+        for directory in (hh_dir, pop_dir):
+            for path in directory.glob("part-*.parquet"):
+                path.unlink()
+
+    # Tiles to (re)generate (new or modified), and tiles whose previous output must be discarded
+    known = fingerprints.index.isin(previous.index)
+    changed_tiles = ~known
+    changed_tiles[known] = fingerprints[known].to_numpy() != previous[fingerprints.index[known]].to_numpy()
+    removed_keys = previous.index[~previous.index.isin(fingerprints.index)].to_numpy()
+    stale_keys = np.concatenate([fingerprints.index[changed_tiles].to_numpy(), removed_keys])
+    logging.info(f"{changed_tiles.sum()} tiles out of {len(filo)} to regenerate, {len(removed_keys)} tiles removed")
+
+    stale_partitions = partition_keys(stale_keys, partition_tiles)
+    changed_filo = filo[changed_tiles]
+    changed_ban = ban[ban["tile_id"].isin(changed_filo["tile_id"])]
+    updated_partitions = np.unique(stale_partitions)
+    # The changed tiles, their addresses and the stale tiles are grouped by partition once for all
+    filo_rows = _partition_rows(
+        partition_keys(fingerprints.index[changed_tiles].to_numpy(), partition_tiles), updated_partitions
+    )
+    ban_rows = _partition_rows(partition_keys(tile_keys(changed_ban["tile_id"]), partition_tiles), updated_partitions)
+    stale_rows = _partition_rows(stale_partitions, updated_partitions)
+    for i, partition in enumerate(updated_partitions):
+        households = list(
+            generate_households(
+                territory=territory,
+                filo_df=changed_filo.iloc[filo_rows[i]],
+                ban_df=changed_ban.iloc[ban_rows[i]],
+                seed=seed,
+            )
+        )
+        population = [ind for hh in households for ind in generate_population(hh, seed)]
+        partition_stale_keys = stale_keys[stale_rows[i]]
+        filename = partition_filename(int(partition))
+        for directory, new in (
+            (hh_dir, mkHouseholdsDataFrame(households, territory, profile, id_format) if households else None),
+            (pop_dir, mkPopulationDataFrame(population, territory, profile, id_format) if population else None),
+        ):
+            if new is not None:
+                new = plain_categories(new, keep_ordered=True).to_wkb()
+            _replace_parquet(
+                _splice(directory / filename, partition_stale_keys, new),
+                directory / filename,
+            )
+        logging.debug(f"Partition {filename} updated ({i + 1} out of {len(updated_partitions)})")
+
+    manifest = PartitionedOutputManifest(
+        territory=territory,
+        seed=seed,
+        partition_tiles=partition_tiles,
+        profile=profile,
+        id_format=id_format,
+        nb_tiles=len(filo),
+        nb_households=int(filo["men"].sum()),
+        nb_individuals=int(filo["ind"].sum()),
+    )
+    _replace_parquet(fingerprints.rename("fingerprint").to_frame(), fingerprints_file)
+    tmp_path = manifest_file.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(asdict(manifest), file, indent=1)
+    os.replace(tmp_path, manifest_file)
+    logging.info(f"{len(updated_partitions)} partitions updated in {outputDir}")
+    return manifest
@@ -0,0 +1,211 @@
+import cProfile
+import json
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Literal
+
+from .batching import current_rss
+
+# Stages timed by the generation pipeline
+LOAD_FILO = "load_FILO"
+REFINE_FILO = "refine_FILO"
+LOAD_BAN = "load_BAN"
+BAN_INDEX = "BAN index build"
+ADDRESS_COMPACTION = "address compaction"
+HOUSEHOLDS_GENERATION = "households generation"
+POPULATION_EXPANSION = "population expansion"
+DATAFRAME_CONSTRUCTION = "DataFrame construction"
+
+ProfilerName = Literal["cprofile", "pyinstrument"]
+
+
+class Instrumentation:
+    """
+    Collects timers and counters of the stages of a generation run, samples its resident set size,
+    and writes them as a JSON run report.
+
+    While activated (`with Instrumentation() as instrumentation:`), the pipeline functions record
+    their stages through the module functions `stage` and `count`, which are no-ops otherwise.
+
+    One stage can be profiled with cProfile or pyinstrument (if installed): the profile only covers the
+    time spent in that stage, and is saved to `profile_output` (a `.prof` file for cProfile, readable
+    with `snakeviz` or `pstats`, or an HTML report for pyinstrument) when the instrumentation is closed.
+    """
+
+    def __init__(
+        self,
+        rss_interval: float = 0.5,
+        profile_stage: str | None = None,
+        profiler: ProfilerName = "cprofile",
+        profile_output: Path | None = None,
+    ):
+        self.timers: dict[str, int] = defaultdict(int)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.rss_interval = rss_interval
+        self.peak_rss = current_rss()
+        self.profile_stage = profile_stage
+        self.profiler_name = profiler
+        self.profile_output = profile_output
+        self._profiler: Any = None
+        self._start = time.perf_counter_ns()
+        self._end: int | None = None
+        self._first_count: int | None = None
+        self._stop_sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+        self._previous: Instrumentation | None = None
+        # Stages may be timed by several threads at once (e.g. the parallel loading of the inputs)
+        self._timers_lock = threading.Lock()
+
+    def _sample_rss(self) -> None:
+        while not self._stop_sampling.wait(self.rss_interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds elapsed since the instrumentation was created (until it was closed)."""
+        return ((self._end or time.perf_counter_ns()) - self._start) / 1e9
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times a stage (stages can be nested, entered any number of times and by several threads)."""
+        profiled = name == self.profile_stage
+        if profiled:
+            self._start_profiler()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            with self._timers_lock:
+                self.timers[name] += time.perf_counter_ns() - start
+                self.calls[name] += 1
+            if profiled:
+                self._stop_profiler()
+
+    def add_stages(self, timers: dict[str, int], calls: dict[str, int]) -> None:
+        """Adds the stages timed in another process (e.g. the worker loading the BAN in parallel)."""
+        with self._timers_lock:
+            for name, ns in timers.items():
+                self.timers[name] += ns
+                self.calls[name] += calls.get(name, 1)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self._first_count is None:
+            self._first_count = time.perf_counter_ns()
+        self.counters[name] += n
+
+    def _start_profiler(self) -> None:
+        if self._profiler is None:
+            if self.profiler_name == "pyinstrument":
+                try:
+                    from pyinstrument import Profiler
+                except ImportError as e:
+                    raise ImportError("Profiling with pyinstrument requires the `pyinstrument` package") from e
+                self._profiler = Profiler()
+            else:
+                self._profiler = cProfile.Profile()
+        if self.profiler_name == "pyinstrument":
+            # The profiler combines the sessions recorded between successive starts and stops
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def _stop_profiler(self) -> None:
+        if self.profiler_name == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def _save_profile(self) -> None:
+        if self._profiler is None:
+            return
+        output = self.profile_output or Path(f"profile.{'html' if self.profiler_name == 'pyinstrument' else 'prof'}")
+        if self.profiler_name == "pyinstrument":
+            output.write_text(self._profiler.output_html(), encoding="utf-8")
+        else:
+            self._profiler.dump_stats(output)
+        logging.info(f"Profile of stage '{self.profile_stage}' saved to {output}")
+
+    def rates(self) -> dict[str, float]:
+        """Numbers of tiles, households and individuals processed per second since the start of the run."""
+        elapsed = self.elapsed
+        return {f"{name}/s": self.counters[name] / elapsed for name in ("tiles", "households", "individuals")}
+
+    def progress(self, done: int, total: int, unit: str = "households", initial: int = 0) -> str:
+        """
+        Describes the progress of the run, with the current rate and the estimated time remaining
+        (`initial` being the number of units already done when the run started, e.g. when resuming).
+        The rate is measured since the first counted item, so that it does not include the loading of the inputs.
+        """
+        elapsed = (time.perf_counter_ns() - (self._first_count or self._start)) / 1e9
+        rate = (done - initial) / elapsed if elapsed > 0 else 0.0
+        eta = time.strftime("%H:%M:%S", time.gmtime((total - done) / rate)) if rate > 0 else "?"
+        share = done / total if total else 1.0
+        return f"{done}/{total} {unit} ({share:.2%}), {rate:.0f} {unit}/s, ETA {eta}"
+
+    def report(self) -> dict[str, Any]:
+        sampled_peak = max(self.peak_rss, current_rss())
+        try:
+            import resource
+        except ImportError:  # Windows: only the sampled peak is available
+            peak = sampled_peak
+        else:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = peak if sys.platform == "darwin" else peak * 1024
+        return {
+            "elapsed_s": self.elapsed,
+            "stages": {
+                name: {"seconds": ns / 1e9, "calls": self.calls[name]}
+                for name, ns in sorted(self.timers.items(), key=lambda item: -item[1])
+            },
+            "counters": dict(self.counters),
+            "rates": self.rates(),
+            "peak_rss_sampled_bytes": sampled_peak,
+            "peak_rss_bytes": peak,
+        }
+
+    def save_report(self, path: Path, **extra: Any) -> None:
+        """Writes the run report (and any extra JSON serializable information) to a JSON file."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report() | extra, file, indent=1)
+        logging.info(f"Run report saved to {path}")
+
+    def __enter__(self) -> "Instrumentation":
+        global _active
+        self._previous, _active = _active, self
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active
+        _active = self._previous
+        self._end = time.perf_counter_ns()
+        self._stop_sampling.set()
+        self._sampler.join()
+        self._save_profile()
+
+
+_active: Instrumentation | None = None
+
+
+def stage(name: str):
+    """Times a stage with the active instrumentation, if any."""
+    return nullcontext() if _active is None else _active.stage(name)
+
+
+def add_stages(timers: dict[str, int], calls: dict[str, int]) -> None:
+    """Adds stages timed in another process to the active instrumentation, if any."""
+    if _active is not None:
+        _active.add_stages(timers, calls)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increments a counter of the active instrumentation, if any."""
+    if _active is not None:
+        _active.count(name, n)
@@ -0,0 +1,493 @@
+"""
+Optional JIT backend of the generation: the "numba" engine (see `GenerationEngine`).
+
+The naturally iterative steps of the generation (the rounding of the FILO counts and its feasibility repairs,
+the household sizes and the capped sequential allocation of the ages) are written as kernels on flat arrays,
+compiled with Numba when it is installed, and run as plain Python otherwise (with the same results, only slower).
+Each tile draws from its own splitmix64 generator, whose 64-bit state is explicitly threaded through the kernels:
+it is seeded from the seed, the key and the stream of the tile for the refinement (like `keyed_random`),
+and from the random generator of the tile for the households.
+The engine is statistically equivalent to the legacy implementation (see `compare_engines`),
+but does not draw the same numbers.
+"""
+
+import functools
+import logging
+from collections.abc import Generator
+from typing import cast
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from .download_filo import REFINED_COLUMNS, assemble_refined_FILO
+from .households_gen import ALIAS_PROBABILITY, ALIAS_ROW
+from .metadata import HouseholdsFeature
+from .utils import (
+    _MASK64,
+    ADULT_AGE_COLUMNS,
+    ALL_AGE_COLUMNS,
+    MINOR_AGE_COLUMNS,
+    REFINE_STREAM,
+    TerritoryCode,
+    filo_crs,
+    household_id,
+    resolve_seed,
+    territory_crs,
+    tile_key,
+    tile_keys,
+)
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def _kernel(function):
+    """Compiles a kernel in nopython mode (cached on disk) when Numba is installed."""
+    return function if numba is None else numba.njit(cache=True)(function)
+
+
+@functools.cache
+def _warn_without_numba() -> None:
+    if not NUMBA_AVAILABLE:
+        logging.warning("Numba is not installed: the kernels of the numba engine run as (slow) plain Python")
+
+
+# Constants of splitmix64 (see `utils._splitmix64`), as unsigned integers for the kernels
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SHIFT_11 = np.uint64(11)
+_SHIFT_27 = np.uint64(27)
+_SHIFT_30 = np.uint64(30)
+_SHIFT_31 = np.uint64(31)
+_REFINE_STREAM = np.uint64(REFINE_STREAM)
+
+# Positions of the counts in the rows of the refinement kernel (REFINED_COLUMNS)
+_IND = REFINED_COLUMNS.index("ind")
+_MEN = REFINED_COLUMNS.index("men")
+_AGES = REFINED_COLUMNS.index(ALL_AGE_COLUMNS[0])
+_MEN_1IND = REFINED_COLUMNS.index("men_1ind")
+_MEN_5IND = REFINED_COLUMNS.index("men_5ind")
+_MEN_FMP = REFINED_COLUMNS.index("men_fmp")
+_BATS = np.array([REFINED_COLUMNS.index(c) for c in REFINED_COLUMNS[_MEN_FMP + 1 :]])
+# Positions of the age classes in ALL_AGE_COLUMNS
+_NB_AGES = len(ALL_AGE_COLUMNS)
+_ADULTS = np.array([ALL_AGE_COLUMNS.index(c) for c in ADULT_AGE_COLUMNS])
+_MINORS = np.array([ALL_AGE_COLUMNS.index(c) for c in MINOR_AGE_COLUMNS])
+# Counts of a refined tile given to the households kernel
+TILE_KERNEL_COLUMNS: list[str] = ["ind", "men", "men_1ind", "men_5ind", *ALL_AGE_COLUMNS]
+
+
+@_kernel
+def _splitmix64(z):
+    z = z + _GOLDEN
+    z = (z ^ (z >> _SHIFT_30)) * _MIX_1
+    z = (z ^ (z >> _SHIFT_27)) * _MIX_2
+    return z ^ (z >> _SHIFT_31)
+
+
+@_kernel
+def _random(state):
+    """Uniform draw in [0, 1), advancing the generator state (a 1-element uint64 array)."""
+    z = _splitmix64(state[0])
+    state[0] += _GOLDEN
+    return (z >> _SHIFT_11) * 2.0**-53
+
+
+@_kernel
+def _randint(n, state):
+    """Uniform draw in [0, n)."""
+    return min(int(_random(state) * n), n - 1)
+
+
+@_kernel
+def _round_random(x, state):
+    """Random rounding of `x`, up with a probability equal to its fractional part (see `single_round_alea`)."""
+    floor = np.floor(x)
+    return int(floor) + (1 if _random(state) < x - floor else 0)
+
+
+@_kernel
+def _shuffle(values, state):
+    """Fisher-Yates shuffle, in place."""
+    for i in range(values.shape[0] - 1, 0, -1):
+        j = _randint(i + 1, state)
+        values[i], values[j] = values[j], values[i]
+
+
+@_kernel
+def _repeat_classes(age_counts, classes):
+    """Age classes `classes` repeated as many times as they occur."""
+    total = 0
+    for c in classes:
+        total += age_counts[c]
+    values = np.empty(total, dtype=np.int64)
+    k = 0
+    for c in classes:
+        for _ in range(age_counts[c]):
+            values[k] = c
+            k += 1
+    return values
+
+
+@_kernel
+def _refine_tiles(values, keys, seed):
+    """
+    Kernel of `refine_FILO_tile` on all the tiles: integer counts (int64) of the tiles from their raw counts
+    (float64), both in the order of REFINED_COLUMNS.
+    """
+    counts = np.empty(values.shape, dtype=np.int64)
+    state = np.empty(1, dtype=np.uint64)
+    bumps = np.empty(_NB_AGES)
+    for t in range(values.shape[0]):
+        state[0] = _splitmix64(_splitmix64(seed ^ keys[t]) ^ _REFINE_STREAM)
+        raw = values[t]
+        o = counts[t]
+        ind = max(1, _round_random(raw[_IND], state))
+        men = min(ind, max(1, _round_random(raw[_MEN], state)))
+        o[_IND] = ind
+        o[_MEN] = men
+
+        nb_indiv = 0
+        for c in range(_NB_AGES):
+            floor = np.floor(raw[_AGES + c])
+            # Keep the rounded down value for now, with a score for the column's likelihood to be bumped +1
+            o[_AGES + c] = int(floor)
+            nb_indiv += int(floor)
+            bumps[c] = (raw[_AGES + c] - floor) * _random(state)
+
+        missing_adults = men
+        for c in _ADULTS:
+            missing_adults -= o[_AGES + c]
+        if missing_adults > 0:
+            # Stable sorts, like `sorted`: the first columns win the ties
+            order = np.argsort(-bumps[_ADULTS], kind="mergesort")
+            for j in range(min(missing_adults, order.shape[0])):
+                c = _ADULTS[order[j]]
+                o[_AGES + c] += 1
+                nb_indiv += 1
+                bumps[c] = 0.0
+
+        missing_indiv = ind - nb_indiv
+        if missing_indiv > 0:
+            order = np.argsort(-bumps, kind="mergesort")
+            for j in range(min(missing_indiv, _NB_AGES)):
+                o[_AGES + order[j]] += 1
+        elif missing_indiv < 0:
+            eligible = _MINORS[o[_AGES + _MINORS] > 0]
+            order = np.argsort(bumps[eligible], kind="mergesort")
+            for j in range(min(-missing_indiv, order.shape[0])):
+                o[_AGES + eligible[order[j]]] -= 1
+
+        floor = np.floor(raw[_MEN_1IND])
+        men_1ind, remain_men_1ind = int(floor), raw[_MEN_1IND] - floor
+        floor = np.floor(raw[_MEN_5IND])
+        men_5ind, remain_men_5ind = int(floor), raw[_MEN_5IND] - floor
+        o[_MEN_FMP] = int(np.floor(raw[_MEN_FMP]))
+
+        # Feasibility repairs of the numbers of households of 1 and 5+ individuals (see `refine_FILO_tile`)
+        while men_5ind > 0 and 3 * men_5ind > ind - 2 * men + men_1ind:
+            men_5ind -= 1
+            remain_men_5ind = 1.0
+        while men_1ind > 0 and men_5ind == 0 and 3 * men_1ind > 4 * men - ind:
+            men_1ind -= 1
+            remain_men_1ind = 1.0
+        while men_1ind < 2 * men + 3 * men_5ind - ind:
+            men_1ind += 1
+            remain_men_1ind = 0.0
+        if (men_5ind > 0 or 3 * (1 + men_1ind) <= 3 * men - ind) and _random(state) < remain_men_1ind:
+            men_1ind += 1
+        if men_5ind == 0 and 3 * men_1ind > 4 * men - ind:
+            men_5ind = 1
+            remain_men_5ind = 0.0
+        if 3 * (1 + men_5ind) <= ind - 2 * men + men_1ind and _random(state) < remain_men_5ind:
+            men_5ind += 1
+        o[_MEN_1IND] = men_1ind
+        o[_MEN_5IND] = men_5ind
+
+        for b in _BATS:
+            o[b] = min(men, _round_random(raw[b], state))
+    return counts
+
+
+@_kernel
+def _household_sizes(ind, men, men_1ind, men_5ind, state):
+    """Kernel of `generate_household_sizes`."""
+    hh_1 = men_1ind
+    hh_5p = men_5ind
+    hh_24 = men - hh_1 - hh_5p
+    if hh_24 < 0:
+        hh_5p = max(0, hh_5p + hh_24)
+        hh_24 = men - hh_1 - hh_5p
+    if hh_24 < 0:
+        hh_1 = max(0, hh_1 + hh_24)
+        hh_24 = men - hh_1 - hh_5p
+
+    while hh_5p > 0 and hh_1 + 2 * hh_24 + 5 * hh_5p > ind:
+        hh_5p -= 1
+        hh_24 += 1
+    while hh_24 > 0 and hh_1 + 2 * hh_24 + 5 * hh_5p > ind:
+        hh_24 -= 1
+        hh_1 += 1
+    while hh_1 > 0 and hh_1 + 4 * hh_24 + 5 * hh_5p < ind:
+        hh_1 -= 1
+        hh_24 += 1
+    while hh_24 > 0 and hh_1 + 4 * hh_24 + 5 * hh_5p < ind:
+        hh_24 -= 1
+        hh_5p += 1
+
+    nb = hh_1 + hh_24 + hh_5p
+    sizes = np.empty(nb, dtype=np.int64)
+    sizes[:hh_1] = 1
+    sizes[hh_1 : hh_1 + hh_24] = 2
+    sizes[hh_1 + hh_24 :] = 5
+    remaining_ind = ind - hh_1 - 2 * hh_24 - 5 * hh_5p
+
+    # The individuals first complete the intermediate households (2-3), up to 4 individuals:
+    # the households reaching 4 individuals are swapped out of the adjustable ones
+    adjustable = np.arange(hh_1, hh_1 + hh_24)
+    nb_adjustable = hh_24
+    while remaining_ind > 0 and nb_adjustable > 0:
+        j = _randint(nb_adjustable, state)
+        sizes[adjustable[j]] += 1
+        remaining_ind -= 1
+        if sizes[adjustable[j]] == 4:
+            nb_adjustable -= 1
+            adjustable[j] = adjustable[nb_adjustable]
+    # Then the large households (5+)
+    while remaining_ind > 0 and hh_5p > 0:
+        sizes[hh_1 + hh_24 + _randint(hh_5p, state)] += 1
+        remaining_ind -= 1
+    # Then any household
+    while remaining_ind > 0 and nb > 0:
+        sizes[_randint(nb, state)] += 1
+        remaining_ind -= 1
+    return sizes
+
+
+@_kernel
+def _allocate_ages(sizes, age_counts, state):
+    """
+    Kernel of `get_households_with_ages`: numbers of individuals of each age class (households x age classes)
+    and numbers of adults of the households of given sizes.
+    """
+    nb = sizes.shape[0]
+    adult_ages = _repeat_classes(age_counts, _ADULTS)
+    minor_ages = _repeat_classes(age_counts, _MINORS)
+    if nb == 0 or adult_ages.shape[0] < nb or adult_ages.shape[0] + minor_ages.shape[0] != sizes.sum():
+        raise ValueError("Incoherent input tile!")
+    _shuffle(adult_ages, state)
+    _shuffle(minor_ages, state)
+
+    ages = np.zeros((nb, _NB_AGES), dtype=np.int64)
+    nb_adults = np.ones(nb, dtype=np.int64)
+    remaining_adults = adult_ages.shape[0]
+    for h in range(nb):
+        remaining_adults -= 1
+        ages[h, adult_ages[remaining_adults]] += 1
+
+    # Successively distribute the remaining adults in the eligible households,
+    # the full households being swapped out of the eligible ones
+    eligible = np.empty(nb, dtype=np.int64)
+    nb_eligible = 0
+    for h in range(nb):
+        if nb_adults[h] < sizes[h]:
+            eligible[nb_eligible] = h
+            nb_eligible += 1
+    while remaining_adults > 0 and nb_eligible > 0:
+        j = _randint(nb_eligible, state)
+        h = eligible[j]
+        remaining_adults -= 1
+        ages[h, adult_ages[remaining_adults]] += 1
+        nb_adults[h] += 1
+        if nb_adults[h] == sizes[h]:
+            nb_eligible -= 1
+            eligible[j] = eligible[nb_eligible]
+
+    # Then the minors complete the households
+    remaining_minors = minor_ages.shape[0]
+    for h in range(nb):
+        for _ in range(sizes[h] - nb_adults[h]):
+            if remaining_minors == 0:
+                raise ValueError("Incoherent input tile!")
+            remaining_minors -= 1
+            ages[h, minor_ages[remaining_minors]] += 1
+    return ages, nb_adults
+
+
+@_kernel
+def alias_tables(weights, starts, ends):
+    """
+    Walker alias tables (built with Vose's method) of the groups of rows [starts[g], ends[g]) of `weights`,
+    for weighted draws in O(1) within each group: a row drawn uniformly in its group is kept with its
+    probability, and replaced by its alias (a row of the group, relative to its start) otherwise.
+    The groups whose weights are all zero are drawn uniformly.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: probabilities (float64) and aliases (int64) of the rows
+    """
+    probabilities = np.ones(weights.shape[0])
+    aliases = np.empty(weights.shape[0], dtype=np.int64)
+    small = np.empty(weights.shape[0], dtype=np.int64)
+    large = np.empty(weights.shape[0], dtype=np.int64)
+    for g in range(starts.shape[0]):
+        start, end = starts[g], ends[g]
+        for i in range(start, end):
+            aliases[i] = i - start
+        total = weights[start:end].sum()
+        if total <= 0:
+            continue
+        nb_small = nb_large = 0
+        for i in range(start, end):
+            probabilities[i] = weights[i] * (end - start) / total
+            if probabilities[i] < 1.0:
+                small[nb_small] = i
+                nb_small += 1
+            else:
+                large[nb_large] = i
+                nb_large += 1
+        while nb_small > 0 and nb_large > 0:
+            nb_small -= 1
+            i = small[nb_small]
+            j = large[nb_large - 1]
+            # The missing probability of the small row is taken from the large one
+            aliases[i] = j - start
+            probabilities[j] -= 1.0 - probabilities[i]
+            if probabilities[j] < 1.0:
+                nb_large -= 1
+                small[nb_small] = j
+                nb_small += 1
+        # Leftovers (of probability 1 up to rounding errors)
+        for k in range(nb_large):
+            probabilities[large[k]] = 1.0
+        for k in range(nb_small):
+            probabilities[small[k]] = 1.0
+    return probabilities, aliases
+
+
+@_kernel
+def _tile_households(counts, nb_addresses, alias_probabilities, alias_rows, state):
+    """
+    Kernel of `generate_tile_households`: from the counts of a tile (TILE_KERNEL_COLUMNS), its number
+    of addresses and their alias tables (empty for uniform draws, see `alias_tables`), returns the sizes,
+    ages (see `_allocate_ages`), numbers of adults and income parts of its households, the rows of their
+    drawn addresses, and uniform draws locating them in the tile if it has no address (instead of the rows).
+    """
+    ind, men, men_1ind, men_5ind = counts[0], counts[1], counts[2], counts[3]
+    sizes = _household_sizes(ind, men, men_1ind, men_5ind, state)
+    nb = sizes.shape[0]
+    if nb == 0:
+        return (
+            sizes,
+            np.zeros((0, _NB_AGES), dtype=np.int64),
+            sizes,
+            np.empty(0),
+            sizes,
+            np.empty((0, 2)),
+        )
+    if sizes.sum() != ind or nb != men:
+        raise ValueError("Incoherent household sizes!")
+    ages, nb_adults = _allocate_ages(sizes, counts[4:], state)
+
+    parts = np.empty(nb)
+    for h in range(nb):
+        parts[h] = _random(state)
+    if nb_addresses > 0:
+        # Possibly the same address for several households
+        rows = np.empty(nb, dtype=np.int64)
+        for h in range(nb):
+            rows[h] = _randint(nb_addresses, state)
+            if alias_probabilities.shape[0] > 0 and _random(state) >= alias_probabilities[rows[h]]:
+                rows[h] = alias_rows[rows[h]]
+        uniforms = np.empty((0, 2))
+    else:
+        rows = np.empty(0, dtype=np.int64)
+        uniforms = np.empty((nb, 2))
+        for h in range(nb):
+            uniforms[h, 0] = _random(state)
+            uniforms[h, 1] = _random(state)
+    return sizes, ages, nb_adults, parts, rows, uniforms
+
+
+def refine_FILO_jit(raw_gdf: gpd.GeoDataFrame, seed: int | None = None) -> gpd.GeoDataFrame:
+    """
+    Version of `refine_FILO` running the refinement of all the tiles in a single (compiled) kernel.
+    """
+    _warn_without_numba()
+    logging.info("Refining FILO (numba engine)...")
+    seed = resolve_seed(seed)
+    keys = pd.Series(tile_keys(raw_gdf["idcar_200m"]), index=raw_gdf.index)
+    values = raw_gdf[REFINED_COLUMNS].to_numpy(dtype=np.float64)
+    # Without Numba, the wrapping of the uint64 arithmetic warns
+    with np.errstate(over="ignore"):
+        counts = _refine_tiles(values, keys.to_numpy().astype(np.uint64), np.uint64(seed & _MASK64))
+    gdf = assemble_refined_FILO(raw_gdf, pd.DataFrame(counts, columns=REFINED_COLUMNS, index=raw_gdf.index), keys)
+    logging.info("FILO refinement done.")
+    return gdf
+
+
+@functools.cache
+def _tile_transformer(territory: TerritoryCode) -> Transformer:
+    return Transformer.from_crs(filo_crs(territory), territory_crs(territory), always_xy=True)
+
+
+def generate_tile_households_jit(
+    tile: pd.Series, addresses: pd.DataFrame, territory: TerritoryCode, rng: np.random.Generator | None = None
+) -> Generator[HouseholdsFeature]:
+    """
+    Version of `generate_tile_households` drawing the households of the tile in a (compiled) kernel,
+    with a generator state seeded from the random generator of the tile.
+    """
+    _warn_without_numba()
+    rng = np.random.default_rng() if rng is None else rng
+    state = np.array([rng.bit_generator.random_raw()], dtype=np.uint64)
+    tile_id = tile["tile_id"]
+    counts = np.array([tile[c] for c in TILE_KERNEL_COLUMNS], dtype=np.int64)
+    if ALIAS_PROBABILITY in addresses.columns:
+        alias_probabilities = addresses[ALIAS_PROBABILITY].to_numpy()
+        alias_rows = addresses[ALIAS_ROW].to_numpy()
+    else:
+        alias_probabilities, alias_rows = np.empty(0), np.empty(0, dtype=np.int64)
+    try:
+        with np.errstate(over="ignore"):
+            sizes, ages, nb_adults, parts, rows, uniforms = _tile_households(
+                counts, len(addresses), alias_probabilities, alias_rows, state
+            )
+    except ValueError as e:
+        raise Exception(f"[allocate_adults] TILE {tile_id}: {e}") from e
+    if len(sizes) == 0:
+        return
+
+    if len(rows):
+        points = shapely.points(addresses["x"].to_numpy()[rows], addresses["y"].to_numpy()[rows])
+    else:
+        # Without addresses, fictitious points are drawn within the tile
+        x = tile["XSO"] + uniforms[:, 0] * (tile["XNE"] - tile["XSO"])
+        y = tile["YSO"] + uniforms[:, 1] * (tile["YNE"] - tile["YSO"])
+        points = shapely.points(*_tile_transformer(territory).transform(x, y))
+    niveaux_vie = tile["ind_snv"] * parts / parts.sum() / sizes
+
+    key = tile_key(tile_id)
+    for h, (size, nb_adult, hh_ages, niveau_vie, point) in enumerate(
+        zip(sizes.tolist(), nb_adults.tolist(), ages.tolist(), niveaux_vie.tolist(), points, strict=True)
+    ):
+        household = {
+            "ID": household_id(key, h + 1),
+            "TILE_ID": tile_id,
+            "SIZE": size,
+            "GRD_MENAGE": size >= 5,
+            "MONOPARENT": nb_adult == 1 and size > nb_adult,
+            "NB_ADULTS": nb_adult,
+            "NB_MINORS": size - nb_adult,
+            **dict(zip(ALL_AGE_COLUMNS, hh_ages, strict=True)),
+            "NIVEAU_VIE": niveau_vie,
+            "geometry": point,
+        }
+        yield cast(HouseholdsFeature, household)
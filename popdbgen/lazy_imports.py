@@ -0,0 +1,72 @@
+import ast
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_module(name: str) -> ModuleType:
+    """
+    Returns a (top-level) module whose import is deferred until one of its attributes is first accessed,
+    or the module itself if it is already imported. Used for the heavy dependencies (pandas, geopandas...)
+    of the modules on the import path of the light helpers and of the scripts' command line parsing.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        # Missing module: raises the usual ModuleNotFoundError right away
+        return importlib.import_module(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def lazy_attributes(package: str, submodules_attributes: dict[str, list[str]]):
+    """
+    Returns the module level `__getattr__` and `__dir__` functions (PEP 562) of a package exposing
+    attributes of its submodules (`{submodule name: [attribute names]}`), only importing a submodule
+    when one of its attributes is first accessed.
+    """
+    package_module = sys.modules[package]
+    attributes = {name: submodule for submodule, names in submodules_attributes.items() for name in names}
+
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(f".{attributes[name]}", package), name)
+        # Cached as a regular attribute of the package: later accesses do not go through __getattr__
+        setattr(package_module, name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(package_module.__dict__) | set(attributes))
+
+    return __getattr__, __dir__
+
+
+def check_type_checking_imports(package: str) -> list[str]:
+    """
+    Compares the imports of the `if TYPE_CHECKING:` block of a package `__init__` (seen by type checkers
+    and IDEs) with its lazy attributes (`_submodules_attributes`, see `lazy_attributes`), returning the differences.
+    """
+    package_module = importlib.import_module(package)
+    with open(package_module.__file__, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    imported: dict[str, set[str]] = {}
+    for node in tree.body:
+        if isinstance(node, ast.If) and isinstance(node.test, ast.Name) and node.test.id == "TYPE_CHECKING":
+            for statement in node.body:
+                if isinstance(statement, ast.ImportFrom) and statement.level == 1 and statement.module:
+                    imported.setdefault(statement.module, set()).update(alias.name for alias in statement.names)
+    lazy = {submodule: set(names) for submodule, names in package_module._submodules_attributes.items()}
+    differences = []
+    for submodule in sorted(imported.keys() | lazy.keys()):
+        for name in sorted(imported.get(submodule, set()) - lazy.get(submodule, set())):
+            differences.append(f"{package}.{submodule}.{name} is imported if TYPE_CHECKING, but is not lazy")
+        for name in sorted(lazy.get(submodule, set()) - imported.get(submodule, set())):
+            differences.append(f"{package}.{submodule}.{name} is lazy, but is not imported if TYPE_CHECKING")
+    return differences
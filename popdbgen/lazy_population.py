@@ -0,0 +1,137 @@
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from .households_gen import generate_population
+from .instrumentation import DATAFRAME_CONSTRUCTION, POPULATION_EXPANSION, count, stage
+from .metadata import HouseholdsFeature, IdFormat, SchemaProfile
+from .utils import ALL_AGE_COLUMNS, household_id, mkPopulationDataFrame, tile_keys
+from .validation import read_columns, run_tile_keys
+
+RECIPE_SUFFIX = ".population.json"
+# Columns of the households needed to expand their individuals
+POPULATION_SOURCE_COLUMNS = ["geometry", "ID", "TILE_ID", "SIZE", "GRD_MENAGE", "MONOPARENT", "NIVEAU_VIE"]
+
+
+@dataclass
+class PopulationRecipe:
+    """
+    Parameters needed to expand the population of a households database generated without it.
+
+    The ages of the individuals of a household are keyed draws from the generation seed, the tile key
+    and the ranks of the household and of the individual (see `generate_population`): each tile has
+    its own random stream, derived from the seed, so the individuals of any subset of the tiles
+    can be generated again on demand, identical to the ones of a full generation.
+    """
+
+    territory: str
+    seed: int
+    profile: SchemaProfile = "default"
+    id_format: IdFormat = "string"
+    nb_households: int = 0
+    nb_individuals: int = 0
+
+    def save(self, path: Path) -> None:
+        """Atomically (over)writes the recipe file."""
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(self), file, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "PopulationRecipe":
+        with open(path, encoding="utf-8") as file:
+            return cls(**json.load(file))
+
+
+def recipe_path(households_path: Path) -> Path:
+    """
+    Returns the path of the population recipe of a households database
+    (e.g. `households_974.population.json` for `households_974.parquet`).
+    """
+    return households_path.with_suffix(RECIPE_SUFFIX)
+
+
+def households_features(households: pd.DataFrame, keys: np.ndarray | None = None) -> list[HouseholdsFeature]:
+    """
+    Rebuilds the generated features of households read back from a database (with WKB geometries),
+    whose identifiers are either strings ("<TILE_ID>_<rank>") or packed integers.
+
+    Args:
+        households (pd.DataFrame): households, with at least the `POPULATION_SOURCE_COLUMNS` and the age classes
+        keys (np.ndarray, optional): tile keys of the households, computed from `TILE_ID` if omitted
+
+    Returns:
+        list[HouseholdsFeature]: households features, as expected by `generate_population`
+    """
+    keys = run_tile_keys(households["TILE_ID"]) if keys is None else keys
+    ids = households["ID"]
+    if pd.api.types.is_integer_dtype(ids.dtype):
+        hh_ids = ids.to_numpy(dtype=np.int64)
+    else:
+        hh_ids = household_id(keys, ids.astype("string").str.rsplit("_", n=1).str[1].astype(np.int64).to_numpy())
+    features = households[[*POPULATION_SOURCE_COLUMNS, *ALL_AGE_COLUMNS]].assign(
+        ID=hh_ids,
+        TILE_ID=households["TILE_ID"].astype("string"),
+        geometry=shapely.from_wkb(households["geometry"].to_numpy()),
+    )
+    return features.to_dict("records")  # type: ignore[return-value]
+
+
+def read_population(
+    households_path: Path,
+    tiles: Iterable[str] | None = None,
+    recipe: PopulationRecipe | None = None,
+    chunk_size: int = 100_000,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Streams the population of a households database generated without it (see `PopulationRecipe`),
+    expanding the individuals of its households chunk by chunk.
+
+    Args:
+        households_path (Path): GeoParquet or GeoPackage households database (or folder of GeoParquet partitions)
+        tiles (Iterable[str], optional): identifiers of the tiles whose individuals are generated (all by default)
+        recipe (PopulationRecipe, optional): parameters of the generation, read next to the database if omitted
+        chunk_size (int): number of households read at once from a GeoPackage
+
+    Returns:
+        Iterator[gpd.GeoDataFrame]: population batches, in the order of the households database
+    """
+    recipe = PopulationRecipe.load(recipe_path(households_path)) if recipe is None else recipe
+    selected_keys = None if tiles is None else tile_keys(pd.Series(list(tiles), dtype="string"))
+    for households in read_columns(households_path, [*POPULATION_SOURCE_COLUMNS, *ALL_AGE_COLUMNS], chunk_size):
+        keys = run_tile_keys(households["TILE_ID"])
+        if selected_keys is not None:
+            selected = np.isin(keys, selected_keys)
+            households, keys = households[selected], keys[selected]
+        if households.empty:
+            continue
+        with stage(POPULATION_EXPANSION):
+            population = [
+                ind for hh in households_features(households, keys) for ind in generate_population(hh, recipe.seed)
+            ]
+        count("individuals", len(population))
+        with stage(DATAFRAME_CONSTRUCTION):
+            gdf = mkPopulationDataFrame(population, recipe.territory, recipe.profile, recipe.id_format)
+        yield gdf
+
+
+def load_population(
+    households_path: Path, tiles: Iterable[str] | None = None, recipe: PopulationRecipe | None = None
+) -> gpd.GeoDataFrame:
+    """
+    Returns the population of (some tiles of) a households database generated without it,
+    as a single GeoDataFrame (see `read_population`).
+    """
+    recipe = PopulationRecipe.load(recipe_path(households_path)) if recipe is None else recipe
+    batches = list(read_population(households_path, tiles=tiles, recipe=recipe))
+    if not batches:
+        return mkPopulationDataFrame([], recipe.territory, recipe.profile, recipe.id_format)
+    return pd.concat(batches, ignore_index=True)
@@ -1,6 +1,6 @@
 from collections.abc import Mapping
 from pathlib import Path
-from typing import Any, TypedDict
+from typing import Any, Literal, TypedDict
 
 import numpy as np
 import pandas as pd
@@ -8,10 +8,12 @@ import yaml
 from shapely.geometry import Point
 
 
+# The identifiers of the generated features are packed integers (see `household_id` and `individual_id`),
+# rendered as "<TILE_ID>_<household>_<individual>" strings when building the data frames (see `IdFormat`)
 class PopulationFeature(TypedDict):
     geometry: Point
-    ID: str
-    HOUSEHOLD_ID: str
+    ID: int
+    HOUSEHOLD_ID: int
     TILE_ID: str
     HOUSEHOLD_SIZE: int
     GRD_MENAGE: bool
@@ -25,7 +27,7 @@ class PopulationFeature(TypedDict):
 
 class HouseholdsFeature(TypedDict):
     geometry: Point
-    ID: str
+    ID: int
     TILE_ID: str
     SIZE: int
     NB_ADULTS: int
@@ -84,6 +86,82 @@ households_dtype: Mapping[Any, pd._typing.Dtype] = {
     "ind_inc": np.int64,
 }
 
+# Compact profile: smallest integer types fitting the values (household sizes and counts are at most 500,
+# ages at most 105), plain booleans, single precision incomes and categorical strings.
+# The categories of AGE_CAT and STATUT are fixed (ordered) enumerations, the ones of TILE_ID depend on the batch.
+AGE_CAT_DTYPE = pd.CategoricalDtype(
+    [
+        "ind_0_3",
+        "ind_4_5",
+        "ind_6_10",
+        "ind_11_17",
+        "ind_18_24",
+        "ind_25_39",
+        "ind_40_54",
+        "ind_55_64",
+        "ind_65_79",
+        "ind_80p",
+        "ind_inc",
+    ],
+    ordered=True,
+)
+STATUT_DTYPE = pd.CategoricalDtype(["ADULT", "MINOR"], ordered=True)
+
+compact_population_dtype: Mapping[Any, pd._typing.Dtype] = {
+    "geometry": "geometry",
+    "ID": "string",
+    "HOUSEHOLD_ID": "string",
+    "TILE_ID": "category",
+    "HOUSEHOLD_SIZE": np.int16,
+    "GRD_MENAGE": np.bool_,
+    "MONOPARENT": np.bool_,
+    "NIVEAU_VIE": np.float32,
+    "AGE_CAT": AGE_CAT_DTYPE,
+    "AGE": np.int8,
+    "ADULT": np.bool_,
+    "STATUT": STATUT_DTYPE,
+}
+
+compact_households_dtype: Mapping[Any, pd._typing.Dtype] = {
+    "geometry": "geometry",
+    "ID": "string",
+    "TILE_ID": "category",
+    "SIZE": np.int16,
+    "NB_ADULTS": np.int16,
+    "NB_MINORS": np.int16,
+    "GRD_MENAGE": np.bool_,
+    "MONOPARENT": np.bool_,
+    "NIVEAU_VIE": np.float32,
+    "ind_0_3": np.int16,
+    "ind_4_5": np.int16,
+    "ind_6_10": np.int16,
+    "ind_11_17": np.int16,
+    "ind_18_24": np.int16,
+    "ind_25_39": np.int16,
+    "ind_40_54": np.int16,
+    "ind_55_64": np.int16,
+    "ind_65_79": np.int16,
+    "ind_80p": np.int16,
+    "ind_inc": np.int16,
+}
+
+SchemaProfile = Literal["default", "compact"]
+
+# Identifiers of the generated data frames: legacy strings ("<TILE_ID>_<household>[_<individual>]"),
+# or the packed integers of the generated features (which are faster to build and to join on)
+IdFormat = Literal["string", "integer"]
+ID_COLUMNS = ["ID", "HOUSEHOLD_ID"]
+
+households_dtypes: dict[SchemaProfile, Mapping[Any, pd._typing.Dtype]] = {
+    "default": households_dtype,
+    "compact": compact_households_dtype,
+}
+
+population_dtypes: dict[SchemaProfile, Mapping[Any, pd._typing.Dtype]] = {
+    "default": population_dtype,
+    "compact": compact_population_dtype,
+}
+
 households_gpkg_schema = {
     "geometry": {"type": "Geometry", "geometry_type": "Point"},
     "ID": {"type": "String"},
@@ -321,12 +399,18 @@ population_smartnoise_columns = {
 }
 
 
-def save_households_metadata(file: Path, nb_rows: int | None = None):
+def _with_id_format(columns: dict[str, dict[str, Any]], id_format: IdFormat) -> dict[str, dict[str, Any]]:
+    if id_format == "string":
+        return columns
+    return {c: {**spec, "type": "int", "precision": 64} if c in ID_COLUMNS else spec for c, spec in columns.items()}
+
+
+def save_households_metadata(file: Path, nb_rows: int | None = None, id_format: IdFormat = "string"):
     data = {
         "max_ids": 1,
         "row_privacy": True,
         "censor_dims": False,
-        "columns": households_smartnoise_columns,
+        "columns": _with_id_format(households_smartnoise_columns, id_format),
     }
     if nb_rows is not None:
         data["rows"] = nb_rows
@@ -334,12 +418,12 @@ def save_households_metadata(file: Path, nb_rows: int | None = None):
         yaml.dump(data, outfile, sort_keys=False, default_flow_style=False)
 
 
-def save_population_metadata(file: Path, nb_rows: int | None = None):
+def save_population_metadata(file: Path, nb_rows: int | None = None, id_format: IdFormat = "string"):
     data = {
         "max_ids": 1,
         "row_privacy": True,
         "censor_dims": False,
-        "columns": population_smartnoise_columns,
+        "columns": _with_id_format(population_smartnoise_columns, id_format),
     }
     if nb_rows is not None:
         data["rows"] = nb_rows
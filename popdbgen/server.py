@@ -0,0 +1,330 @@
+"""
+Local HTTP service generating synthetic households and population on demand.
+
+The FILO tiles and the addresses index are loaded once; each request only generates the tiles it covers
+(bounding box, list of tile identifiers or Web Mercator vector tile), every tile being refined and generated
+with its own random streams derived from the seed, so that it is identical to the same tile in a national
+generation. The generated tiles are kept in a least recently used cache bounded by its memory size.
+The service works offline, as long as the FILO and BAN files are in the data directory.
+
+    GET /households?bbox=xmin,ymin,xmax,ymax[&crs=EPSG:4326][&format=geojson|arrow]
+    GET /population?tiles=<tile id>,<tile id>...[&format=geojson|arrow]
+    GET /tiles/{z}/{x}/{y}.mvt    (households and population layers)
+    GET /stats                    (cache statistics)
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Literal
+from urllib.parse import parse_qs, urlsplit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .area import area_mask
+from .batching import dataframe_bytes
+from .download_ban import load_BAN
+from .download_filo import load_raw_FILO, refine_FILO
+from .households_gen import AddressIndex, get_households_population_gdf
+from .metadata import IdFormat, SchemaProfile
+from .tiling import EXTENT_BITS, WORLD_BITS, _column_values, encode_tile, lonlat_to_world, world_to_lonlat
+from .utils import DATA_DIR, mkHouseholdsDataFrame, mkPopulationDataFrame, resolve_seed, territory_code
+
+ResponseFormat = Literal["geojson", "arrow"]
+
+LAYERS = ("households", "population")
+CONTENT_TYPES = {
+    "geojson": "application/geo+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "mvt": "application/vnd.mapbox-vector-tile",
+}
+# Margin (as a fraction of the tile side) of the area looked up for the points of a vector tile
+MVT_LOOKUP_MARGIN = 1 / 64
+
+
+class TilesLRUCache:
+    """
+    Thread-safe least recently used cache of the generated tiles (households and population data frames),
+    evicting the oldest tiles once the memory used by the cached data frames exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles: OrderedDict[str, tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, tile_id: str) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame] | None:
+        with self._lock:
+            entry = self._tiles.get(tile_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tiles.move_to_end(tile_id)
+            return entry[0], entry[1]
+
+    def put(self, tile_id: str, households: gpd.GeoDataFrame, population: gpd.GeoDataFrame) -> None:
+        nbytes = dataframe_bytes(households) + dataframe_bytes(population)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if tile_id in self._tiles:
+                self.nbytes -= self._tiles.pop(tile_id)[2]
+            self._tiles[tile_id] = (households, population, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._tiles.popitem(last=False)[1][2]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "tiles": len(self._tiles),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def _concat(parts: list[gpd.GeoDataFrame], empty: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Concatenates tiles data frames, keeping the categorical columns (of the compact profile) categorical."""
+    if not parts:
+        return empty
+    gdf = pd.concat(parts, ignore_index=True)
+    categorical = [c for c in gdf.columns if isinstance(empty[c].dtype, pd.CategoricalDtype)]
+    return gdf.astype({c: "category" for c in categorical}) if categorical else gdf
+
+
+class SyntheticTiles:
+    """
+    Generates the households and population of FILO tiles on demand, from the raw FILO tiles and the index
+    of the addresses of a territory (loaded once), caching the generated tiles (see `TilesLRUCache`).
+
+    Args:
+        territory (str | int): territory to serve: 'METRO' (default), '974' or '972'
+        dataDir (Path): data folder of the FILO and BAN files
+        seed (int, optional): seed of the generation, drawn from numpy's global random state if omitted
+        profile (SchemaProfile): column types of the generated data frames (see `households_dtypes`)
+        id_format (IdFormat): "string" or "integer" identifiers
+        cache_size (int): maximum memory (in bytes) used by the cached tiles
+        max_tiles (int): maximum number of FILO tiles generated for a single request
+        raw_filo (gpd.GeoDataFrame, optional): raw FILO database, loaded from the data folder if omitted
+        addresses (AddressIndex, optional): index of the BAN addresses, loaded from the data folder if omitted
+    """
+
+    def __init__(
+        self,
+        territory: str | int = "METRO",
+        dataDir: Path = DATA_DIR,
+        seed: int | None = None,
+        profile: SchemaProfile = "default",
+        id_format: IdFormat = "string",
+        cache_size: int = 256 * 2**20,
+        max_tiles: int = 10_000,
+        raw_filo: gpd.GeoDataFrame | None = None,
+        addresses: AddressIndex | None = None,
+    ):
+        self.territory = territory_code(territory)
+        self.seed = resolve_seed(seed)
+        self.profile = profile
+        self.id_format = id_format
+        self.max_tiles = max_tiles
+        raw = load_raw_FILO(self.territory, dataDir) if raw_filo is None else raw_filo
+        self.raw_filo = raw.reset_index(drop=True)
+        self.positions = pd.Index(self.raw_filo["idcar_200m"])
+        self.raw_filo.sindex  # noqa: B018 (builds the spatial index once)
+        self.addresses = AddressIndex(load_BAN(self.territory, dataDir)) if addresses is None else addresses
+        self.cache = TilesLRUCache(cache_size)
+        self.empty = (
+            mkHouseholdsDataFrame([], self.territory, profile, id_format),
+            mkPopulationDataFrame([], self.territory, profile, id_format),
+        )
+        logging.info(f"Serving {len(self.raw_filo)} FILO tiles and {len(self.addresses)} addresses")
+
+    def tiles_in_bbox(self, bbox: tuple[float, float, float, float], crs: str = "EPSG:4326") -> list[str]:
+        """Returns the identifiers of the FILO tiles intersecting a bounding box (in `crs`), in the FILO order."""
+        mask = area_mask(self.territory, bbox=bbox, crs=crs)
+        positions = np.sort(self.raw_filo.sindex.query(mask, predicate="intersects"))
+        return self.positions[positions].tolist()
+
+    def _generate(self, tile_ids: list[str]) -> dict[str, tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]]:
+        """Generates some tiles and adds them to the cache."""
+        filo = refine_FILO(self.raw_filo.iloc[self.positions.get_indexer(tile_ids)], seed=self.seed)
+        households, population = get_households_population_gdf(
+            territory=self.territory,
+            filo_df=filo,
+            ban_df=self.addresses,
+            seed=self.seed,
+            profile=self.profile,
+            id_format=self.id_format,
+        )
+        tiles_households = dict(iter(households.groupby("TILE_ID", sort=False, observed=True)))
+        tiles_population = dict(iter(population.groupby("TILE_ID", sort=False, observed=True)))
+        tiles = {
+            tile_id: (tiles_households.get(tile_id, self.empty[0]), tiles_population.get(tile_id, self.empty[1]))
+            for tile_id in tile_ids
+        }
+        for tile_id, (tile_households, tile_population) in tiles.items():
+            self.cache.put(tile_id, tile_households, tile_population)
+        return tiles
+
+    def generate(self, tile_ids: Iterable[str]) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+        """
+        Returns the households and the population of some FILO tiles (unknown tiles are ignored),
+        in the FILO order, only generating the tiles that are not cached.
+        """
+        requested = sorted({t for t in tile_ids if t in self.positions}, key=self.positions.get_loc)
+        if len(requested) > self.max_tiles:
+            raise ValueError(f"Too many FILO tiles requested ({len(requested)} > {self.max_tiles})")
+        tiles = {tile_id: self.cache.get(tile_id) for tile_id in requested}
+        missing = [tile_id for tile_id, tile in tiles.items() if tile is None]
+        if missing:
+            tiles.update(self._generate(missing))
+        return (
+            _concat([tile[0] for tile in tiles.values() if not tile[0].empty], self.empty[0]),  # type: ignore[index]
+            _concat([tile[1] for tile in tiles.values() if not tile[1].empty], self.empty[1]),  # type: ignore[index]
+        )
+
+    def vector_tile(self, z: int, x: int, y: int, min_zoom: int = 12) -> bytes:
+        """
+        Returns the gzipped Mapbox Vector Tile (z, x, y) of the households and population points
+        (an empty tile below `min_zoom`, whose tiles would cover too many FILO tiles).
+        """
+        if z < min_zoom:
+            return encode_tile((z, x, y, []))[3]
+        shift = WORLD_BITS - z
+        margin = MVT_LOOKUP_MARGIN * (1 << shift)
+        west, north = world_to_lonlat((x << shift) - margin, (y << shift) - margin)
+        east, south = world_to_lonlat(((x + 1) << shift) + margin, ((y + 1) << shift) + margin)
+        tile_ids = self.tiles_in_bbox((west, south, east, north))
+        layers = []
+        for name, gdf in zip(LAYERS, self.generate(tile_ids), strict=True):
+            if gdf.empty:
+                continue
+            points = gdf.geometry.to_crs(epsg=4326)
+            wx, wy = lonlat_to_world(points.x.to_numpy(), points.y.to_numpy())
+            inside = ((wx >> shift) == x) & ((wy >> shift) == y)
+            if not inside.any():
+                continue
+            local = (np.column_stack((wx[inside], wy[inside])).astype(np.int64) >> (shift - EXTENT_BITS)) & (
+                (1 << EXTENT_BITS) - 1
+            )
+            attributes = {c: _column_values(gdf[c])[inside] for c in gdf.columns if c != gdf.geometry.name}
+            layers.append((name, "point", local, attributes))
+        return encode_tile((z, x, y, layers))[3]
+
+
+def to_geojson(gdf: gpd.GeoDataFrame) -> bytes:
+    """Encodes a data frame as a GeoJSON feature collection (in WGS 84)."""
+    return gdf.to_crs(epsg=4326).to_json(drop_id=True).encode()
+
+
+def to_arrow_ipc(gdf: gpd.GeoDataFrame) -> bytes:
+    """
+    Encodes a data frame as an Arrow IPC stream, with WKB geometries (in the CRS of the generation).
+    Requires the `pyarrow` package.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Arrow export requires the `pyarrow` package (pip install pyarrow)") from e
+    table = pa.table(gdf.to_arrow(index=False, geometry_encoding="WKB"))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS: dict[ResponseFormat, Callable[[gpd.GeoDataFrame], bytes]] = {"geojson": to_geojson, "arrow": to_arrow_ipc}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server: "SyntheticTilesServer"
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str, gzipped: bool = False) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send(status, json.dumps({"error": message}).encode(), "application/json")
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = url.path.strip("/").split("/")
+        service = self.server.service
+        try:
+            if route[0] in LAYERS and len(route) == 1:
+                response_format = params.get("format", "geojson")
+                if response_format not in ENCODERS:
+                    raise ValueError(f"Unsupported format: {response_format}")
+                if "tiles" in params:
+                    tile_ids = [tile_id for tile_id in params["tiles"].split(",") if tile_id]
+                elif "bbox" in params:
+                    bbox = tuple(float(v) for v in params["bbox"].split(","))
+                    if len(bbox) != 4 or not all(map(math.isfinite, bbox)):
+                        raise ValueError("bbox expects xmin,ymin,xmax,ymax")
+                    tile_ids = service.tiles_in_bbox(bbox, params.get("crs", "EPSG:4326"))  # type: ignore[arg-type]
+                else:
+                    raise ValueError("A bbox or a list of tiles is required")
+                gdf = service.generate(tile_ids)[LAYERS.index(route[0])]
+                self._send(HTTPStatus.OK, ENCODERS[response_format](gdf), CONTENT_TYPES[response_format])
+            elif route[0] == "tiles" and len(route) == 4 and route[3].endswith(".mvt"):
+                z, x, y = int(route[1]), int(route[2]), int(route[3].removesuffix(".mvt"))
+                if not (0 <= z <= WORLD_BITS - EXTENT_BITS and 0 <= x < 1 << z and 0 <= y < 1 << z):
+                    raise ValueError(f"Invalid tile: {z}/{x}/{y}")
+                tile = service.vector_tile(z, x, y, min_zoom=self.server.min_zoom)
+                self._send(HTTPStatus.OK, tile, CONTENT_TYPES["mvt"], gzipped=True)
+            elif route == ["stats"]:
+                self._send(HTTPStatus.OK, json.dumps(service.cache.stats()).encode(), "application/json")
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f"Unknown resource: {url.path}")
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            logging.exception(f"Error while serving {self.path}")
+            self._error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+
+    def log_message(self, format, *args) -> None:
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+class SyntheticTilesServer(ThreadingHTTPServer):
+    """HTTP server answering the requests with a `SyntheticTiles` service (see the module documentation)."""
+
+    daemon_threads = True
+
+    def __init__(self, service: SyntheticTiles, host: str = "127.0.0.1", port: int = 8000, min_zoom: int = 12):
+        super().__init__((host, port), _RequestHandler)
+        self.service = service
+        self.min_zoom = min_zoom
+
+
+def serve(service: SyntheticTiles, host: str = "127.0.0.1", port: int = 8000, min_zoom: int = 12) -> None:
+    """Serves synthetic households and population over HTTP until interrupted."""
+    with SyntheticTilesServer(service, host, port, min_zoom) as server:
+        logging.info(f"Serving synthetic tiles on http://{host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Server stopped")
@@ -0,0 +1,312 @@
+import gzip
+import logging
+from collections.abc import Iterator
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from .download_ban import get_BAN_filename
+from .download_filo import get_FILO_filename
+from .downloads import forget_file
+from .utils import ALL_AGE_COLUMNS, DATA_DIR, TerritoryCode, filo_crs, filo_epsg, territory_code, territory_crs
+
+# South-west corner (in the FILO CRS) of the area covered by the synthetic tiles of each territory
+_ORIGINS: dict[TerritoryCode, tuple[int, int]] = {
+    "METRO": (2_200_000, 3_300_000),
+    "974": (7_634_000, 314_000),
+    "972": (1_590_000, 690_000),
+}
+
+# Average age structure of the population, used to draw the age counts of the tiles
+AGE_SHARES: dict[str, float] = {
+    "ind_0_3": 0.045,
+    "ind_4_5": 0.024,
+    "ind_6_10": 0.06,
+    "ind_11_17": 0.085,
+    "ind_18_24": 0.08,
+    "ind_25_39": 0.18,
+    "ind_40_54": 0.2,
+    "ind_55_64": 0.12,
+    "ind_65_79": 0.14,
+    "ind_80p": 0.06,
+    "ind_inc": 0.006,
+}
+
+
+# Columns of the BAN files, in order (only `x` and `y` are used by `load_BAN`)
+BAN_COLUMNS: list[str] = [
+    "id",
+    "id_fantoir",
+    "numero",
+    "rep",
+    "nom_voie",
+    "code_postal",
+    "code_insee",
+    "nom_commune",
+    "code_insee_ancienne_commune",
+    "nom_ancienne_commune",
+    "x",
+    "y",
+    "lon",
+    "lat",
+    "type_position",
+    "alias",
+    "nom_ld",
+    "libelle_acheminement",
+    "nom_afnor",
+    "source_position",
+    "source_nom_voie",
+    "certification_commune",
+    "cad_parcelles",
+]
+
+
+def _commune_codes(north: np.ndarray, east: np.ndarray) -> pd.Series:
+    """Fake commune codes (departement and commune numbers) of 10km blocks."""
+    bn, be = north // 10_000, east // 10_000
+    departement = 1 + (7 * bn + be) % 95
+    commune = 1 + (31 * bn + be) % 999
+    return pd.Series(departement).map("{:02d}".format) + pd.Series(commune).map("{:03d}".format)
+
+
+def synthetic_raw_FILO_chunks(
+    nb_tiles: int,
+    territory: TerritoryCode = "METRO",
+    seed: int = 0,
+    mean_individuals: float = 30.0,
+    density_sigma: float = 1.2,
+    grid_fill: float = 0.5,
+    chunk_size: int = 1_000_000,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Generates a fake raw FILO database by chunks of `chunk_size` tiles (see `synthetic_raw_FILO`),
+    so that databases larger than the memory can be written to disk.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(nb_tiles / grid_fill)))
+    cells = np.sort(rng.choice(side * side, size=nb_tiles, replace=False))
+    north0, east0 = _ORIGINS[territory]
+    epsg = filo_epsg[territory]
+    for i, start in enumerate(range(0, nb_tiles, chunk_size)):
+        chunk_rng = np.random.default_rng([seed, i + 1])
+        chunk_cells = cells[start : start + chunk_size]
+        n = len(chunk_cells)
+        north = north0 + 200 * (chunk_cells // side)
+        east = east0 + 200 * (chunk_cells % side)
+
+        ind = np.maximum(1.0, chunk_rng.lognormal(np.log(mean_individuals) - density_sigma**2 / 2, density_sigma, n))
+        men = ind / chunk_rng.uniform(1.6, 3.0, n)
+        shares = 50 * np.array([AGE_SHARES[c] for c in ALL_AGE_COLUMNS])
+        ages = chunk_rng.dirichlet(shares, n) * ind[:, None]
+        dwellings = chunk_rng.dirichlet([2, 3, 2, 2, 0.2], n) * (men * chunk_rng.uniform(1.0, 1.2, n))[:, None]
+
+        tile_ids = f"CRS{epsg}RES200mN" + pd.Series(north).astype(str) + "E" + pd.Series(east).astype(str)
+        km_ids = (
+            f"CRS{epsg}RES1000mN"
+            + pd.Series(1000 * (north // 1000)).astype(str)
+            + "E"
+            + pd.Series(1000 * (east // 1000)).astype(str)
+        )
+        collective = chunk_rng.uniform(0, 1, n)
+        data: dict[str, np.ndarray] = {
+            "idcar_200m": tile_ids.to_numpy(),
+            "idcar_1km": km_ids.to_numpy(),
+            "idcar_nat": tile_ids.to_numpy(),
+            "i_est_200": np.zeros(n, dtype=np.int32),
+            "i_est_1km": (chunk_rng.uniform(0, 1, n) < 0.05).astype(np.int32),
+            "lcog_geo": _commune_codes(north, east).to_numpy(),
+            "ind": ind,
+            "men": men,
+            "men_pauv": men * chunk_rng.uniform(0.0, 0.3, n),
+            "men_1ind": men * chunk_rng.uniform(0.15, 0.5, n),
+            "men_5ind": men * chunk_rng.uniform(0.0, 0.1, n),
+            "men_prop": men * chunk_rng.uniform(0.2, 0.9, n),
+            "men_fmp": men * chunk_rng.uniform(0.03, 0.15, n),
+            "ind_snv": ind * chunk_rng.uniform(15_000, 35_000, n),
+            "men_surf": men * chunk_rng.uniform(50, 110, n),
+            "men_coll": men * collective,
+            "men_mais": men * (1 - collective),
+            "log_av45": dwellings[:, 0],
+            "log_45_70": dwellings[:, 1],
+            "log_70_90": dwellings[:, 2],
+            "log_ap90": dwellings[:, 3],
+            "log_inc": dwellings[:, 4],
+            "log_soc": men * chunk_rng.uniform(0.0, 0.3, n),
+        }
+        for j, c in enumerate(ALL_AGE_COLUMNS):
+            data[c] = ages[:, j]
+        geometry = shapely.box(east, north, east + 200, north + 200)
+        yield gpd.GeoDataFrame(data, geometry=geometry, crs=filo_crs(territory), index=pd.RangeIndex(start, start + n))
+
+
+def synthetic_raw_FILO(
+    nb_tiles: int,
+    territory: TerritoryCode = "METRO",
+    seed: int = 0,
+    mean_individuals: float = 30.0,
+    density_sigma: float = 1.2,
+    grid_fill: float = 0.5,
+) -> gpd.GeoDataFrame:
+    """
+    Generates a fake raw FILO database, with the columns of the FILO files
+    and fractional counts like the real (estimated) FILO counts.
+
+    Args:
+        nb_tiles (int): number of tiles
+        territory (TerritoryCode): territory whose CRS and tile identifiers are used
+        seed (int): seed of the generation
+        mean_individuals (float): average number of individuals per tile
+        density_sigma (float): dispersion of the (lognormal) distribution of the number of individuals per tile
+        grid_fill (float): share of the 200m cells of the covered square that are populated tiles
+
+    Returns:
+        gpd.GeoDataFrame: a raw FILO database, as returned by `load_raw_FILO`
+    """
+    chunks = synthetic_raw_FILO_chunks(nb_tiles, territory, seed, mean_individuals, density_sigma, grid_fill)
+    return pd.concat(list(chunks))
+
+
+def _synthetic_addresses(
+    raw_filo: gpd.GeoDataFrame,
+    seed: int | list[int],
+    addresses_per_household: float,
+    empty_share: float,
+    outside_share: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Coordinates (in the FILO CRS) of fake addresses in and around the tiles of a FILO database."""
+    rng = np.random.default_rng(seed)
+    nb_addresses = rng.poisson(addresses_per_household * raw_filo["men"].to_numpy())
+    nb_addresses[rng.uniform(0, 1, len(nb_addresses)) < empty_share] = 0
+    corners = np.repeat(raw_filo.geometry.bounds[["minx", "miny"]].to_numpy(), nb_addresses, axis=0)
+    # Some addresses are in unpopulated cells next to the tiles (at most 600m away)
+    outside = rng.uniform(0, 1, len(corners)) < outside_share
+    corners[outside] += 200 * rng.choice([-3, -2, -1, 1, 2, 3], size=(outside.sum(), 2))
+    x = corners[:, 0] + rng.uniform(0, 200, len(corners))
+    y = corners[:, 1] + rng.uniform(0, 200, len(corners))
+    return x, y
+
+
+def synthetic_BAN(
+    raw_filo: gpd.GeoDataFrame,
+    territory: TerritoryCode = "METRO",
+    seed: int | list[int] = 0,
+    addresses_per_household: float = 0.6,
+    empty_share: float = 0.1,
+    outside_share: float = 0.02,
+) -> pd.DataFrame:
+    """
+    Generates fake addresses for the tiles of a (raw or refined) FILO database: the number of addresses
+    of a tile follows a Poisson law proportional to its number of households, and a share of the tiles
+    have no address at all (their households are then placed at random in the tile).
+    A share of the addresses are moved to cells without FILO tile, as in the real BAN.
+
+    Returns:
+        pd.DataFrame: a BAN database, as returned by `load_BAN` (`x` and `y` in the territory CRS, and `tile_id`)
+    """
+    x, y = _synthetic_addresses(raw_filo, seed, addresses_per_household, empty_share, outside_share)
+    tile_ids = (
+        f"CRS{filo_epsg[territory]}RES200mN"
+        + pd.Series(200 * np.floor(y / 200).astype(int)).astype(str)
+        + "E"
+        + pd.Series(200 * np.floor(x / 200).astype(int)).astype(str)
+    )
+    transformer = Transformer.from_crs(filo_crs(territory), territory_crs(territory), always_xy=True)
+    x, y = transformer.transform(x, y)
+    return pd.DataFrame({"x": x, "y": y, "tile_id": tile_ids})
+
+
+def _BAN_file_chunk(x: np.ndarray, y: np.ndarray, territory: TerritoryCode, first_id: int) -> pd.DataFrame:
+    """Rows of a BAN file for addresses given in the FILO CRS (one fake street per 100 addresses)."""
+    n = len(x)
+    ordinals = np.arange(first_id, first_id + n)
+    codes = _commune_codes(200 * (np.floor(y).astype(int) // 200), 200 * (np.floor(x).astype(int) // 200))
+    streets = pd.Series(ordinals // 100).map("{:05d}".format)
+    numbers = ordinals % 100 + 1
+    x_ter, y_ter = Transformer.from_crs(filo_crs(territory), territory_crs(territory), always_xy=True).transform(x, y)
+    lon, lat = Transformer.from_crs(filo_crs(territory), "EPSG:4326", always_xy=True).transform(x, y)
+    rows = pd.DataFrame(index=pd.RangeIndex(n), columns=BAN_COLUMNS)
+    rows["id"] = codes + "_" + streets + "_" + pd.Series(numbers).map("{:05d}".format)
+    rows["id_fantoir"] = codes + "_" + streets
+    rows["numero"] = numbers
+    rows["nom_voie"] = "Voie " + streets
+    rows["code_postal"] = codes.str[:2] + "000"
+    rows["code_insee"] = codes
+    rows["nom_commune"] = "Commune " + codes
+    rows["x"] = np.round(x_ter, 2)
+    rows["y"] = np.round(y_ter, 2)
+    rows["lon"] = np.round(lon, 6)
+    rows["lat"] = np.round(lat, 6)
+    rows["type_position"] = "entrée"
+    rows["libelle_acheminement"] = rows["nom_commune"].str.upper()
+    rows["nom_afnor"] = rows["nom_voie"].str.upper()
+    rows["source_position"] = "commune"
+    rows["source_nom_voie"] = "commune"
+    rows["certification_commune"] = 0
+    return rows
+
+
+def write_synthetic_inputs(
+    nb_tiles: int,
+    territory: str | int = "METRO",
+    dataDir: Path = DATA_DIR,
+    seed: int = 0,
+    mean_individuals: float = 30.0,
+    density_sigma: float = 1.2,
+    grid_fill: float = 0.5,
+    addresses_per_household: float = 0.6,
+    empty_share: float = 0.1,
+    outside_share: float = 0.02,
+    chunk_size: int = 1_000_000,
+    overwriteIfExists: bool = False,
+) -> tuple[Path, Path]:
+    """
+    Writes fake FILO and BAN files, with the names and schemas of the real ones, so that `load_FILO`
+    and `load_BAN` read them instead of downloading the real data.
+    The files are written by chunks of tiles, so that their size is not bounded by the memory.
+
+    Args:
+        nb_tiles (int): number of FILO tiles
+        territory (str | int): territory whose file names, CRS and tile identifiers are used
+        dataDir (Path): folder in which the files are written
+        seed (int): seed of the generation
+        mean_individuals (float): average number of individuals per tile
+        density_sigma (float): dispersion of the (lognormal) distribution of the number of individuals per tile
+        grid_fill (float): share of the 200m cells of the covered square that are populated tiles
+        addresses_per_household (float): average number of addresses per household
+        empty_share (float): share of the tiles without any address
+        outside_share (float): share of the addresses located in cells without FILO tile
+        chunk_size (int): number of tiles generated at once
+        overwriteIfExists (bool): overwrite the files if they already exist
+
+    Returns:
+        tuple[Path, Path]: paths to the FILO and BAN files
+    """
+    terr_code = territory_code(territory)
+    dataDir.mkdir(parents=True, exist_ok=True)
+    filo_file = get_FILO_filename(terr_code, dataDir)
+    ban_file = get_BAN_filename(terr_code, dataDir)
+    if not overwriteIfExists and (filo_file.exists() or ban_file.exists()):
+        raise FileExistsError(f"Data files already exist in {dataDir}")
+    filo_file.unlink(missing_ok=True)
+    # Not the downloaded files anymore: the checksums of the real ones must not be checked against them
+    for path in (filo_file, ban_file):
+        forget_file(path)
+
+    logging.info(f"Writing synthetic FILO ({nb_tiles} tiles) and BAN files in {dataDir}...")
+    nb_addresses = 0
+    with gzip.open(ban_file, "wt", encoding="utf-8", compresslevel=6) as ban_stream:
+        chunks = synthetic_raw_FILO_chunks(
+            nb_tiles, terr_code, seed, mean_individuals, density_sigma, grid_fill, chunk_size
+        )
+        for i, raw_filo in enumerate(chunks):
+            raw_filo.to_file(filo_file, layer=filo_file.stem, driver="GPKG", mode="a" if i else "w", index=False)
+            x, y = _synthetic_addresses(raw_filo, [seed, i + 1], addresses_per_household, empty_share, outside_share)
+            _BAN_file_chunk(x, y, terr_code, nb_addresses).to_csv(ban_stream, sep=";", header=i == 0, index=False)
+            nb_addresses += len(x)
+            logging.info(f"Written tiles: {raw_filo.index[-1] + 1} out of {nb_tiles}")
+    logging.info(f"Synthetic inputs written: {nb_tiles} tiles in {filo_file}, {nb_addresses} addresses in {ban_file}")
+    return filo_file, ban_file
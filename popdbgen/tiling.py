@@ -0,0 +1,1027 @@
+"""
+In-process vector tiles (MVT) pyramid builder.
+
+Replaces the `ogr2ogr | tippecanoe` + `tile-join` shell pipeline: generated points
+(and optionally the FILO tiles) are quantized to 32 bits Web Mercator world coordinates,
+bucketed into tiles for each zoom level and spilled to disk batch by batch, as runs of
+records sorted by tile. When the pyramid is written, the runs are merged and the tiles
+are encoded as gzipped Mapbox Vector Tiles by a pool of worker processes.
+The resulting pyramid is written as a MBTiles or a PMTiles file.
+"""
+
+import gzip
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Literal
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .export import BatchSink
+
+# Points are quantized on a 32 bits world grid: up to zoom 20 with a 4096 tile extent
+WORLD_BITS = 32
+EXTENT_BITS = 12
+EXTENT = 1 << EXTENT_BITS
+MAX_ZOOM = WORLD_BITS - EXTENT_BITS
+# Margin (in tile extent units) kept around tiles when clipping polygons
+BUFFER = 64
+# Records are sorted by tile key: the zoom level, then the position of the tile along the Hilbert curve
+KEY_ZOOM_SHIFT = 2 * MAX_ZOOM
+# Maximum number of runs merged at once (each run being merged holds a window of `MERGE_CHUNK` records)
+MAX_MERGED_RUNS = 32
+# Number of records read from each run at each step of a merge
+MERGE_CHUNK = 1 << 16
+# Number of records of each layer encoded at once by a worker (rounded to whole tiles)
+ENCODE_CHUNK = 1 << 15
+# zlib's default compression level (as tippecanoe): the highest ones are much slower for a few bytes less
+GZIP_LEVEL = 6
+# Maximum size of a (gzipped) tile, as tippecanoe's
+MAX_TILE_BYTES = 500_000
+
+ReductionStrategy = Literal["drop", "cluster"]
+
+# A tile to encode: (z, x, y, [(layer name, geometry type, coordinates, attributes), ...])
+TileTask = tuple[int, int, int, list[tuple[str, str, np.ndarray, dict[str, np.ndarray]]]]
+# A range of tiles to encode:
+# [(layer name, geometry type, tile keys, tiles (x, y), coordinates, attributes, priorities), ...]
+TilesTask = list[tuple[str, str, np.ndarray, np.ndarray, np.ndarray, dict[str, np.ndarray], np.ndarray]]
+
+
+def lonlat_to_world(lon: np.ndarray, lat: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes WGS84 coordinates to unsigned 32 bits Web Mercator world coordinates
+    (origin at the north-west corner of the world).
+    """
+    scale = float(1 << WORLD_BITS)
+    sin_lat = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    x = (np.asarray(lon) + 180.0) / 360.0
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+    return (
+        np.clip(x * scale, 0, scale - 1).astype(np.uint32),
+        np.clip(y * scale, 0, scale - 1).astype(np.uint32),
+    )
+
+
+def world_to_lonlat(x: float, y: float) -> tuple[float, float]:
+    scale = float(1 << WORLD_BITS)
+    lon = x / scale * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale))))
+    return lon, lat
+
+
+def _column_values(s: pd.Series) -> np.ndarray:
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s.to_numpy(dtype=bool)
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return s.to_numpy(dtype=np.int64)
+    if pd.api.types.is_float_dtype(s.dtype):
+        return s.to_numpy(dtype=np.float64)
+    # Strings are kept UTF-8 encoded in fixed width arrays, which numpy sorts and spills without Python objects
+    return np.char.encode(s.astype(str).to_numpy(dtype=str), "utf-8")
+
+
+def _field_type(values: np.ndarray) -> str:
+    if values.dtype == bool:
+        return "Boolean"
+    if values.dtype.kind in "iuf":
+        return "Number"
+    return "String"
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# MVT encoding (see https://github.com/mapbox/vector-tile-spec/tree/master/2.1)
+# All the features (and values) of the layers of a range of tiles are encoded at once: their messages are laid out
+# as rows of varints, whose sizes are computed first, so that the bytes of all the rows are written by a few numpy
+# operations.
+
+# Field numbers of the values in the Value message, by type
+_STRING_VALUE = 1
+_DOUBLE_VALUE = 3
+_SINT_VALUE = 6
+_BOOL_VALUE = 7
+
+
+def _write_varint(buf: bytearray, n: int) -> None:
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _write_bytes(buf: bytearray, field_number: int, data: bytes | bytearray) -> None:
+    _write_varint(buf, field_number << 3 | 2)
+    _write_varint(buf, len(data))
+    buf += data
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+# Smallest values encoded by varints of 2 to 10 bytes
+_VARINT_LIMITS = np.array([1 << (7 * i) for i in range(1, 10)], dtype=np.uint64)
+
+
+def _varint_sizes(values: np.ndarray) -> np.ndarray:
+    """Number of bytes of the varint encoding of unsigned integers."""
+    return 1 + np.searchsorted(_VARINT_LIMITS, np.asarray(values).astype(np.uint64, copy=False), side="right")
+
+
+def _columns(n: int, *columns: int | np.ndarray) -> np.ndarray:
+    """(n, k) matrix of unsigned integers, from constants and columns."""
+    matrix = np.empty((n, len(columns)), dtype=np.uint64)
+    for j, column in enumerate(columns):
+        matrix[:, j] = column
+    return matrix
+
+
+def _row_sizes(values: np.ndarray, present: np.ndarray | None = None) -> np.ndarray:
+    """Number of bytes of the varint encoding of the rows of a (n, k) matrix (without the values not `present`)."""
+    sizes = _varint_sizes(values)
+    return (sizes if present is None else np.where(present, sizes, 0)).sum(axis=1)
+
+
+def _varint_rows(values: np.ndarray, present: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Varint encoding of the rows of a (n, k) matrix of unsigned integers, skipping the values not `present`:
+    the bytes of all the rows, and the number of bytes of each row.
+    """
+    flat = values.ravel() if present is None else values[present]
+    sizes = _varint_sizes(flat)
+    starts = np.cumsum(sizes) - sizes
+    data = np.empty(int(sizes.sum()), dtype=np.uint8)
+    # Groups of 7 bits, from the lowest one, with a continuation bit on all but the last group of each value
+    data[starts] = (flat & np.uint64(0x7F)) | np.uint64(0x80) * (sizes > 1)
+    long = np.flatnonzero(sizes > 1)
+    for i in range(1, int(sizes.max(initial=1))):
+        group = (flat[long] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        data[starts[long] + i] = group | np.uint64(0x80) * (sizes[long] > i + 1)
+        long = long[sizes[long] > i + 1]
+    row_sizes = np.zeros(values.shape, dtype=np.int64)
+    if present is None:
+        row_sizes[:] = sizes.reshape(values.shape)
+    else:
+        row_sizes[present] = sizes
+    return data, row_sizes.sum(axis=1)
+
+
+def _concat_rows(*blocks: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """Concatenates, row by row, blocks of rows of bytes given as (bytes of all the rows, size of each row)."""
+    lengths = np.column_stack([length for _, length in blocks])
+    offsets = (np.cumsum(lengths) - lengths.ravel()).reshape(lengths.shape)
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for (data, length), offset in zip(blocks, offsets.T, strict=True):
+        # Each byte goes to the start of its row in the output, plus its position in the row
+        out[np.repeat(offset - (np.cumsum(length) - length), length) + np.arange(len(data))] = data
+    return out
+
+
+def _strings_bytes(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Bytes of all the strings of a fixed width bytes array, and the number of bytes of each string."""
+    values = np.ascontiguousarray(values)
+    lengths = np.char.str_len(values)
+    width = values.dtype.itemsize
+    chars = values.view(np.uint8).reshape(len(values), width)
+    return chars[np.arange(width) < lengths[:, None]], lengths
+
+
+def _value_type(values: np.ndarray) -> int:
+    if values.dtype == bool:
+        return _BOOL_VALUE
+    if values.dtype.kind in "iu":
+        return _SINT_VALUE
+    if values.dtype.kind == "f":
+        return _DOUBLE_VALUE
+    return _STRING_VALUE
+
+
+def _encode_values(value_type: int, table: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Encodes values of the same type as `values` fields of a layer: the bytes of all the values, and their sizes."""
+    n = len(table)
+    if value_type == _STRING_VALUE:
+        data, lengths = _strings_bytes(table)
+        header, header_sizes = _varint_rows(
+            _columns(n, 4 << 3 | 2, 1 + _varint_sizes(lengths) + lengths, 1 << 3 | 2, lengths)
+        )
+        return _concat_rows((header, header_sizes), (data, lengths)), header_sizes + lengths
+    if value_type == _DOUBLE_VALUE:
+        header, header_sizes = _varint_rows(_columns(n, 4 << 3 | 2, 9, 3 << 3 | 1))
+        return _concat_rows(
+            (header, header_sizes), (table.astype("<f8").view(np.uint8), np.full(n, 8))
+        ), header_sizes + 8
+    value = _zigzag(table) if value_type == _SINT_VALUE else table.astype(np.uint64)
+    return _varint_rows(_columns(n, 4 << 3 | 2, 1 + _varint_sizes(value), value_type << 3, value))
+
+
+def _points_geometry(coords: np.ndarray) -> np.ndarray:
+    # MoveTo(1)
+    return _columns(len(coords), 9, _zigzag(coords[:, 0]), _zigzag(coords[:, 1]))
+
+
+def _boxes_geometry(coords: np.ndarray) -> np.ndarray:
+    # MoveTo(1), LineTo(3), ClosePath: clockwise rings in tile coordinates (y axis pointing down)
+    x0, y0, x1, y1 = (coords[:, i].astype(np.int64) for i in range(4))
+    dx, dy = _zigzag(x1 - x0), _zigzag(y1 - y0)
+    return _columns(len(coords), 9, _zigzag(x0), _zigzag(y0), 26, dx, 0, 0, dy, _zigzag(x0 - x1), 0, 15)
+
+
+def _constant_rows(data: bytes, n: int) -> tuple[np.ndarray, np.ndarray]:
+    return np.tile(np.frombuffer(data, dtype=np.uint8), n), np.full(n, len(data))
+
+
+def encode_mvt_layers(
+    name: str, geometry_type: str, coords: np.ndarray, attributes: dict[str, np.ndarray], starts: np.ndarray
+) -> list[bytes]:
+    """
+    Encodes MVT layers of the same name and attributes from consecutive groups of features
+    (e.g. the layers of a range of tiles), all their features at once.
+
+    Args:
+        name (str): layer name
+        geometry_type (str): "point" (coords of shape (n, 2)) or "box" (coords of shape (n, 4): x0, y0, x1, y1)
+        coords (np.ndarray): integer coordinates in tile extent units
+        attributes (dict[str, np.ndarray]): attribute columns of length n (strings as UTF-8 encoded bytes)
+        starts (np.ndarray): position of the first feature of each layer
+    """
+    n, m = len(coords), len(starts)
+    layer_of = np.repeat(np.arange(m), np.diff(np.r_[starts, n]))
+    keys = list(attributes)
+    columns = [np.asarray(attributes[k]) for k in keys]
+    columns = [np.char.encode(c.astype(str), "utf-8") if c.dtype.kind in "UO" else c for c in columns]
+
+    # Tags of the features: pairs of indices in the keys and the values of the layer (missing values are skipped)
+    tags = np.zeros((n, 2 * len(keys)), dtype=np.uint64)
+    tagged = np.ones(tags.shape, dtype=bool)
+    # The values table of a layer is shared by all the keys: values of the same type are deduplicated
+    # over all the columns, by sorting them by layer, then by value
+    tables = []
+    for value_type in (_STRING_VALUE, _SINT_VALUE, _DOUBLE_VALUE, _BOOL_VALUE):
+        typed = [k for k, column in enumerate(columns) if _value_type(column) == value_type]
+        if not typed:
+            continue
+        masks = [~np.isnan(columns[k]) if value_type == _DOUBLE_VALUE else np.ones(n, dtype=bool) for k in typed]
+        table = np.concatenate([columns[k][mask] for k, mask in zip(typed, masks, strict=True)])
+        table_layer = np.concatenate([layer_of[mask] for mask in masks])
+        order = np.lexsort((table, table_layer))
+        table, table_layer = table[order], table_layer[order]
+        first = np.ones(len(table), dtype=bool)
+        first[1:] = (table_layer[1:] != table_layer[:-1]) | (table[1:] != table[:-1])
+        tables.append((value_type, typed, masks, order, table, table_layer, first))
+    # Types with fewer distinct values come first, as their (more frequent) indices get shorter varints
+    tables.sort(key=lambda typed_table: int(typed_table[-1].sum()))
+    values = []
+    nb_values = np.zeros(m, dtype=np.int64)
+    for value_type, typed, masks, order, table, table_layer, first in tables:
+        unique_layer = table_layer[first]
+        counts = np.bincount(unique_layer, minlength=m)
+        # Index of each value in the table of its layer
+        index = np.empty(len(table), dtype=np.int64)
+        index[order] = np.cumsum(first) - 1 - (np.cumsum(counts) - counts - nb_values)[table_layer]
+        start = 0
+        for k, mask in zip(typed, masks, strict=True):
+            column_index = index[start : start + int(mask.sum())]
+            start += len(column_index)
+            tags[:, 2 * k] = k
+            tags[mask, 2 * k + 1] = column_index
+            tagged[:, 2 * k] = tagged[:, 2 * k + 1] = mask
+        encoded, sizes = _encode_values(value_type, table[first])
+        values.append((encoded, np.bincount(unique_layer, weights=sizes, minlength=m).astype(np.int64)))
+        nb_values += counts
+
+    geometry = _points_geometry(coords) if geometry_type == "point" else _boxes_geometry(coords)
+    has_tags = tagged.any(axis=1)
+    tags_size = _row_sizes(tags, tagged)
+    geometry_size = _row_sizes(geometry)
+    feature_size = (
+        np.where(has_tags, 1 + _varint_sizes(tags_size) + tags_size, 0)
+        + 3
+        + _varint_sizes(geometry_size)
+        + geometry_size
+    )
+    # Feature: tags (packed), geometry type (POINT (1) or POLYGON (3)) and geometry (packed), in a `features` field
+    features = np.hstack(
+        (
+            _columns(n, 2 << 3 | 2, feature_size, 2 << 3 | 2, tags_size),
+            tags,
+            _columns(n, 3 << 3, 1 if geometry_type == "point" else 3, 4 << 3 | 2, geometry_size),
+            geometry,
+        )
+    )
+    present = np.ones(features.shape, dtype=bool)
+    present[:, 2:4] = has_tags[:, None]
+    present[:, 4 : 4 + tags.shape[1]] = tagged
+    features_data, features_sizes = _varint_rows(features, present)
+
+    header, layer_keys, extent = bytearray(), bytearray(), bytearray()
+    _write_varint(header, 15 << 3)  # version
+    _write_varint(header, 2)
+    _write_bytes(header, 1, name.encode())
+    for key in keys:
+        _write_bytes(layer_keys, 3, key.encode())
+    _write_varint(extent, 5 << 3)
+    _write_varint(extent, EXTENT)
+    blocks = [
+        _constant_rows(header, m),
+        (features_data, np.bincount(layer_of, weights=features_sizes, minlength=m).astype(np.int64)),
+        _constant_rows(layer_keys, m),
+        *values,
+        _constant_rows(extent, m),
+    ]
+    data = _concat_rows(*blocks).tobytes()
+    ends = np.cumsum(sum(sizes for _, sizes in blocks)).tolist()
+    return [data[start:end] for start, end in zip([0, *ends[:-1]], ends, strict=True)]
+
+
+def encode_mvt_layer(name: str, geometry_type: str, coords: np.ndarray, attributes: dict[str, np.ndarray]) -> bytes:
+    """Encodes a MVT layer (see `encode_mvt_layers`)."""
+    return encode_mvt_layers(name, geometry_type, coords, attributes, np.zeros(1, dtype=np.int64))[0]
+
+
+def encode_tile(task: TileTask) -> tuple[int, int, int, bytes]:
+    z, x, y, layers = task
+    tile = bytearray()
+    for layer in layers:
+        _write_bytes(tile, 3, encode_mvt_layer(*layer))
+    return z, x, y, gzip.compress(bytes(tile), compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _fit_tile(
+    z: int,
+    x: int,
+    y: int,
+    layers: list[tuple[str, str, np.ndarray, dict[str, np.ndarray], np.ndarray]],
+    data: bytes,
+    max_tile_bytes: int,
+) -> bytes:
+    """
+    Drops features of a tile whose encoding (`data`) is larger than `max_tile_bytes` until it fits, all the layers
+    in the same proportion and in reverse priority order (so that the points kept are the ones that would be kept
+    with fewer `max_features`), similar to tippecanoe's --drop-densest-as-needed.
+    """
+    orders = [np.argsort(priority, kind="stable") for *_, priority in layers]
+    nb_features = kept = sum(len(order) for order in orders)
+    while len(data) > max_tile_bytes:
+        # The size of a tile is about proportional to its number of features
+        kept = int(kept * 0.9 * max_tile_bytes / len(data))
+        reduced = []
+        for (name, geometry_type, coords, attributes, _), order in zip(layers, orders, strict=True):
+            keep = np.sort(order[: len(order) * kept // nb_features])
+            if len(keep) > 0:
+                reduced.append((name, geometry_type, coords[keep], {k: v[keep] for k, v in attributes.items()}))
+        _, _, _, data = encode_tile((z, x, y, reduced))
+    return data
+
+
+def _encode_tiles(task: TilesTask, max_tile_bytes: int | None = None) -> list[tuple[int, int, int, bytes]]:
+    """
+    Encodes a range of tiles, the layers of all the tiles at once.
+    The tiles larger than `max_tile_bytes` are encoded again with fewer features (see `_fit_tile`).
+    """
+    tiles: dict[int, tuple[int, int, bytearray]] = {}
+    # Records of each tile, by layer: (index of the layer in the task, start, stop)
+    ranges: dict[int, list[tuple[int, int, int]]] = {}
+    for i, (name, geometry_type, key, tile, coords, attributes, _) in enumerate(task):
+        starts = _group_starts(key)
+        layers = encode_mvt_layers(name, geometry_type, coords, attributes, starts)
+        stops = [*starts[1:].tolist(), len(key)]
+        for start, stop, layer in zip(starts.tolist(), stops, layers, strict=True):
+            _, _, data = tiles.setdefault(int(key[start]), (int(tile[start, 0]), int(tile[start, 1]), bytearray()))
+            _write_bytes(data, 3, layer)
+            ranges.setdefault(int(key[start]), []).append((i, start, stop))
+    encoded = []
+    for key, (x, y, data) in sorted(tiles.items()):
+        z = key >> KEY_ZOOM_SHIFT
+        compressed = gzip.compress(bytes(data), compresslevel=GZIP_LEVEL, mtime=0)
+        if max_tile_bytes is not None and len(compressed) > max_tile_bytes:
+            layers = [
+                (
+                    task[i][0],
+                    task[i][1],
+                    task[i][4][start:stop],
+                    {k: v[start:stop] for k, v in task[i][5].items()},
+                    task[i][6][start:stop],
+                )
+                for i, start, stop in ranges[key]
+            ]
+            compressed = _fit_tile(z, x, y, layers, compressed, max_tile_bytes)
+        encoded.append((z, x, y, compressed))
+    return encoded
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Output formats
+
+
+class MBTilesWriter:
+    """Writes a tile pyramid into a MBTiles (sqlite) file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.unlink(missing_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+            """
+        )
+
+    def write_tile(self, z: int, x: int, y: int, data: bytes) -> None:
+        # MBTiles uses the TMS scheme: rows are numbered from the south
+        self.connection.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, data))
+
+    def finalize(self, metadata: dict[str, Any], bounds: tuple[float, float, float, float]) -> None:
+        west, south, east, north = bounds
+        values = {
+            "name": metadata["name"],
+            "format": "pbf",
+            "type": "overlay",
+            "minzoom": str(metadata["minzoom"]),
+            "maxzoom": str(metadata["maxzoom"]),
+            "bounds": f"{west},{south},{east},{north}",
+            "center": f"{(west + east) / 2},{(south + north) / 2},{metadata['minzoom']}",
+            "json": json.dumps({"vector_layers": metadata["vector_layers"]}),
+        }
+        self.connection.executemany("INSERT INTO metadata VALUES (?, ?)", values.items())
+        self.connection.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        self.connection.commit()
+        self.connection.close()
+
+
+class PMTilesWriter:
+    """Writes a tile pyramid into a PMTiles (v3) file. Requires the optional `pmtiles` package."""
+
+    def __init__(self, path: Path):
+        try:
+            from pmtiles.tile import zxy_to_tileid
+            from pmtiles.writer import Writer
+        except ImportError as e:
+            raise ImportError("PMTiles export requires the `pmtiles` package (pip install pmtiles)") from e
+        self.path = path
+        self._zxy_to_tileid = zxy_to_tileid
+        self._file = open(path, "wb")  # noqa: SIM115
+        self._writer = Writer(self._file)
+
+    def write_tile(self, z: int, x: int, y: int, data: bytes) -> None:
+        self._writer.write_tile(self._zxy_to_tileid(z, x, y), data)
+
+    def finalize(self, metadata: dict[str, Any], bounds: tuple[float, float, float, float]) -> None:
+        from pmtiles.tile import Compression, TileType
+
+        west, south, east, north = bounds
+        header = {
+            "tile_type": TileType.MVT,
+            "tile_compression": Compression.GZIP,
+            "min_lon_e7": int(west * 10_000_000),
+            "min_lat_e7": int(south * 10_000_000),
+            "max_lon_e7": int(east * 10_000_000),
+            "max_lat_e7": int(north * 10_000_000),
+            "center_zoom": metadata["minzoom"],
+            "center_lon_e7": int((west + east) / 2 * 10_000_000),
+            "center_lat_e7": int((south + north) / 2 * 10_000_000),
+        }
+        self._writer.finalize(header, {"name": metadata["name"], "vector_layers": metadata["vector_layers"]})
+        self._file.close()
+
+
+def tiles_writer(path: Path) -> MBTilesWriter | PMTilesWriter:
+    if path.suffix == ".pmtiles":
+        return PMTilesWriter(path)
+    elif path.suffix == ".mbtiles":
+        return MBTilesWriter(path)
+    else:
+        raise NameError(f"Tiles format not supported: {path.suffix}")
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Pyramid builder
+
+
+def hilbert_index(z: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Position of tiles (x, y) of zoom level z along the Hilbert curve, using the same
+    convention as the PMTiles tile IDs (without the zoom level offset).
+    The position of the parent of a tile is its position shifted by two bits.
+    """
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    for a in range(z - 1, -1, -1):
+        s = 1 << a
+        rx, ry = (x & s) > 0, (y & s) > 0
+        d += ((3 * rx.astype(np.int64)) ^ ry) << (2 * a)
+        flip = ~ry & rx
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+    return d
+
+
+def _group_starts(sorted_keys: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+
+
+def _local_coords(coords: np.ndarray, zoom: np.ndarray) -> np.ndarray:
+    # Coordinates of points in their tile of zoom level `zoom` (of each point), in tile extent units
+    return (coords.astype(np.int64) >> (WORLD_BITS - EXTENT_BITS - zoom)[:, None]) & (EXTENT - 1)
+
+
+class _Run:
+    """
+    Records of a layer (columns of the same length, sorted by tile key) spilled to disk,
+    as one raw file per column, read back by windows when the run is merged.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.length = 0
+        self.dtypes: dict[str, tuple[np.dtype, tuple[int, ...]]] = {}
+        directory.mkdir()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / str(list(self.dtypes).index(name))
+
+    def append(self, records: dict[str, np.ndarray]) -> None:
+        for name, values in records.items():
+            dtype, _ = self.dtypes.setdefault(name, (values.dtype, values.shape[1:]))
+            with open(self._path(name), "ab") as file:
+                np.ascontiguousarray(values, dtype=dtype).tofile(file)
+        self.length += len(records["key"])
+
+    def read(self, start: int, stop: int) -> dict[str, np.ndarray]:
+        records = {}
+        for name, (dtype, shape) in self.dtypes.items():
+            size = math.prod(shape)
+            values = np.fromfile(
+                self._path(name), dtype=dtype, count=(stop - start) * size, offset=start * size * dtype.itemsize
+            )
+            records[name] = values.reshape(-1, *shape)
+        return records
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory)
+
+
+def _merge_runs(runs: list[_Run], chunk_size: int = MERGE_CHUNK) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Merges runs of records sorted by tile key: yields chunks of records holding complete tiles,
+    in increasing key order (the records of a tile are only sorted within each run).
+    """
+    dtypes = {name: np.result_type(*(run.dtypes[name][0] for run in runs)) for name in runs[0].dtypes}
+    positions = [0] * len(runs)
+    windows: dict[int, dict[str, np.ndarray]] = {}
+    while True:
+        for i, run in enumerate(runs):
+            # Windows are extended until they hold a complete tile: the last one may go on in the next window
+            while positions[i] < run.length and (i not in windows or windows[i]["key"][0] == windows[i]["key"][-1]):
+                stop = min(positions[i] + chunk_size, run.length)
+                records = run.read(positions[i], stop)
+                if i in windows:
+                    records = {name: np.concatenate((windows[i][name], values)) for name, values in records.items()}
+                windows[i] = records
+                positions[i] = stop
+        if not windows:
+            return
+        # All the complete tiles up to the last one of the smallest window are taken from each run
+        bound = min(int(window["key"][-1]) - (positions[i] < runs[i].length) for i, window in windows.items())
+        parts = []
+        for i, window in list(windows.items()):
+            stop = int(np.searchsorted(window["key"], bound, side="right"))
+            parts.append({name: values[:stop] for name, values in window.items()})
+            if stop == len(window["key"]):
+                del windows[i]
+            else:
+                windows[i] = {name: values[stop:] for name, values in window.items()}
+        yield {
+            name: np.concatenate([part[name] for part in parts]).astype(dtype, copy=False)
+            for name, dtype in dtypes.items()
+        }
+
+
+@dataclass
+class _Layer:
+    name: str
+    geometry_type: str  # "point" or "box"
+    min_zoom: int
+    max_zoom: int
+    fields: dict[str, str] = field(default_factory=dict)
+    runs: list[_Run] = field(default_factory=list)
+    size: int = 0
+
+
+# Prefix of the attribute columns in the records of the runs
+_ATTRIBUTE = "attribute:"
+
+
+class VectorTilesBuilder:
+    """
+    Builds a vector tiles pyramid from columnar batches of points.
+
+    Each batch is bucketed into the tiles of every zoom level of its layer, and spilled to disk as a run
+    of records sorted by tile (in `spill_dir`, the default temporary folder if omitted): only the runs
+    being merged are (partly) read back in memory when the pyramid is written.
+
+    Below the maximum zoom level of a points layer, tiles holding more than `max_features`
+    points are reduced: either by dropping the extra points ("drop", similar to
+    tippecanoe's --drop-densest-as-needed), or by clustering them on a grid of
+    `cluster_cells` x `cluster_cells` cells per tile, keeping one representative point per
+    cell with an additional `point_count` attribute ("cluster"). The points kept are
+    chosen according to a random priority drawn once, so that a point displayed at a given
+    zoom level is very likely to be displayed at higher zoom levels.
+    Tiles are already reduced in each run, then again when the runs are merged.
+    Tiles whose encoding is still larger than `max_tile_bytes` (gzipped) are then encoded again with fewer features
+    (points in the same priority order, and polygons according to a random priority as well), until they fit.
+
+    Args:
+        min_zoom (int): lowest zoom level to generate
+        max_zoom (int): highest zoom level to generate (at most 20)
+        max_features (int): maximum number of points per tile below the maximum zoom of a layer
+        max_tile_bytes (int, optional): maximum size of a gzipped tile (500 KB by default, None for no limit)
+        reduction (str): "drop" (default) or "cluster"
+        cluster_cells (int): number of cells per tile side when clustering
+        workers (int, optional): number of encoding processes (default: number of CPUs, 0 to encode in-process)
+        seed (int): seed of the points priorities
+        spill_dir (Path, optional): folder in which the runs are spilled
+    """
+
+    def __init__(
+        self,
+        min_zoom: int = 0,
+        max_zoom: int = 15,
+        max_features: int = 50_000,
+        max_tile_bytes: int | None = MAX_TILE_BYTES,
+        reduction: ReductionStrategy = "drop",
+        cluster_cells: int = 256,
+        workers: int | None = None,
+        seed: int = 0,
+        spill_dir: Path | None = None,
+    ):
+        if not 0 <= min_zoom <= max_zoom <= MAX_ZOOM:
+            raise ValueError(f"Invalid zoom range: {min_zoom}-{max_zoom}")
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.max_features = max_features
+        self.max_tile_bytes = max_tile_bytes
+        self.reduction = reduction
+        self.cluster_bits = EXTENT_BITS - int(math.log2(cluster_cells))
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
+        self.spill_dir = spill_dir
+        self.layers: dict[str, _Layer] = {}
+        self.bounds = (math.inf, math.inf, -math.inf, -math.inf)
+        self._spill: tempfile.TemporaryDirectory | None = None
+        self._nb_runs = 0
+
+    def _layer(self, name: str, geometry_type: str, min_zoom: int | None, max_zoom: int | None) -> _Layer:
+        if name not in self.layers:
+            self.layers[name] = _Layer(
+                name,
+                geometry_type,
+                self.min_zoom if min_zoom is None else min_zoom,
+                self.max_zoom if max_zoom is None else max_zoom,
+            )
+        return self.layers[name]
+
+    def _new_run(self) -> _Run:
+        if self._spill is None:
+            # Removed once the pyramid is written (or when the builder is garbage collected)
+            self._spill = tempfile.TemporaryDirectory(prefix="popdbgen-tiles-", dir=self.spill_dir)
+        self._nb_runs += 1
+        return _Run(Path(self._spill.name) / f"run-{self._nb_runs:06d}")
+
+    def _add_run(self, layer: _Layer, run: _Run, attributes: dict[str, np.ndarray], size: int) -> None:
+        if not layer.fields:
+            layer.fields = {k: _field_type(v) for k, v in attributes.items()}
+        layer.runs.append(run)
+        layer.size += size
+
+    def _update_bounds(self, lonlat_bounds: np.ndarray) -> None:
+        west, south, east, north = self.bounds
+        self.bounds = (
+            min(west, float(lonlat_bounds[0])),
+            min(south, float(lonlat_bounds[1])),
+            max(east, float(lonlat_bounds[2])),
+            max(north, float(lonlat_bounds[3])),
+        )
+
+    def _clustered(self, layer: _Layer, z: int) -> bool:
+        return layer.geometry_type == "point" and self.reduction == "cluster" and z < layer.max_zoom
+
+    def _reduce_points(self, layer: _Layer, records: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        """
+        Sorts points records by tile, and reduces the tiles holding more than `max_features` points below
+        the maximum zoom level of the layer. A record stands for `weight` points once clustered, so that
+        the tiles of each run are reduced, then reduced again when the runs are merged.
+        """
+        key, weight = records["key"], records["weight"]
+        if len(key) == 0:
+            return records
+        zoom = key >> KEY_ZOOM_SHIFT
+        if self.reduction == "cluster":
+            local = _local_coords(records["coords"], zoom)
+            cells = (local[:, 0] >> self.cluster_bits) << EXTENT_BITS | (local[:, 1] >> self.cluster_bits)
+            cells[zoom >= layer.max_zoom] = 0
+            order = np.lexsort((records["priority"], cells, key))
+        else:
+            order = np.lexsort((records["priority"], key))
+        sorted_key, sorted_weight = key[order], weight[order].astype(np.int64)
+        starts = _group_starts(sorted_key)
+        counts = np.diff(np.r_[starts, len(order)])
+        totals = np.add.reduceat(sorted_weight, starts)
+        crowded = np.repeat(
+            (totals > self.max_features) & (sorted_key[starts] >> KEY_ZOOM_SHIFT < layer.max_zoom), counts
+        )
+        if self.reduction == "cluster":
+            sorted_cells = cells[order]
+            first = np.r_[True, (sorted_key[1:] != sorted_key[:-1]) | (sorted_cells[1:] != sorted_cells[:-1])]
+            first_index = np.flatnonzero(first)
+            cluster_weights = np.add.reduceat(sorted_weight, first_index)
+            keep = first | ~crowded
+            # Points of the tiles that are not crowded are not clustered
+            sorted_weight = np.where(
+                crowded, np.repeat(cluster_weights, np.diff(np.r_[first_index, len(order)])), sorted_weight
+            )
+        else:
+            rank = np.arange(len(order)) - np.repeat(starts, counts)
+            keep = (rank < self.max_features) | ~crowded
+        reduced = {k: v[order[keep]] for k, v in records.items()}
+        reduced["weight"] = sorted_weight[keep].astype(weight.dtype)
+        return reduced
+
+    def _sort(self, layer: _Layer, records: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        if layer.geometry_type == "point":
+            return self._reduce_points(layer, records)
+        order = np.argsort(records["key"], kind="stable")
+        return {k: v[order] for k, v in records.items()}
+
+    def add_points(
+        self,
+        layer: str,
+        gdf: gpd.GeoDataFrame,
+        attributes: list[str] | None = None,
+        min_zoom: int | None = None,
+        max_zoom: int | None = None,
+    ) -> None:
+        """Adds a batch of points to a layer (all non geometry columns are kept by default)."""
+        if gdf.empty:
+            return
+        points = gdf.geometry.to_crs(epsg=4326)
+        self._update_bounds(points.total_bounds)
+        x, y = lonlat_to_world(points.x.to_numpy(), points.y.to_numpy())
+        columns = [c for c in gdf.columns if c != gdf.geometry.name] if attributes is None else attributes
+        values = {c: _column_values(gdf[c]) for c in columns}
+        points_layer = self._layer(layer, "point", min_zoom, max_zoom)
+        records = {
+            "coords": np.column_stack((x, y)),
+            "priority": self.rng.integers(0, 1 << 32, len(gdf), dtype=np.uint32),
+            "weight": np.ones(len(gdf), dtype=np.uint32),
+            **{_ATTRIBUTE + c: v for c, v in values.items()},
+        }
+        # Positions of the tiles of the highest zoom level, from which the positions of their parents are derived
+        shift = WORLD_BITS - points_layer.max_zoom
+        index = hilbert_index(points_layer.max_zoom, x >> shift, y >> shift)
+        run = self._new_run()
+        for z in range(points_layer.min_zoom, points_layer.max_zoom + 1):
+            key = (z << KEY_ZOOM_SHIFT) | (index >> 2 * (points_layer.max_zoom - z))
+            run.append(self._reduce_points(points_layer, {"key": key, **records}))
+        self._add_run(points_layer, run, values, len(gdf))
+
+    def add_squares(
+        self,
+        layer: str,
+        gdf: gpd.GeoDataFrame,
+        attributes: list[str] | None = None,
+        min_zoom: int | None = None,
+        max_zoom: int | None = None,
+    ) -> None:
+        """
+        Adds a batch of polygons to a layer, represented by their bounding boxes
+        (e.g. the FILO tiles, packed with the households or population layers like `tile-join -pk`).
+        """
+        if gdf.empty:
+            return
+        bounds = gdf.geometry.to_crs(epsg=4326).bounds.to_numpy()
+        self._update_bounds(np.array([bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()]))
+        x0, y0 = lonlat_to_world(bounds[:, 0], bounds[:, 3])
+        x1, y1 = lonlat_to_world(bounds[:, 2], bounds[:, 1])
+        coords = np.column_stack((x0, y0, x1, y1)).astype(np.int64)
+        priority = self.rng.integers(0, 1 << 32, len(gdf), dtype=np.uint32)
+        columns = [c for c in gdf.columns if c != gdf.geometry.name] if attributes is None else attributes
+        values = {c: _column_values(gdf[c]) for c in columns}
+        boxes_layer = self._layer(layer, "box", min_zoom, max_zoom)
+        run = self._new_run()
+        for z in range(boxes_layer.min_zoom, boxes_layer.max_zoom + 1):
+            shift = WORLD_BITS - z
+            tx0, ty0 = coords[:, 0] >> shift, coords[:, 1] >> shift
+            nx, ny = (coords[:, 2] >> shift) - tx0 + 1, (coords[:, 3] >> shift) - ty0 + 1
+            # A box is added to every tile it overlaps
+            n = nx * ny
+            rows = np.repeat(np.arange(len(coords)), n)
+            offset = np.arange(len(rows)) - np.repeat(np.cumsum(n) - n, n)
+            tx, ty = tx0[rows] + offset % nx[rows], ty0[rows] + offset // nx[rows]
+            origin = np.column_stack((tx, ty, tx, ty)) << EXTENT_BITS
+            local = np.clip((coords[rows] >> (shift - EXTENT_BITS)) - origin, -BUFFER, EXTENT + BUFFER)
+            key = (z << KEY_ZOOM_SHIFT) | hilbert_index(z, tx, ty)
+            order = np.argsort(key, kind="stable")
+            records = {
+                "key": key[order],
+                "tile": np.column_stack((tx, ty))[order].astype(np.uint32),
+                "coords": local[order].astype(np.int16),
+                "priority": priority[rows[order]],
+                **{_ATTRIBUTE + c: v[rows[order]] for c, v in values.items()},
+            }
+            run.append(records)
+        self._add_run(boxes_layer, run, values, len(gdf))
+
+    def _merged_records(self, layer: _Layer) -> Iterator[dict[str, np.ndarray]]:
+        """Sorted (and reduced) records of a layer, by chunks of complete tiles in key order."""
+        runs = [run for run in layer.runs if run.length > 0]
+        # Runs are first merged by groups, as long as there are too many of them to be merged at once
+        while len(runs) > MAX_MERGED_RUNS:
+            merged_runs = []
+            for i in range(0, len(runs), MAX_MERGED_RUNS):
+                group, run = runs[i : i + MAX_MERGED_RUNS], self._new_run()
+                for records in _merge_runs(group):
+                    run.append(self._sort(layer, records))
+                for merged in group:
+                    merged.remove()
+                merged_runs.append(run)
+            runs = layer.runs = merged_runs
+        for records in _merge_runs(runs) if runs else ():
+            yield self._sort(layer, records)
+
+    def _layer_range(self, layer: _Layer, records: dict[str, np.ndarray]) -> tuple:
+        # Records of a range of tiles of the same zoom level, as encoded by `_encode_tiles`
+        key = records["key"]
+        z = int(key[0] >> KEY_ZOOM_SHIFT)
+        if layer.geometry_type == "point":
+            tiles = records["coords"].astype(np.int64) >> (WORLD_BITS - z)
+            local = _local_coords(records["coords"], np.full(len(key), z))
+        else:
+            tiles, local = records["tile"], records["coords"]
+        attributes = {k.removeprefix(_ATTRIBUTE): v for k, v in records.items() if k.startswith(_ATTRIBUTE)}
+        if self._clustered(layer, z):
+            attributes["point_count"] = records["weight"]
+        return layer.name, layer.geometry_type, key, tiles, local, attributes, records["priority"]
+
+    def _tasks(self) -> Iterator[TilesTask]:
+        """
+        Ranges of tiles to encode, holding the records of all the layers for about `ENCODE_CHUNK` records
+        of the same zoom level, in key order: by zoom level, then along the Hilbert curve
+        (the PMTiles "clustered" order).
+        """
+        streams = {layer.name: self._merged_records(layer) for layer in self.layers.values() if layer.size > 0}
+        pending: dict[str, dict[str, np.ndarray]] = {}
+        while True:
+            for name in [name for name in streams if name not in pending]:
+                records = next(streams[name], None)
+                if records is None:
+                    del streams[name]
+                else:
+                    pending[name] = records
+            if not pending:
+                return
+            # Chunks of merged records hold complete tiles: the tiles up to the last one of the smallest window
+            # are all pending, for every layer
+            bound = min(records["key"][min(ENCODE_CHUNK, len(records["key"])) - 1] for records in pending.values())
+            zoom = min(int(records["key"][0] >> KEY_ZOOM_SHIFT) for records in pending.values())
+            bound = min(bound, ((zoom + 1) << KEY_ZOOM_SHIFT) - 1)
+            task = []
+            for name, records in list(pending.items()):
+                stop = int(np.searchsorted(records["key"], bound, side="right"))
+                if stop > 0:
+                    task.append(self._layer_range(self.layers[name], {k: v[:stop] for k, v in records.items()}))
+                if stop == len(records["key"]):
+                    del pending[name]
+                else:
+                    pending[name] = {k: v[stop:] for k, v in records.items()}
+            yield task
+
+    def _fields(self, layer: _Layer) -> dict[str, str]:
+        fields = dict(layer.fields)
+        if self._clustered(layer, layer.min_zoom):
+            fields["point_count"] = "Number"
+        return fields
+
+    def metadata(self, name: str) -> dict[str, Any]:
+        return {
+            "name": name,
+            "minzoom": self.min_zoom,
+            "maxzoom": self.max_zoom,
+            "vector_layers": [
+                {
+                    "id": layer.name,
+                    "minzoom": layer.min_zoom,
+                    "maxzoom": layer.max_zoom,
+                    "fields": self._fields(layer),
+                }
+                for layer in self.layers.values()
+            ],
+        }
+
+    def cleanup(self) -> None:
+        """Removes the spilled runs."""
+        if self._spill is not None:
+            self._spill.cleanup()
+            self._spill = None
+        for layer in self.layers.values():
+            layer.runs = []
+
+    def write(self, paths: Path | list[Path], name: str | None = None) -> None:
+        """
+        Merges the spilled runs, encodes all the tiles of the pyramid and writes them to .mbtiles and/or
+        .pmtiles files (tiles are encoded only once when several output files are given).
+        The runs are removed once written.
+        """
+        paths = [paths] if isinstance(paths, Path) else paths
+        writers = [tiles_writer(path) for path in paths]
+        logging.info(
+            f"Building vector tiles (zoom levels {self.min_zoom}-{self.max_zoom}): {', '.join(map(str, paths))}"
+        )
+        nb_tiles = 0
+        encode = partial(_encode_tiles, max_tile_bytes=self.max_tile_bytes)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) if self.workers != 0 else nullcontext() as executor:
+                if executor is None:
+                    results: Iterator[list[tuple[int, int, int, bytes]]] = map(encode, self._tasks())
+                else:
+                    # A couple of pending tasks per worker, as each one holds up to `ENCODE_CHUNK` records per layer
+                    window = 2 * (self.workers or os.cpu_count() or 1)
+                    results = _bounded_map(executor, encode, self._tasks(), window)
+                for encoded in results:
+                    for tile in encoded:
+                        for writer in writers:
+                            writer.write_tile(*tile)
+                    nb_tiles += len(encoded)
+        finally:
+            self.cleanup()
+        for writer in writers:
+            writer.finalize(self.metadata(name or paths[0].stem), self.bounds)
+        logging.info(f"{nb_tiles} vector tiles written")
+
+
+def _bounded_map(executor: Executor, fn: Callable, tasks: Iterable, window: int) -> Iterator:
+    # Like executor.map, but without consuming all the tasks upfront
+    pending: deque = deque()
+    for task in tasks:
+        pending.append(executor.submit(fn, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class VectorTilesSink(BatchSink):
+    """
+    Spills the generated batches as a points layer and writes the whole
+    tile pyramid as .mbtiles and/or .pmtiles files when closed.
+    The runs are spilled next to the (first) output file, unless a `spill_dir` is given.
+    The FILO tiles can be packed in the same pyramid as a second layer ("filo").
+    """
+
+    def __init__(
+        self,
+        path: Path | list[Path],
+        layer: str,
+        attributes: list[str] | None = None,
+        filo: gpd.GeoDataFrame | None = None,
+        filo_attributes: list[str] | None = None,
+        filo_min_zoom: int = 11,
+        **builder_options,
+    ):
+        super().__init__(path)
+        self.layer = layer
+        self.attributes = attributes
+        self.filo = filo
+        self.filo_attributes = filo_attributes
+        self.filo_min_zoom = filo_min_zoom
+        builder_options.setdefault("spill_dir", (path if isinstance(path, Path) else path[0]).parent)
+        self.builder: VectorTilesBuilder | None = VectorTilesBuilder(**builder_options)
+
+    def _write(self, gdf: gpd.GeoDataFrame) -> None:
+        self.builder.add_points(self.layer, gdf, self.attributes)
+
+    def close(self) -> None:
+        if self.builder is None:
+            return
+        if self.filo is not None:
+            self.builder.add_squares(
+                "filo", self.filo, self.filo_attributes, min_zoom=max(self.builder.min_zoom, self.filo_min_zoom)
+            )
+        self.builder.write(self.path)
+        self.builder = None
@@ -1,21 +1,28 @@
-import logging
+from __future__ import annotations
+
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
+
+from .lazy_imports import lazy_module
 
-import geopandas as gpd
-import numpy as np
-import pandas as pd
+if TYPE_CHECKING:
+    import geopandas as gpd
+    import numpy as np
+    import pandas as pd
 
-from .metadata import households_dtype, population_dtype
+    from .metadata import IdFormat, SchemaProfile
+else:
+    # Imported on first use (see `lazy_module`), so that the helpers of this module import in a few milliseconds
+    gpd = lazy_module("geopandas")
+    np = lazy_module("numpy")
+    pd = lazy_module("pandas")
 
 # Path vers la racine du projet
 PROJECT_DIR: Path = Path(__file__).resolve().parents[1]
 # Répertoire pour enregistrer le fichier téléchargé
 DATA_DIR: Path = PROJECT_DIR / "data"
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p")
-
 
 def round_alea(x: pd.Series) -> pd.Series:
     """
@@ -54,6 +61,131 @@ filo_epsg: dict[TerritoryCode, int] = {
 }
 
 
+# Tile identifiers ("CRS3035RES200mN2029800E4252400") are packed as integer keys:
+# the northing and easting of the tile (in 200m units) each fit on 16 bits
+TILE_ID_PATTERN = "200mN(.*)E(.*)"
+TILE_KEY_BITS = 16
+
+
+def tile_key(tile_id: str) -> int:
+    """
+    Returns the integer key of a FILO tile identifier.
+    """
+    northing, easting = tile_id[tile_id.index("200mN") + 5 :].split("E")
+    return (int(northing) // 200) << TILE_KEY_BITS | (int(easting) // 200)
+
+
+def tile_keys(tile_ids: pd.Series) -> np.ndarray:
+    """
+    Vectorized version of `tile_key`.
+    """
+    e = tile_ids.str.extract(TILE_ID_PATTERN).astype(np.int64).to_numpy()
+    return (e[:, 0] // 200) << TILE_KEY_BITS | (e[:, 1] // 200)
+
+
+# Households identifiers pack the tile key and the (1-based) rank of the household in its tile,
+# and individuals identifiers pack the household identifier and the (1-based) rank of the individual in it:
+# 32 + 20 + 11 bits, which fits in a (positive) int64
+HOUSEHOLD_ORDINAL_BITS = 20
+INDIVIDUAL_ORDINAL_BITS = 11
+
+
+def household_id(key: int, ordinal: int) -> int:
+    """
+    Returns the integer identifier of the `ordinal`-th household (starting from 1) of the tile of key `key`.
+    """
+    return key << HOUSEHOLD_ORDINAL_BITS | ordinal
+
+
+def individual_id(hh_id: int, ordinal: int) -> int:
+    """
+    Returns the integer identifier of the `ordinal`-th individual (starting from 1) of a household.
+    """
+    return hh_id << INDIVIDUAL_ORDINAL_BITS | ordinal
+
+
+def unpack_household_ids(ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the tile keys and the ranks in their tile of an array of households identifiers.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    return ids >> HOUSEHOLD_ORDINAL_BITS, ids & ((1 << HOUSEHOLD_ORDINAL_BITS) - 1)
+
+
+def unpack_individual_ids(ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the households identifiers and the ranks in their household of an array of individuals identifiers.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    return ids >> INDIVIDUAL_ORDINAL_BITS, ids & ((1 << INDIVIDUAL_ORDINAL_BITS) - 1)
+
+
+def render_ids(gdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Renders the integer `ID` (and `HOUSEHOLD_ID`) columns of a households or population data frame
+    in the legacy string form ("<TILE_ID>_<household rank>[_<individual rank>]"), using its `TILE_ID` column.
+    The data frame is returned unchanged if its identifiers already are strings.
+    """
+    if not pd.api.types.is_integer_dtype(gdf["ID"].dtype):
+        return gdf
+    tile_ids = gdf["TILE_ID"].astype("string")
+
+    def suffixes(ordinals: np.ndarray) -> pd.Series:
+        return "_" + pd.Series(ordinals, index=gdf.index).astype("string")
+
+    gdf = gdf.copy(deep=False)
+    if "HOUSEHOLD_ID" in gdf.columns:
+        hh_ids, ranks = unpack_individual_ids(gdf["ID"].to_numpy())
+        gdf["HOUSEHOLD_ID"] = tile_ids + suffixes(unpack_household_ids(hh_ids)[1])
+        gdf["ID"] = gdf["HOUSEHOLD_ID"] + suffixes(ranks)
+    else:
+        gdf["ID"] = tile_ids + suffixes(unpack_household_ids(gdf["ID"].to_numpy())[1])
+    return gdf
+
+
+# Independent random streams derived from the generation seed and the tile key,
+# so that the output of a tile does not depend on the tiles processed before it.
+REFINE_STREAM = 0
+HOUSEHOLDS_STREAM = 1
+POPULATION_STREAM = 2
+
+
+def resolve_seed(seed: int | None) -> int:
+    """
+    Returns the seed unchanged, or draws one from numpy's global random state if it is None
+    (so that `np.random.seed` still controls the generation).
+    """
+    return int(np.random.randint(2**31)) if seed is None else seed
+
+
+def tile_rng(seed: int, key: int, stream: int) -> np.random.Generator:
+    """
+    Returns the random generator dedicated to a given tile and stream.
+    """
+    return np.random.default_rng([seed, key, stream])
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(z: int) -> int:
+    z = (z + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def keyed_random(seed: int, *keys: int) -> float:
+    """
+    Counter-based uniform draw in [0, 1): the value only depends on the seed and the keys
+    (e.g. tile key, household and individual ordinals), whatever the order of the draws.
+    """
+    h = seed & _MASK64
+    for k in keys:
+        h = _splitmix64(h ^ (k & _MASK64))
+    return (h >> 11) * 2.0**-53
+
+
 def territory_crs(territory: TerritoryCode) -> str:
     return f"EPSG:{territory_epsg[territory]}"
 
@@ -107,13 +239,29 @@ age_categories: dict[ALL_AGE_LITERAL, tuple[bool, int, int]] = {
 }
 
 
-def mkHouseholdsDataFrame(data, territory: TerritoryCode) -> gpd.GeoDataFrame:
-    return gpd.GeoDataFrame(data=data, geometry="geometry", crs=territory_crs(territory)).astype(
-        dtype=households_dtype, copy=False
-    )
+def _mkDataFrame(data, territory: TerritoryCode, dtype: Mapping, id_format: IdFormat) -> gpd.GeoDataFrame:
+    from .metadata import ID_COLUMNS
+
+    # The packed integer identifiers are rendered at once as strings (the "string" dtype of the schemas), if requested
+    integer_ids = {c: np.int64 for c in ID_COLUMNS if c in dtype}
+    if len(data) == 0:
+        data = pd.DataFrame({c: pd.Series(dtype=object) for c in dtype})
+    gdf = gpd.GeoDataFrame(data=data, geometry="geometry", crs=territory_crs(territory))
+    gdf = gdf.astype(dtype={**dtype, **integer_ids}, copy=False)
+    return render_ids(gdf) if id_format == "string" else gdf
+
+
+def mkHouseholdsDataFrame(
+    data, territory: TerritoryCode, profile: SchemaProfile = "default", id_format: IdFormat = "string"
+) -> gpd.GeoDataFrame:
+    from .metadata import households_dtypes
+
+    return _mkDataFrame(data, territory, households_dtypes[profile], id_format)
+
 
+def mkPopulationDataFrame(
+    data, territory: TerritoryCode, profile: SchemaProfile = "default", id_format: IdFormat = "string"
+) -> gpd.GeoDataFrame:
+    from .metadata import population_dtypes
 
-def mkPopulationDataFrame(data, territory: TerritoryCode) -> gpd.GeoDataFrame:
-    return gpd.GeoDataFrame(data=data, geometry="geometry", crs=territory_crs(territory)).astype(
-        dtype=population_dtype, copy=False
-    )
+    return _mkDataFrame(data, territory, population_dtypes[profile], id_format)
@@ -0,0 +1,203 @@
+import logging
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fastparquet import ParquetFile
+
+from .utils import ALL_AGE_COLUMNS, tile_keys
+
+HOUSEHOLDS_VALIDATED_COLUMNS = ["TILE_ID", "SIZE", "NIVEAU_VIE", *ALL_AGE_COLUMNS]
+POPULATION_VALIDATED_COLUMNS = ["TILE_ID", "AGE_CAT", "NIVEAU_VIE"]
+
+
+def gpkg_wkb(blob: bytes) -> bytes:
+    """
+    Returns the WKB geometry of a GeoPackage geometry blob, skipping its header and envelope.
+    """
+    envelope_size = (0, 32, 48, 48, 64)[(blob[3] >> 1) & 0b111]
+    return blob[8 + envelope_size :]
+
+
+def read_columns(path: Path, columns: list[str], chunk_size: int = 1_000_000) -> Iterator[pd.DataFrame]:
+    """
+    Streams some columns of a generated database, without loading it entirely:
+    a GeoParquet file (or a folder of GeoParquet partitions) row group by row group,
+    or the (single) layer of a GeoPackage file by chunks of `chunk_size` rows.
+    The `geometry` column, if requested, is read as WKB.
+    """
+    if path.is_dir():
+        for file_path in sorted(path.glob("*.parquet")):
+            yield from read_columns(file_path, columns, chunk_size)
+    elif path.suffix == ".parquet":
+        yield from ParquetFile(path).iter_row_groups(columns=columns)
+    elif path.suffix == ".gpkg":
+        with closing(sqlite3.connect(path)) as con:
+            (layer, geometry) = con.execute(
+                "SELECT table_name, column_name FROM gpkg_contents JOIN gpkg_geometry_columns USING (table_name)"
+                " WHERE data_type = 'features'"
+            ).fetchone()
+            quoted_columns = ", ".join(f'"{geometry if c == "geometry" else c}"' for c in columns)
+            cursor = con.execute(f'SELECT {quoted_columns} FROM "{layer}" ORDER BY fid')
+            while rows := cursor.fetchmany(chunk_size):
+                chunk = pd.DataFrame.from_records(rows, columns=columns)
+                if "geometry" in columns:
+                    chunk["geometry"] = chunk["geometry"].map(gpkg_wkb)
+                yield chunk
+    else:
+        raise ValueError(f"Unsupported database format (expected GeoParquet or GeoPackage): {path}")
+
+
+def _tile_runs(tile_ids: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Tile identifiers, first rows and lengths of the runs of rows of the same tile."""
+    values = tile_ids.to_numpy()
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1]))) if len(values) else np.empty(0, int)
+    return values[starts], starts, np.diff(np.append(starts, len(values)))
+
+
+def run_tile_keys(tile_ids: pd.Series) -> np.ndarray:
+    """
+    Returns the keys of the tiles of a column of tile identifiers. The rows of a tile being consecutive
+    in the generated databases, the keys are only computed once per run of rows of the same tile.
+    """
+    run_ids, _, lengths = _tile_runs(tile_ids)
+    return np.repeat(tile_keys(pd.Series(run_ids, dtype="string")), lengths)
+
+
+def tile_positions(tile_ids: pd.Series, keys_index: pd.Index) -> np.ndarray:
+    """
+    Returns the positions, in an index of tile keys, of the tiles of a column of tile identifiers
+    (-1 for unknown tiles). The keys are only computed and looked up once per run of rows of the same tile.
+    """
+    run_ids, _, lengths = _tile_runs(tile_ids)
+    return np.repeat(keys_index.get_indexer(tile_keys(pd.Series(run_ids, dtype="string"))), lengths)
+
+
+@dataclass
+class ValidationReport:
+    """
+    Comparison of the totals per tile of a generated database with the (refined) FILO counts.
+    `discrepancies` lists the tiles whose totals differ (tile identifier, checked total, expected and actual values).
+    """
+
+    database: str
+    nb_tiles: int
+    nb_rows: int = 0
+    unknown_tile_rows: int = 0
+    discrepancies: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=["tile_id", "total", "expected", "actual"])
+    )
+
+    @property
+    def passed(self) -> bool:
+        return self.unknown_tile_rows == 0 and self.discrepancies.empty
+
+    def summary(self) -> str:
+        status = "PASSED" if self.passed else "FAILED"
+        lines = [f"{self.database}: {self.nb_rows} rows checked against {self.nb_tiles} FILO tiles: {status}"]
+        if self.unknown_tile_rows:
+            lines.append(f"  {self.unknown_tile_rows} rows of tiles missing from FILO")
+        for total, nb in self.discrepancies.groupby("total", sort=False).size().items():
+            lines.append(f"  {total}: {nb} tiles with discrepancies")
+        return "\n".join(lines)
+
+
+def _compare_totals(database: str, filo: pd.DataFrame, totals: dict[str, np.ndarray], nb_rows: int) -> ValidationReport:
+    """Builds the report of a database from its totals per tile (the last element being the unknown tiles)."""
+    report = ValidationReport(database, len(filo), nb_rows=nb_rows)
+    report.unknown_tile_rows = int(totals.pop("rows of unknown tiles")[-1])
+    discrepancies = []
+    for total, actual in totals.items():
+        expected = filo[total].to_numpy()
+        actual = actual[:-1]
+        differs = ~np.isclose(actual, expected, rtol=1e-6) if total == "ind_snv" else actual != expected
+        if differs.any():
+            discrepancies.append(
+                pd.DataFrame(
+                    {
+                        "tile_id": filo["tile_id"].to_numpy()[differs],
+                        "total": total,
+                        "expected": expected[differs],
+                        "actual": actual[differs],
+                    }
+                )
+            )
+    if discrepancies:
+        report.discrepancies = pd.concat(discrepancies, ignore_index=True)
+    logging.info(report.summary())
+    return report
+
+
+def validate_households(filo: pd.DataFrame, path: Path, chunk_size: int = 1_000_000) -> ValidationReport:
+    """
+    Checks that the households of each tile of a generated database sum back to the refined FILO counts
+    (`men`, `ind`, age classes and `ind_snv`), reading the database by chunks.
+
+    Args:
+        filo (pd.DataFrame): refined FILO database used by the generation (same seed)
+        path (Path): GeoParquet or GeoPackage households database (or folder of GeoParquet partitions)
+        chunk_size (int): number of rows read at once from a GeoPackage
+
+    Returns:
+        ValidationReport: discrepancies between the generated and FILO totals
+    """
+    keys_index = pd.Index(filo["tile_key"])
+    nb_tiles = len(filo)
+    totals = {c: np.zeros(nb_tiles + 1, dtype=np.int64) for c in ["men", "ind", *ALL_AGE_COLUMNS]}
+    totals["ind_snv"] = np.zeros(nb_tiles + 1)
+    nb_rows = 0
+    for chunk in read_columns(path, HOUSEHOLDS_VALIDATED_COLUMNS, chunk_size):
+        # Rows of unknown tiles are counted in an extra last position
+        positions = tile_positions(chunk["TILE_ID"], keys_index) % (nb_tiles + 1)
+        size = chunk["SIZE"].to_numpy()
+        totals["men"] += np.bincount(positions, minlength=nb_tiles + 1)
+        totals["ind"] += np.bincount(positions, weights=size, minlength=nb_tiles + 1).astype(np.int64)
+        for c in ALL_AGE_COLUMNS:
+            totals[c] += np.bincount(positions, weights=chunk[c], minlength=nb_tiles + 1).astype(np.int64)
+        totals["ind_snv"] += np.bincount(positions, weights=chunk["NIVEAU_VIE"] * size, minlength=nb_tiles + 1)
+        nb_rows += len(chunk)
+    totals["rows of unknown tiles"] = totals["men"].copy()
+    return _compare_totals(f"households ({path})", filo, totals, nb_rows)
+
+
+def validate_population(
+    filo: pd.DataFrame, path: Path, chunk_size: int = 1_000_000, chunks: Iterable[pd.DataFrame] | None = None
+) -> ValidationReport:
+    """
+    Checks that the individuals of each tile of a generated database sum back to the refined FILO counts
+    (`ind`, age classes and `ind_snv`), reading the database by chunks.
+
+    Args:
+        filo (pd.DataFrame): refined FILO database used by the generation (same seed)
+        path (Path): GeoParquet or GeoPackage population database (or folder of GeoParquet partitions)
+        chunk_size (int): number of rows read at once from a GeoPackage
+        chunks (Iterable[pd.DataFrame], optional): population batches checked instead of the database,
+            e.g. the individuals of the households database `path` expanded by `read_population`
+
+    Returns:
+        ValidationReport: discrepancies between the generated and FILO totals
+    """
+    keys_index = pd.Index(filo["tile_key"])
+    nb_tiles = len(filo)
+    nb_classes = len(ALL_AGE_COLUMNS)
+    ages = np.zeros((nb_tiles + 1) * nb_classes, dtype=np.int64)
+    income = np.zeros(nb_tiles + 1)
+    nb_rows = 0
+    database = f"population ({path})" if chunks is None else f"population (expanded from {path})"
+    if chunks is None:
+        chunks = read_columns(path, POPULATION_VALIDATED_COLUMNS, chunk_size)
+    for chunk in chunks:
+        positions = tile_positions(chunk["TILE_ID"], keys_index) % (nb_tiles + 1)
+        age_classes = pd.Categorical(chunk["AGE_CAT"], categories=ALL_AGE_COLUMNS).codes
+        ages += np.bincount(positions * nb_classes + age_classes, minlength=len(ages))
+        income += np.bincount(positions, weights=chunk["NIVEAU_VIE"], minlength=nb_tiles + 1)
+        nb_rows += len(chunk)
+    ages = ages.reshape(nb_tiles + 1, nb_classes)
+    totals = {"ind": ages.sum(axis=1), "rows of unknown tiles": ages.sum(axis=1)}
+    totals |= {c: ages[:, i] for i, c in enumerate(ALL_AGE_COLUMNS)}
+    totals["ind_snv"] = income
+    return _compare_totals(database, filo, totals, nb_rows)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import sys
+from argparse import ArgumentParser
+
+from popdbgen.lazy_imports import check_type_checking_imports
+
+if __name__ == "__main__":
+    argparser = ArgumentParser(
+        description="Checks that the lazy attributes of a package match the imports of its TYPE_CHECKING block"
+    )
+    argparser.add_argument(
+        "package",
+        nargs="?",
+        default="popdbgen",
+        help="""
+        package to check (default: popdbgen)
+        """,
+    )
+    args = argparser.parse_args()
+    differences = check_type_checking_imports(args.package)
+    for difference in differences:
+        print(difference, file=sys.stderr)
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import logging
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from popdbgen import (
+    DATA_DIR,
+    ENGINES,
+    compare_engines,
+    load_BAN,
+    load_raw_FILO,
+    synthetic_BAN,
+    synthetic_raw_FILO,
+    territory_code,
+)
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "engines",
+        nargs=2,
+        choices=list(ENGINES),
+        help="""
+        reference engine and engine to compare to it
+        """,
+    )
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territory",
+        type=str,
+        default="974",
+        help="""
+        territory to run on (METRO, 974, 972)
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "--synthetic",
+        dest="synthetic",
+        type=int,
+        default=None,
+        help="""
+        run on this number of synthetic tiles instead of the FILO and BAN files
+        """,
+    )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=0,
+        help="""
+        seed of the comparison
+        """,
+    )
+    argparser.add_argument(
+        "-b",
+        "--time-budget",
+        dest="timeBudget",
+        type=float,
+        default=60.0,
+        help="""
+        time budget of the comparison, in seconds
+        """,
+    )
+    argparser.add_argument(
+        "-a",
+        "--alpha",
+        dest="alpha",
+        type=float,
+        default=0.01,
+        help="""
+        level of the distributional tests
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="WARNING",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p", level=args.loglevel)
+
+    territory = territory_code(args.territory)
+    if args.synthetic:
+        raw_filo = synthetic_raw_FILO(args.synthetic, territory, seed=args.seed)
+        ban = synthetic_BAN(raw_filo, territory, seed=args.seed)
+    else:
+        dataDir = Path(args.datadir) if args.datadir else DATA_DIR
+        raw_filo = load_raw_FILO(territory, dataDir)
+        ban = load_BAN(territory, dataDir)
+    report = compare_engines(
+        ENGINES[args.engines[0]],
+        ENGINES[args.engines[1]],
+        raw_filo,
+        ban,
+        territory=territory,
+        seed=args.seed,
+        time_budget=args.timeBudget,
+        alpha=args.alpha,
+    )
+    print(report.summary())
+    sys.exit(0 if report.passed else 1)
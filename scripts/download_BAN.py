@@ -33,7 +33,7 @@ if __name__ == "__main__":
         default=False,
         action="store_true",
         help="""
-        overwrite data files if they exist
+        revalidate the data file against the server if it exists, and download it again if it changed
         """,
     )
     argparser.add_argument(
@@ -7,6 +7,16 @@ from popdbgen import DATA_DIR, download_extract_FILO
 
 if __name__ == "__main__":
     argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territories",
+        type=str,
+        action="append",
+        help="""
+        territory whose FILO file is extracted (METRO, 974, 972), can be repeated (all territories by default)
+        """,
+    )
     argparser.add_argument(
         "-d",
         "--datadir",
@@ -56,4 +66,8 @@ if __name__ == "__main__":
         level="DEBUG" if args.verbose else args.loglevel,
     )
     # Run main program
-    download_extract_FILO(dataDir=Path(args.datadir) if args.datadir else DATA_DIR, overwriteIfExists=args.overwrite)
+    download_extract_FILO(
+        dataDir=Path(args.datadir) if args.datadir else DATA_DIR,
+        overwriteIfExists=args.overwrite,
+        territories=args.territories,
+    )
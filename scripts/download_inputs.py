@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import get_args
+
+from popdbgen import DATA_DIR, TerritoryCode, download_inputs
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territories",
+        type=str,
+        action="append",
+        help="""
+        territory whose FILO and BAN files are downloaded (METRO, 974, 972), can be repeated (all by default)
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "-o",
+        "--overwrite",
+        dest="overwrite",
+        default=False,
+        action="store_true",
+        help="""
+        download the FILO again and revalidate the BAN files against the server
+        """,
+    )
+    argparser.add_argument(
+        "--no-filo",
+        dest="filo",
+        default=True,
+        action="store_false",
+        help="""
+        do not download the FILO
+        """,
+    )
+    argparser.add_argument(
+        "--no-ban",
+        dest="ban",
+        default=True,
+        action="store_false",
+        help="""
+        do not download the BAN
+        """,
+    )
+    argparser.add_argument(
+        "--max-per-host",
+        dest="maxPerHost",
+        type=int,
+        default=2,
+        help="""
+        maximum number of simultaneous downloads from a server (default: 2)
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="INFO",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p", level=args.loglevel)
+    download_inputs(
+        territories=args.territories or get_args(TerritoryCode),
+        dataDir=Path(args.datadir) if args.datadir else DATA_DIR,
+        overwriteIfExists=args.overwrite,
+        filo=args.filo,
+        ban=args.ban,
+        max_per_host=args.maxPerHost,
+    )
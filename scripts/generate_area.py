@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+
+from popdbgen import (
+    DATA_DIR,
+    BatchSink,
+    GeoJSONSeqSink,
+    GeoPackageSink,
+    GeoParquetSink,
+    generate_area,
+    save_households_metadata,
+    save_population_metadata,
+)
+
+SINKS = {
+    "gpkg": lambda path, layer: GeoPackageSink(path, layer=layer),
+    "parquet": lambda path, layer: GeoParquetSink(path),
+    "geojsons": lambda path, layer: GeoJSONSeqSink(path),
+}
+
+
+def read_polygon(polygon: str, crs: str) -> shapely.Geometry:
+    """
+    Reads the polygon of an area, either from a vector file (union of its features, projected in `crs`)
+    or as a WKT geometry (already in `crs`).
+    """
+    if Path(polygon).is_file():
+        return gpd.read_file(polygon).to_crs(crs).geometry.union_all()
+    return shapely.from_wkt(polygon)
+
+
+def generate_area_databases(
+    territory: str = "METRO",
+    dataDir: Path = DATA_DIR,
+    outputDir: Path | None = None,
+    outputFormat: str = "gpkg",
+    **kwargs,
+):
+    """
+    Generates the households and population databases of an area (see `generate_area`)
+    in the `area_<territory>` folder of the data directory by default.
+    """
+    outputDir = dataDir / f"area_{territory}" if outputDir is None else outputDir
+    outputDir.mkdir(parents=True, exist_ok=True)
+    households, population = generate_area(territory=territory, dataDir=dataDir, **kwargs)
+    for name, gdf in (("households", households), ("population", population)):
+        sink: BatchSink = SINKS[outputFormat](outputDir / f"{name}_{territory}.{outputFormat}", name)
+        sink.write(gdf)
+        sink.close()
+        logging.info(f"{len(gdf)} {name} rows saved: {sink.path}")
+    id_format = kwargs.get("id_format", "string")
+    save_households_metadata(outputDir / f"households_{territory}.yaml", len(households), id_format)
+    save_population_metadata(outputDir / f"population_{territory}.yaml", len(population), id_format)
+
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territory",
+        type=str,
+        default="METRO",
+        help="""
+        territory of the area (METRO, 974, 972)
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        type=str,
+        help="""
+        output directory (area_<territory> folder of the data directory by default)
+        """,
+    )
+    argparser.add_argument(
+        "--bbox",
+        dest="bbox",
+        type=lambda s: tuple(float(x) for x in s.split(",")),
+        help="""
+        bounding box of the area: xmin,ymin,xmax,ymax (in the CRS given by --crs)
+        """,
+    )
+    argparser.add_argument(
+        "--polygon",
+        dest="polygon",
+        type=str,
+        help="""
+        polygon of the area: a vector file (the union of its features is used) or a WKT geometry
+        (in the CRS given by --crs for WKT)
+        """,
+    )
+    argparser.add_argument(
+        "--tiles",
+        dest="tiles",
+        type=lambda s: [tile for tile in s.split(",") if tile],
+        help="""
+        comma-separated identifiers of the FILO tiles of the area
+        """,
+    )
+    argparser.add_argument(
+        "--crs",
+        dest="crs",
+        type=str,
+        default="EPSG:4326",
+        help="""
+        CRS of the bounding box or WKT polygon (default: EPSG:4326)
+        """,
+    )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=1703,
+        help="""
+        seed of the generation (the same seed as a national generation gives the same rows for the area)
+        """,
+    )
+    argparser.add_argument(
+        "--format",
+        dest="outputFormat",
+        choices=list(SINKS),
+        default="gpkg",
+        help="""
+        format of the generated databases (gpkg, parquet or geojsons)
+        """,
+    )
+    argparser.add_argument(
+        "--schema",
+        dest="schemaProfile",
+        choices=["default", "compact"],
+        default="default",
+        help="""
+        column types of the generated databases (see generate_database.py)
+        """,
+    )
+    argparser.add_argument(
+        "--ids",
+        dest="idFormat",
+        choices=["string", "integer"],
+        default="string",
+        help="""
+        identifiers of the generated households and individuals (see generate_database.py)
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="INFO",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p", level=args.loglevel)
+    if args.bbox is None and args.polygon is None and args.tiles is None:
+        argparser.error("an area is required: --bbox, --polygon and/or --tiles")
+    if args.bbox is not None and len(args.bbox) != 4:
+        argparser.error("--bbox expects xmin,ymin,xmax,ymax")
+    polygon = None if args.polygon is None else read_polygon(args.polygon, args.crs)
+
+    dataDir = Path(args.datadir) if args.datadir else DATA_DIR
+    generate_area_databases(
+        territory=args.territory,
+        dataDir=dataDir,
+        outputDir=Path(args.output) if args.output else None,
+        outputFormat=args.outputFormat,
+        bbox=args.bbox,
+        polygon=polygon,
+        tiles=args.tiles,
+        crs=args.crs,
+        seed=args.seed,
+        profile=args.schemaProfile,
+        id_format=args.idFormat,
+    )
@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 import logging
 from argparse import ArgumentParser, BooleanOptionalAction
+from functools import partial
 from pathlib import Path
 
+import geopandas as gpd
 import numpy as np
 import pandas as pd
 
 from popdbgen import (
     DATA_DIR,
+    ENGINES,
+    MANIFEST_FILENAME,
+    AddressIndex,
+    BatchSink,
+    FlatGeobufSink,
+    GeoJSONSeqSink,
+    GeoPackageSink,
+    GeoParquetSink,
+    IdFormat,
+    Instrumentation,
+    PopulationRecipe,
+    RunManifest,
+    SchemaProfile,
+    VectorTilesSink,
+    checkpoint_dir,
+    filo_crs,
+    generate_incremental,
+    get_batched_households_gdf,
     get_batched_households_population_gdf,
-    load_BAN,
-    load_FILO,
+    load_inputs,
+    load_inputs_checkpoint,
+    parse_memory_size,
+    recipe_path,
+    remove_inputs_checkpoint,
     save_households_metadata,
+    save_inputs_checkpoint,
     save_population_metadata,
+    stage,
 )
+from popdbgen.instrumentation import REFINE_FILO
 
 
 def generate_households_population_databases(
@@ -21,74 +47,302 @@ def generate_households_population_databases(
     dataDir: Path = DATA_DIR,
     seed: int = 1703,
     batchSize: int = 100_000,
+    memoryBudget: int | None = None,
+    schemaProfile: SchemaProfile = "default",
+    idFormat: IdFormat = "string",
+    engine: str = "legacy",
+    compactAddresses: bool = False,
     saveAsGeoPackage: bool = True,
     saveAsGeoParquet: bool = False,
+    saveAsGeoJSONSeq: bool = False,
+    saveAsFlatGeobuf: bool = False,
+    saveAsMBTiles: bool = False,
+    saveAsPMTiles: bool = False,
+    tilesWithFILO: bool = True,
+    householdsOnly: bool = False,
+    resume: bool = False,
+    incremental: bool = False,
+    instrumentation: Instrumentation | None = None,
+    outputDir: Path | None = None,
+    rawFILO: gpd.GeoDataFrame | None = None,
+    addresses: AddressIndex | None = None,
 ):
-    if not (saveAsGeoPackage or saveAsGeoParquet):
+    if incremental:
+        if householdsOnly:
+            logging.warning("Incremental runs always generate the population, --households-only is ignored")
+        generate_incremental_databases(
+            territory=territory, dataDir=dataDir, seed=seed, schemaProfile=schemaProfile, idFormat=idFormat
+        )
+        return
+
+    if not (
+        saveAsGeoPackage or saveAsGeoParquet or saveAsGeoJSONSeq or saveAsFlatGeobuf or saveAsMBTiles or saveAsPMTiles
+    ):
         logging.error("No export format was specified to save the generated database!")
         return
 
     np.random.seed(seed)
 
-    filo: pd.DataFrame = load_FILO(dataDir=dataDir, territory=territory)
-    ban: pd.DataFrame = load_BAN(dataDir=dataDir, territory=territory)
-
-    hho_gpkg_output_file = dataDir / f"households_{territory}.gpkg"
-    pop_gpkg_output_file = dataDir / f"population_{territory}.gpkg"
-    hho_parquet_output_file = dataDir / f"households_{territory}.parquet"
-    pop_parquet_output_file = dataDir / f"population_{territory}.parquet"
-
-    hho_metadata_output_file = dataDir / f"households_{territory}.yaml"
-    pop_metadata_output_file = dataDir / f"population_{territory}.yaml"
+    outputDir = dataDir if outputDir is None else outputDir
+    outputDir.mkdir(parents=True, exist_ok=True)
+    run_dir = checkpoint_dir(territory, outputDir)
+    manifest_file = run_dir / MANIFEST_FILENAME
+    manifest = RunManifest.load(manifest_file) if resume else None
+    if manifest is not None and (
+        manifest.seed != seed
+        or manifest.batch_size != batchSize
+        or manifest.profile != schemaProfile
+        or manifest.id_format != idFormat
+        or manifest.engine != engine
+        or manifest.compact_addresses != compactAddresses
+    ):
+        logging.warning(f"Run manifest {manifest_file} was produced with other parameters, starting over")
+        manifest = None
+    if manifest is not None and manifest.complete:
+        logging.info(f"Generation already completed according to {manifest_file}")
+        return
+    run_dir.mkdir(parents=True, exist_ok=True)
+    ban: pd.DataFrame | AddressIndex
+    if rawFILO is not None and addresses is not None:
+        # Inputs shared between replicates: only the refinement of the FILO counts depends on the seed
+        with stage(REFINE_FILO):
+            filo: pd.DataFrame = ENGINES[engine].refine(rawFILO, seed)
+        ban = addresses
+    else:
+        inputs = load_inputs_checkpoint(run_dir, filo_crs(territory)) if manifest is not None else None
+        if inputs is None:
+            # The FILO and the BAN are loaded in parallel, the addresses being indexed as soon as they are loaded
+            filo, ban = load_inputs(
+                territory=territory,
+                dataDir=dataDir,
+                seed=seed,
+                refine_function=ENGINES[engine].refine,
+                compact=compactAddresses,
+            )
+            if resume:
+                # Only saved when resuming is requested, so that a later resumed run does not reload and refine them
+                save_inputs_checkpoint(run_dir, filo, ban.addresses if isinstance(ban, AddressIndex) else ban)
+        else:
+            filo, ban = inputs
+    if manifest is not None and manifest.nb_tiles != len(filo):
+        logging.warning(f"Run manifest {manifest_file} was produced from other inputs, starting over")
+        manifest = None
 
+    hho_sinks: list[BatchSink] = []
+    pop_sinks: list[BatchSink] = []
     if saveAsGeoPackage:
-        logging.info(f"Exporting households to {hho_gpkg_output_file}")
-        logging.info(f"Exporting population to {pop_gpkg_output_file}")
+        hho_sinks.append(GeoPackageSink(outputDir / f"households_{territory}.gpkg", layer="households"))
+        pop_sinks.append(GeoPackageSink(outputDir / f"population_{territory}.gpkg", layer="population"))
     if saveAsGeoParquet:
-        logging.info(f"Exporting households to {hho_parquet_output_file}")
-        logging.info(f"Exporting population to {pop_parquet_output_file}")
+        hho_sinks.append(GeoParquetSink(outputDir / f"households_{territory}.parquet"))
+        pop_sinks.append(GeoParquetSink(outputDir / f"population_{territory}.parquet"))
+    if saveAsGeoJSONSeq:
+        hho_sinks.append(GeoJSONSeqSink(outputDir / f"households_{territory}.geojsons"))
+        pop_sinks.append(GeoJSONSeqSink(outputDir / f"population_{territory}.geojsons"))
+    if saveAsFlatGeobuf:
+        hho_sinks.append(FlatGeobufSink(outputDir / f"households_{territory}.fgb", layer="households"))
+        pop_sinks.append(FlatGeobufSink(outputDir / f"population_{territory}.fgb", layer="population"))
+    if saveAsMBTiles or saveAsPMTiles:
+        tiles_formats: list[str] = []
+        if saveAsMBTiles:
+            tiles_formats.append(".mbtiles")
+        if saveAsPMTiles:
+            tiles_formats.append(".pmtiles")
+        # Zoom levels used by the former tippecanoe pipeline: points are all displayed from zoom 15 (households)
+        # or 16 (population), and the densest are dropped below; FILO tiles are displayed from zoom 11
+        hho_sinks.append(
+            VectorTilesSink(
+                [outputDir / f"households_{territory}{fmt}" for fmt in tiles_formats],
+                layer="households",
+                filo=filo if tilesWithFILO else None,
+                max_zoom=15,
+            )
+        )
+        pop_sinks.append(
+            VectorTilesSink(
+                [outputDir / f"population_{territory}{fmt}" for fmt in tiles_formats],
+                layer="population",
+                filo=filo if tilesWithFILO else None,
+                max_zoom=16,
+            )
+        )
+
+    if householdsOnly:
+        # The individuals are not stored, but expanded on demand from the households with popdbgen.read_population
+        pop_sinks = []
+
+    hho_metadata_output_file = outputDir / f"households_{territory}.yaml"
+    pop_metadata_output_file = outputDir / f"population_{territory}.yaml"
+
+    sinks: dict[str, BatchSink] = {str(sink.path): sink for sink in hho_sinks + pop_sinks}
+    if resume and not all(sink.resumable for sink in sinks.values()):
+        # Such as the vector tiles, or GeoJSONSeq streams to named pipes
+        unresumable = ", ".join(name for name, sink in sinks.items() if not sink.resumable)
+        logging.error(f"--resume requires exports that can be resumed, not {unresumable}")
+        return
+    if manifest is not None:
+        if manifest.sinks.keys() != sinks.keys():
+            logging.warning("The requested exports cannot resume the interrupted run, starting over")
+            manifest = None
+        else:
+            logging.info(f"Resuming after {manifest.nb_households} households ({len(manifest.batches)} batches)")
+            for name, sink in sinks.items():
+                sink.resume(manifest.sinks[name])
+    if manifest is None:
+        manifest = RunManifest(
+            territory=territory,
+            seed=seed,
+            batch_size=batchSize,
+            nb_tiles=len(filo),
+            profile=schemaProfile,
+            id_format=idFormat,
+            engine=engine,
+            compact_addresses=compactAddresses,
+        )
+
+    for sink in hho_sinks:
+        logging.info(f"Exporting households to {sink.path}")
+    for sink in pop_sinks:
+        logging.info(f"Exporting population to {sink.path}")
 
     nb_households = int(filo.men.sum())
     nb_individuals = int(filo.ind.sum())
     logging.info(f"Number of households to process: {nb_households}")
     logging.info(f"Number of individuals to generate: {nb_individuals}")
 
+    # Batches are cut at tile boundaries, so there may be fewer batches than this estimate
     nb_batches = 1 + (nb_households - 1) // batchSize
 
-    batches = get_batched_households_population_gdf(batch_size=batchSize, territory=territory, filo_df=filo, ban_df=ban)
+    start_household = manifest.nb_households
+    generation_args = dict(
+        batch_size=batchSize,
+        territory=territory,
+        filo_df=filo,
+        ban_df=ban,
+        tile_households_generator=ENGINES[engine].tile_households_generator,
+        seed=seed,
+        start_household=start_household,
+        tile_aligned=True,
+        memory_budget=memoryBudget,
+        profile=schemaProfile,
+        id_format=idFormat,
+    )
+    batches = (
+        ((households, None) for households in get_batched_households_gdf(**generation_args))
+        if householdsOnly
+        else get_batched_households_population_gdf(**generation_args)
+    )
 
-    hh_first_batch, pop_first_batch = next(batches)
-    if saveAsGeoPackage:
-        hh_first_batch.to_file(hho_gpkg_output_file, layer="households", driver="GPKG", mode="w")
-        pop_first_batch.to_file(pop_gpkg_output_file, layer="population", driver="GPKG", mode="w")
-    if saveAsGeoParquet:
-        hh_first_batch.to_wkb().to_parquet(hho_parquet_output_file, engine="fastparquet")
-        pop_first_batch.to_wkb().to_parquet(pop_parquet_output_file, engine="fastparquet")
-    del hh_first_batch
-    del pop_first_batch
-
-    for batch_index, (households, population) in enumerate(batches):
-        logging.info(f"Processed batch: {batch_index+1} out of {nb_batches} ({float(batch_index+1)/nb_batches:.2%})")
-        if saveAsGeoPackage:
-            households.to_file(hho_gpkg_output_file, layer="households", driver="GPKG", mode="a")
-            population.to_file(pop_gpkg_output_file, layer="population", driver="GPKG", mode="a")
-        if saveAsGeoParquet:
-            households.to_wkb().to_parquet(hho_parquet_output_file, engine="fastparquet", append=True)
-            population.to_wkb().to_parquet(pop_parquet_output_file, engine="fastparquet", append=True)
+    for batch_index, (households, population) in enumerate(batches, len(manifest.batches)):
+        for sink in hho_sinks:
+            sink.write(households)
+        for sink in pop_sinks:
+            sink.write(population)
+        tile_batch = households.attrs["tile_batch"]
+        first_tile = tile_batch["first_tile"]
+        manifest.commit_batch(
+            first_tile,
+            first_tile + len(tile_batch["tile_keys"]) - 1,
+            len(households),
+            int(households["SIZE"].sum()) if population is None else len(population),
+        )
+        manifest.sinks = {name: sink.checkpoint() for name, sink in sinks.items()}
+        manifest.save(manifest_file)
+        progress = (
+            f"{manifest.nb_households / nb_households:.2%}"
+            if instrumentation is None
+            else instrumentation.progress(manifest.nb_households, nb_households, initial=start_household)
+        )
+        if memoryBudget is None:
+            logging.info(f"Processed batch: {batch_index + 1} out of {nb_batches} - {progress}")
+        else:
+            logging.info(f"Processed batch: {batch_index + 1} of {len(households)} households - {progress}")
         del households
         del population
+    for sink in hho_sinks + pop_sinks:
+        sink.close()
+    manifest.complete = True
+    manifest.save(manifest_file)
+    remove_inputs_checkpoint(run_dir)
     logging.info("All batches processed")
 
     logging.info("Saving metadata")
-    save_households_metadata(hho_metadata_output_file, nb_households)
-    save_population_metadata(pop_metadata_output_file, nb_individuals)
+    save_households_metadata(hho_metadata_output_file, nb_households, idFormat)
+    save_population_metadata(pop_metadata_output_file, nb_individuals, idFormat)
+    if householdsOnly and (saveAsGeoPackage or saveAsGeoParquet):
+        # Shared by the GeoPackage and GeoParquet households databases, from which the population can be read
+        recipe_file = recipe_path(outputDir / f"households_{territory}.gpkg")
+        PopulationRecipe(
+            territory=territory,
+            seed=seed,
+            profile=schemaProfile,
+            id_format=idFormat,
+            nb_households=nb_households,
+            nb_individuals=nb_individuals,
+        ).save(recipe_file)
+        logging.info(f"Population recipe saved: {recipe_file}")
 
-    if saveAsGeoPackage:
-        logging.info(f"Households database generated: {hho_gpkg_output_file}")
-        logging.info(f"Population database generated: {pop_gpkg_output_file}")
-    if saveAsGeoParquet:
-        logging.info(f"Households database generated: {hho_parquet_output_file}")
-        logging.info(f"Population database generated: {pop_parquet_output_file}")
+    for sink in hho_sinks:
+        logging.info(f"Households database generated: {sink.path}")
+    for sink in pop_sinks:
+        logging.info(f"Population database generated: {sink.path}")
+
+
+def generate_replicates(
+    territory: str = "METRO",
+    dataDir: Path = DATA_DIR,
+    seed: int = 1703,
+    replicates: int = 1,
+    compactAddresses: bool = False,
+    **kwargs,
+):
+    """
+    Generates `replicates` databases with the seeds `seed`, `seed + 1`, ..., in the `replicates_<territory>/seed_<seed>`
+    folders of `dataDir` (see `generate_households_population_databases` for the other arguments).
+    The FILO and BAN data are loaded (in parallel) and the addresses are indexed once for all the replicates.
+    """
+    rawFILO, addresses = load_inputs(territory=territory, dataDir=dataDir, refine=False, compact=compactAddresses)
+    for k in range(replicates):
+        logging.info(f"Generating replicate {k + 1} out of {replicates} (seed {seed + k})...")
+        generate_households_population_databases(
+            territory=territory,
+            dataDir=dataDir,
+            seed=seed + k,
+            outputDir=dataDir / f"replicates_{territory}" / f"seed_{seed + k}",
+            rawFILO=rawFILO,
+            addresses=addresses,
+            compactAddresses=compactAddresses,
+            **kwargs,
+        )
+
+
+def generate_incremental_databases(
+    territory: str = "METRO",
+    dataDir: Path = DATA_DIR,
+    seed: int = 1703,
+    schemaProfile: SchemaProfile = "default",
+    idFormat: IdFormat = "string",
+):
+    """
+    Updates the tile-partitioned databases of `dataDir/database_<territory>`, only regenerating
+    the tiles whose FILO counts or addresses changed since the previous run.
+    """
+    filo, ban = load_inputs(territory=territory, dataDir=dataDir, seed=seed, index_addresses=False)
+    outputDir = dataDir / f"database_{territory}"
+    manifest = generate_incremental(
+        territory=territory,
+        filo=filo,
+        ban=ban,
+        outputDir=outputDir,
+        seed=seed,
+        profile=schemaProfile,
+        id_format=idFormat,
+    )
+
+    logging.info("Saving metadata")
+    save_households_metadata(outputDir / "households.yaml", manifest.nb_households, idFormat)
+    save_population_metadata(outputDir / "population.yaml", manifest.nb_individuals, idFormat)
+    logging.info(f"Households and population databases updated: {outputDir}")
 
 
 if __name__ == "__main__":
@@ -112,6 +366,16 @@ if __name__ == "__main__":
         path to the data directory
         """,
     )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=1703,
+        help="""
+        seed of the generation (the replicates use the seeds seed, seed + 1, ...)
+        """,
+    )
     argparser.add_argument(
         "-b",
         "--batchsize",
@@ -122,6 +386,37 @@ if __name__ == "__main__":
         batch size for large database processing (default: 100_000)
         """,
     )
+    argparser.add_argument(
+        "-m",
+        "--memory-budget",
+        dest="memoryBudget",
+        type=parse_memory_size,
+        default=None,
+        help="""
+        memory budget of the generation (e.g. 8G, 512M): batch sizes are then adapted to keep the memory usage
+        under the budget, the batch size option only giving the size of the first batch
+        """,
+    )
+    argparser.add_argument(
+        "--schema",
+        dest="schemaProfile",
+        choices=["default", "compact"],
+        default="default",
+        help="""
+        column types of the generated databases: "compact" uses small integer types, categorical strings
+        and single precision incomes, reducing the memory used and the size of the GeoParquet outputs
+        """,
+    )
+    argparser.add_argument(
+        "--ids",
+        dest="idFormat",
+        choices=["string", "integer"],
+        default="string",
+        help="""
+        identifiers of the generated households and individuals: "string" (default, e.g. "<TILE_ID>_3_2")
+        or "integer", packing the tile key and the ranks of the household and of the individual in 64 bits
+        """,
+    )
     argparser.add_argument(
         "--geopackage",
         dest="saveAsGeoPackage",
@@ -142,6 +437,138 @@ if __name__ == "__main__":
         export generated database as a geoparquet file (--geoparquet) or not (--no-geoparquet, default)
         """,
     )
+    argparser.add_argument(
+        "--geojsonseq",
+        dest="saveAsGeoJSONSeq",
+        type=bool,
+        default=False,
+        action=BooleanOptionalAction,
+        help="""
+        stream generated database as newline-delimited GeoJSON (.geojsons) files, e.g. to feed tippecanoe
+        directly (the output files may be named pipes created beforehand with mkfifo)
+        """,
+    )
+    argparser.add_argument(
+        "--flatgeobuf",
+        dest="saveAsFlatGeobuf",
+        type=bool,
+        default=False,
+        action=BooleanOptionalAction,
+        help="""
+        export generated database as an indexed FlatGeobuf file (--flatgeobuf) or not (--no-flatgeobuf, default)
+        """,
+    )
+    argparser.add_argument(
+        "--mbtiles",
+        dest="saveAsMBTiles",
+        type=bool,
+        default=False,
+        action=BooleanOptionalAction,
+        help="""
+        export generated database as vector tiles in a mbtiles file (--mbtiles) or not (--no-mbtiles, default)
+        """,
+    )
+    argparser.add_argument(
+        "--pmtiles",
+        dest="saveAsPMTiles",
+        type=bool,
+        default=False,
+        action=BooleanOptionalAction,
+        help="""
+        export generated database as vector tiles in a pmtiles file (--pmtiles) or not (--no-pmtiles, default)
+        """,
+    )
+    argparser.add_argument(
+        "--tiles-filo",
+        dest="tilesWithFILO",
+        type=bool,
+        default=True,
+        action=BooleanOptionalAction,
+        help="""
+        pack FILO tiles as a "filo" layer of the generated vector tiles (--tiles-filo, default) or not (--no-tiles-filo)
+        """,
+    )
+    argparser.add_argument(
+        "--households-only",
+        dest="householdsOnly",
+        default=False,
+        action="store_true",
+        help="""
+        only store the households, along with the parameters needed to expand their individuals
+        on demand (e.g. with popdbgen.read_population) in a households_<territory>.population.json file
+        """,
+    )
+    argparser.add_argument(
+        "--engine",
+        dest="engine",
+        choices=list(ENGINES),
+        default="legacy",
+        help="""
+        implementation of the generation steps: legacy (default) or numba (compiled kernels, see popdbgen.jit,
+        statistically equivalent to legacy but drawing other numbers)
+        """,
+    )
+    argparser.add_argument(
+        "--compact-addresses",
+        dest="compactAddresses",
+        default=False,
+        action="store_true",
+        help="""
+        collapse the addresses sharing the same coordinates into single points, drawn proportionally
+        to their number of addresses (same distribution as without compaction, from a smaller index)
+        """,
+    )
+    argparser.add_argument(
+        "--resume",
+        dest="resume",
+        default=False,
+        action="store_true",
+        help="""
+        resume an interrupted generation from its last checkpoint (requires resumable exports:
+        geopackage, geoparquet or geojsonseq files); the refined FILO and the BAN are then saved as well,
+        so that resuming again does not reload them
+        """,
+    )
+    argparser.add_argument(
+        "--incremental",
+        dest="incremental",
+        default=False,
+        action="store_true",
+        help="""
+        update tile-partitioned geoparquet databases (in the database_<territory> folder), only regenerating
+        the tiles whose inputs changed since the previous incremental run
+        """,
+    )
+    argparser.add_argument(
+        "-r",
+        "--replicates",
+        dest="replicates",
+        type=int,
+        default=1,
+        help="""
+        number of databases to generate with successive seeds (in the replicates_<territory>/seed_<seed> folders
+        of the data directory), loading the FILO and BAN data and indexing the addresses only once
+        """,
+    )
+    argparser.add_argument(
+        "--profile",
+        dest="profileStage",
+        type=str,
+        default=None,
+        help="""
+        profile a stage of the generation (e.g. "households generation", "population expansion", "refine_FILO"),
+        the profile being saved in the data directory
+        """,
+    )
+    argparser.add_argument(
+        "--profiler",
+        dest="profiler",
+        choices=["cprofile", "pyinstrument"],
+        default="cprofile",
+        help="""
+        profiler used by --profile: cprofile (default, saves a .prof file) or pyinstrument (saves an HTML report)
+        """,
+    )
     argparser.add_argument(
         "-v",
         "--verbose",
@@ -165,6 +592,12 @@ if __name__ == "__main__":
     )
     # Parse arguments
     args = argparser.parse_args()
+    if args.replicates > 1 and args.incremental:
+        argparser.error("--replicates cannot be used with --incremental")
+    if args.engine != "legacy" and args.incremental:
+        argparser.error("--engine cannot be used with --incremental")
+    if args.compactAddresses and args.incremental:
+        argparser.error("--compact-addresses cannot be used with --incremental")
     # Setup logging level base on -v and -l flags
     logging.basicConfig(
         format="%(asctime)s %(message)s",
@@ -176,10 +609,38 @@ if __name__ == "__main__":
     # Run main loop
     for territory in territories:
         logging.info(f"Running generation on territory: {territory}...")
-        generate_households_population_databases(
-            territory=territory,
-            dataDir=Path(args.datadir) if args.datadir else DATA_DIR,
-            batchSize=args.batchSize,
-            saveAsGeoPackage=args.saveAsGeoPackage,
-            saveAsGeoParquet=args.saveAsGeoParquet,
-        )
+        dataDir = Path(args.datadir) if args.datadir else DATA_DIR
+        profile_suffix = "html" if args.profiler == "pyinstrument" else "prof"
+        with Instrumentation(
+            profile_stage=args.profileStage,
+            profiler=args.profiler,
+            profile_output=dataDir / f"profile_{territory}.{profile_suffix}",
+        ) as instrumentation:
+            generate = (
+                partial(generate_replicates, replicates=args.replicates)
+                if args.replicates > 1
+                else generate_households_population_databases
+            )
+            generate(
+                territory=territory,
+                dataDir=dataDir,
+                seed=args.seed,
+                batchSize=args.batchSize,
+                memoryBudget=args.memoryBudget,
+                schemaProfile=args.schemaProfile,
+                idFormat=args.idFormat,
+                engine=args.engine,
+                compactAddresses=args.compactAddresses,
+                saveAsGeoPackage=args.saveAsGeoPackage,
+                saveAsGeoParquet=args.saveAsGeoParquet,
+                saveAsGeoJSONSeq=args.saveAsGeoJSONSeq,
+                saveAsFlatGeobuf=args.saveAsFlatGeobuf,
+                saveAsMBTiles=args.saveAsMBTiles,
+                saveAsPMTiles=args.saveAsPMTiles,
+                tilesWithFILO=args.tilesWithFILO,
+                householdsOnly=args.householdsOnly,
+                resume=args.resume,
+                incremental=args.incremental,
+                instrumentation=instrumentation,
+            )
+        instrumentation.save_report(dataDir / f"run_report_{territory}.json", territory=territory)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+
+from popdbgen import DATA_DIR, write_synthetic_inputs
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territory",
+        type=str,
+        default="METRO",
+        help="""
+        territory whose file names and CRS are used (METRO, 974, 972)
+        """,
+    )
+    argparser.add_argument(
+        "-n",
+        "--nb-tiles",
+        dest="nbTiles",
+        type=int,
+        default=100_000,
+        help="""
+        number of FILO tiles
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=0,
+        help="""
+        seed of the generation
+        """,
+    )
+    argparser.add_argument(
+        "--mean-individuals",
+        dest="meanIndividuals",
+        type=float,
+        default=30.0,
+        help="""
+        average number of individuals per tile
+        """,
+    )
+    argparser.add_argument(
+        "--density-sigma",
+        dest="densitySigma",
+        type=float,
+        default=1.2,
+        help="""
+        dispersion of the (lognormal) distribution of the number of individuals per tile
+        """,
+    )
+    argparser.add_argument(
+        "--grid-fill",
+        dest="gridFill",
+        type=float,
+        default=0.5,
+        help="""
+        share of the 200m cells of the covered area that are populated tiles
+        """,
+    )
+    argparser.add_argument(
+        "--addresses-per-household",
+        dest="addressesPerHousehold",
+        type=float,
+        default=0.6,
+        help="""
+        average number of addresses per household
+        """,
+    )
+    argparser.add_argument(
+        "--empty-share",
+        dest="emptyShare",
+        type=float,
+        default=0.1,
+        help="""
+        share of the tiles without any address
+        """,
+    )
+    argparser.add_argument(
+        "--outside-share",
+        dest="outsideShare",
+        type=float,
+        default=0.02,
+        help="""
+        share of the addresses located in cells without FILO tile
+        """,
+    )
+    argparser.add_argument(
+        "--chunk-size",
+        dest="chunkSize",
+        type=int,
+        default=1_000_000,
+        help="""
+        number of tiles generated and written at once
+        """,
+    )
+    argparser.add_argument(
+        "-o",
+        "--overwrite",
+        dest="overwrite",
+        default=False,
+        action="store_true",
+        help="""
+        overwrite data files if they exist
+        """,
+    )
+    argparser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        default=False,
+        action="store_true",
+        help="""
+        set logging level to DEBUG
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="INFO",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    # Setup logging level base on -v and -l flags
+    logging.basicConfig(
+        format="%(asctime)s %(message)s",
+        datefmt="%Y-%m-%d %I:%M:%S %p",
+        level="DEBUG" if args.verbose else args.loglevel,
+    )
+    # Run main program
+    write_synthetic_inputs(
+        args.nbTiles,
+        territory=args.territory,
+        dataDir=Path(args.datadir) if args.datadir else DATA_DIR,
+        seed=args.seed,
+        mean_individuals=args.meanIndividuals,
+        density_sigma=args.densitySigma,
+        grid_fill=args.gridFill,
+        addresses_per_household=args.addressesPerHousehold,
+        empty_share=args.emptyShare,
+        outside_share=args.outsideShare,
+        chunk_size=args.chunkSize,
+        overwriteIfExists=args.overwrite,
+    )
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+
+from popdbgen import DATA_DIR, SyntheticTiles, parse_memory_size, serve
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territory",
+        type=str,
+        default="METRO",
+        help="""
+        territory to serve (METRO, 974, 972)
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=1703,
+        help="""
+        seed of the generation (the served tiles are identical to the ones of a national generation with this seed)
+        """,
+    )
+    argparser.add_argument(
+        "--host",
+        dest="host",
+        type=str,
+        default="127.0.0.1",
+        help="""
+        address on which the server listens (default: 127.0.0.1)
+        """,
+    )
+    argparser.add_argument(
+        "-p",
+        "--port",
+        dest="port",
+        type=int,
+        default=8000,
+        help="""
+        port on which the server listens (default: 8000)
+        """,
+    )
+    argparser.add_argument(
+        "--cache-size",
+        dest="cacheSize",
+        type=parse_memory_size,
+        default="256M",
+        help="""
+        maximum memory used by the cache of generated tiles, e.g. 256M (default) or 2G
+        """,
+    )
+    argparser.add_argument(
+        "--max-tiles",
+        dest="maxTiles",
+        type=int,
+        default=10_000,
+        help="""
+        maximum number of FILO tiles generated for a single request
+        """,
+    )
+    argparser.add_argument(
+        "--min-zoom",
+        dest="minZoom",
+        type=int,
+        default=12,
+        help="""
+        lowest zoom level of the served vector tiles (tiles of lower zoom levels are empty)
+        """,
+    )
+    argparser.add_argument(
+        "--schema",
+        dest="schemaProfile",
+        choices=["default", "compact"],
+        default="default",
+        help="""
+        column types of the generated data (see generate_database.py)
+        """,
+    )
+    argparser.add_argument(
+        "--ids",
+        dest="idFormat",
+        choices=["string", "integer"],
+        default="string",
+        help="""
+        identifiers of the generated households and individuals (see generate_database.py)
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="INFO",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p", level=args.loglevel)
+
+    service = SyntheticTiles(
+        territory=args.territory,
+        dataDir=Path(args.datadir) if args.datadir else DATA_DIR,
+        seed=args.seed,
+        profile=args.schemaProfile,
+        id_format=args.idFormat,
+        cache_size=args.cacheSize,
+        max_tiles=args.maxTiles,
+    )
+    serve(service, host=args.host, port=args.port, min_zoom=args.minZoom)
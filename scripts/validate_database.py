@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import logging
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+
+from popdbgen import (
+    DATA_DIR,
+    ENGINES,
+    load_FILO,
+    read_population,
+    recipe_path,
+    validate_households,
+    validate_population,
+)
+
+
+def default_database(dataDir: Path, name: str, territory: str) -> Path:
+    """GeoParquet, GeoPackage or incremental (partitioned) database generated by `generate_database.py`."""
+    candidates = [
+        dataDir / f"{name}_{territory}.parquet",
+        dataDir / f"{name}_{territory}.gpkg",
+        dataDir / f"database_{territory}" / name,
+    ]
+    return next((path for path in candidates if path.exists()), candidates[0])
+
+
+if __name__ == "__main__":
+    argparser = ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--territory",
+        dest="territory",
+        type=str,
+        default="METRO",
+        help="""
+        territory to run on (METRO, 974, 972)
+        """,
+    )
+    argparser.add_argument(
+        "-d",
+        "--datadir",
+        dest="datadir",
+        type=str,
+        help="""
+        path to the data directory
+        """,
+    )
+    argparser.add_argument(
+        "-s",
+        "--seed",
+        dest="seed",
+        type=int,
+        default=1703,
+        help="""
+        seed of the generation (used to refine the FILO counts the same way)
+        """,
+    )
+    argparser.add_argument(
+        "--engine",
+        dest="engine",
+        choices=list(ENGINES),
+        default="legacy",
+        help="""
+        engine of the generation (used to refine the FILO counts the same way)
+        """,
+    )
+    argparser.add_argument(
+        "--households",
+        dest="households",
+        type=str,
+        help="""
+        path to the households database (GeoParquet, GeoPackage or folder of GeoParquet partitions),
+        found in the data directory by default
+        """,
+    )
+    argparser.add_argument(
+        "--population",
+        dest="population",
+        type=str,
+        help="""
+        path to the population database (GeoParquet, GeoPackage or folder of GeoParquet partitions),
+        found in the data directory by default
+        """,
+    )
+    argparser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        type=str,
+        help="""
+        CSV file in which the discrepancies are saved
+        """,
+    )
+    argparser.add_argument(
+        "-l",
+        "--log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        dest="loglevel",
+        default="INFO",
+        type=str.upper,
+        help="""
+        set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        """,
+    )
+    # Parse arguments
+    args = argparser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %I:%M:%S %p", level=args.loglevel)
+
+    dataDir = Path(args.datadir) if args.datadir else DATA_DIR
+    households = Path(args.households) if args.households else default_database(dataDir, "households", args.territory)
+    population = Path(args.population) if args.population else default_database(dataDir, "population", args.territory)
+    filo = load_FILO(
+        territory=args.territory, dataDir=dataDir, seed=args.seed, refine_function=ENGINES[args.engine].refine
+    )
+    reports = [validate_households(filo, households)]
+    if population.exists():
+        reports.append(validate_population(filo, population))
+    elif recipe_path(households).exists():
+        # Households only database: its individuals are expanded again from the population recipe
+        logging.info(f"No population database {population}, expanding it from {recipe_path(households)}")
+        reports.append(validate_population(filo, households, chunks=read_population(households)))
+    else:
+        logging.warning(
+            f"Population not validated: no population database {population}"
+            f" nor population recipe {recipe_path(households)}"
+        )
+    if args.output:
+        pd.concat([report.discrepancies.assign(database=report.database) for report in reports]).to_csv(
+            args.output, index=False
+        )
+        logging.info(f"Discrepancies saved to {args.output}")
+    sys.exit(0 if all(report.passed for report in reports) else 1)
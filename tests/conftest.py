@@ -0,0 +1,13 @@
+from pathlib import Path
+
+import pytest
+
+from popdbgen.synthetic import write_synthetic_inputs
+
+
+@pytest.fixture(scope="session")
+def synthetic_dir(tmp_path_factory) -> Path:
+    """Data folder with small synthetic FILO and BAN files of La Réunion (see `write_synthetic_inputs`)."""
+    dataDir = tmp_path_factory.mktemp("data")
+    write_synthetic_inputs(400, "974", dataDir, seed=0)
+    return dataDir
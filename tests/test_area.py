@@ -0,0 +1,64 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from popdbgen import generate_area, get_households_population_gdf, load_BAN, load_FILO
+from popdbgen.area import area_mask
+from popdbgen.utils import filo_crs
+
+SEED = 1703
+
+
+@pytest.fixture(scope="module", params=["string", "integer"])
+def national(request, synthetic_dir):
+    """Households and population of a generation of the whole territory."""
+    filo = load_FILO("974", synthetic_dir, seed=SEED)
+    ban = load_BAN("974", synthetic_dir)
+    households, population = get_households_population_gdf(
+        "974", filo_df=filo, ban_df=ban, seed=SEED, id_format=request.param
+    )
+    return request.param, filo, households, population
+
+
+def national_rows(gdf: gpd.GeoDataFrame, tile_ids) -> gpd.GeoDataFrame:
+    return gdf[gdf["TILE_ID"].isin(list(tile_ids))].reset_index(drop=True)
+
+
+def test_area_of_tiles(synthetic_dir, national):
+    id_format, filo, households, population = national
+    # Tiles scattered over the territory, some of them without households
+    tiles = filo["tile_id"].iloc[::37].tolist()
+    area_households, area_population = generate_area(
+        "974", tiles=tiles, dataDir=synthetic_dir, seed=SEED, id_format=id_format
+    )
+    assert set(area_households["TILE_ID"]) == set(filo.loc[filo["tile_id"].isin(tiles) & (filo["men"] > 0), "tile_id"])
+    pd.testing.assert_frame_equal(area_households, national_rows(households, tiles))
+    pd.testing.assert_frame_equal(area_population, national_rows(population, tiles))
+
+
+def test_area_of_bbox(synthetic_dir, national):
+    id_format, filo, households, population = national
+    # Bounding box (in WGS 84) of a few FILO tiles, shrunk so that it does not touch their neighbours
+    selected = filo.iloc[50:60]
+    xmin, ymin, xmax, ymax = selected.total_bounds + np.array([1, 1, -1, -1])
+    bbox = gpd.GeoSeries([shapely.box(xmin, ymin, xmax, ymax)], crs=filo_crs("974")).to_crs("EPSG:4326").total_bounds
+    area_households, area_population = generate_area(
+        "974", bbox=tuple(bbox), dataDir=synthetic_dir, seed=SEED, id_format=id_format
+    )
+    tiles = filo.loc[filo.intersects(area_mask("974", bbox=tuple(bbox))), "tile_id"]
+    assert set(selected["tile_id"]) <= set(tiles)
+    pd.testing.assert_frame_equal(area_households, national_rows(households, tiles))
+    pd.testing.assert_frame_equal(area_population, national_rows(population, tiles))
+
+
+def test_empty_area(synthetic_dir, national):
+    id_format, _, households, population = national
+    area_households, area_population = generate_area(
+        "974", bbox=(0.0, 0.0, 0.1, 0.1), dataDir=synthetic_dir, seed=SEED, id_format=id_format
+    )
+    assert area_households.empty
+    assert area_population.empty
+    assert dict(area_households.dtypes) == dict(households.dtypes)
+    assert dict(area_population.dtypes) == dict(population.dtypes)
@@ -0,0 +1,239 @@
+import gzip
+import hashlib
+import io
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import py7zr
+import pytest
+
+from popdbgen.download_filo import download_extract_FILO, get_FILO_filename
+from popdbgen.downloads import (
+    DOWNLOADS_MANIFEST_FILENAME,
+    PART_SUFFIX,
+    check_file,
+    download_file,
+    read_downloads_manifest,
+)
+
+
+class FileServer(ThreadingHTTPServer):
+    """
+    Local stand-in of the download servers: serves in-memory files with an ETag, Range and If-Range requests,
+    and conditional requests (If-None-Match). It records the headers of the requests, and can cut
+    the responses after `interrupt_after` bytes or compress them when the client accepts gzip.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.files: dict[str, bytes] = {}
+        self.requests: list[dict[str, str]] = []
+        self.interrupt_after: int | None = None
+        self.compress = False
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server_port}/{name}"
+
+    def serve(self, name: str, content: bytes) -> str:
+        self.files[name] = content
+        return self.url(name)
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    server: FileServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        content = self.server.files.get(self.path.lstrip("/"))
+        if content is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        status, start = 200, 0
+        if self.headers.get("Range", "").startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = int(self.headers["Range"].removeprefix("bytes=").rstrip("-"))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+        body = content[start:]
+        compress = self.server.compress and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if self.server.interrupt_after is not None:
+            # The connection is closed before the end of the body
+            self.wfile.write(body[: self.server.interrupt_after])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def random_bytes(size: int, seed: int = 0) -> bytes:
+    return bytes((seed + i * 7919 + (i >> 8) * 31) % 251 for i in range(size))
+
+
+def test_download_file(server, tmp_path):
+    content = random_bytes(300_000)
+    url = server.serve("data.bin", content)
+    path = download_file(url, tmp_path / "data.bin")
+    assert path.read_bytes() == content
+    entry = read_downloads_manifest(tmp_path)["data.bin"]
+    assert entry["url"] == url
+    assert entry["size"] == len(content)
+    assert entry["sha256"] == hashlib.sha256(content).hexdigest()
+    assert "etag" in entry
+    assert not (tmp_path / ("data.bin" + PART_SUFFIX)).exists()
+    # Already downloaded: no request
+    download_file(url, path)
+    assert len(server.requests) == 1
+    # Revalidated: not modified
+    download_file(url, path, refresh=True)
+    assert server.requests[-1]["If-None-Match"] == entry["etag"]
+    assert path.read_bytes() == content
+    # Corrupted: downloaded again
+    path.write_bytes(content[:-1] + b"\0")
+    download_file(url, path)
+    assert len(server.requests) == 3
+    assert path.read_bytes() == content
+
+
+def test_download_file_resumes(server, tmp_path):
+    content = random_bytes(500_000)
+    url = server.serve("data.bin", content)
+    server.interrupt_after = 200_000
+    with pytest.raises(ConnectionError):
+        download_file(url, tmp_path / "data.bin")
+    part_path = tmp_path / ("data.bin" + PART_SUFFIX)
+    assert not (tmp_path / "data.bin").exists()
+    assert part_path.stat().st_size == 200_000
+
+    server.interrupt_after = None
+    progress = []
+    path = download_file(url, tmp_path / "data.bin", progress=lambda size, total: progress.append((size, total)))
+    assert server.requests[-1]["Range"] == "bytes=200000-"
+    assert path.read_bytes() == content
+    assert progress[0][0] > 200_000
+    assert progress[-1] == (len(content), len(content))
+    assert not part_path.exists()
+    assert check_file(path)
+
+
+def test_download_file_restarts_when_modified(server, tmp_path):
+    url = server.serve("data.bin", random_bytes(500_000))
+    server.interrupt_after = 200_000
+    with pytest.raises(ConnectionError):
+        download_file(url, tmp_path / "data.bin")
+    # The file changed on the server: the partial download is not a prefix of it anymore
+    server.interrupt_after = None
+    content = server.files["data.bin"] = random_bytes(400_000, seed=1)
+    path = download_file(url, tmp_path / "data.bin")
+    assert "If-Range" in server.requests[-1]
+    assert path.read_bytes() == content
+    assert read_downloads_manifest(tmp_path)["data.bin"]["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_download_file_checksum(server, tmp_path):
+    url = server.serve("data.bin", random_bytes(1000))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        download_file(url, tmp_path / "data.bin", sha256="0" * 64)
+    assert not (tmp_path / "data.bin").exists()
+    assert not (tmp_path / ("data.bin" + PART_SUFFIX)).exists()
+    assert "data.bin" not in read_downloads_manifest(tmp_path)
+
+
+def test_download_file_not_found(server, tmp_path):
+    with pytest.raises(ConnectionError):
+        download_file(server.url("missing.bin"), tmp_path / "missing.bin")
+
+
+def test_download_file_without_content_encoding(server, tmp_path):
+    # A server compressing on the fly: the file must not be stored compressed
+    server.compress = True
+    content = b"x;y\n" * 10_000
+    path = download_file(server.serve("data.csv", content), tmp_path / "data.csv")
+    assert server.requests[-1]["Accept-Encoding"] == "identity"
+    assert path.read_bytes() == content
+
+
+def FILO_archive(files: dict[str, bytes], tmp_path: Path) -> bytes:
+    """A zip file containing a 7z archive of the FILO GeoPackage files, like the INSEE one."""
+    seven_zip_path = tmp_path / "archive.7z"
+    with py7zr.SevenZipFile(seven_zip_path, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(content, f"Filosofi2019_carreaux_200m_gpkg/{name}")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("Filosofi2019_carreaux_200m_gpkg.7z", seven_zip_path.read_bytes())
+        archive.writestr("README.txt", b"FILO 2019")
+    seven_zip_path.unlink()
+    return buffer.getvalue()
+
+
+def test_download_extract_FILO(server, tmp_path):
+    files = {
+        "carreaux_200m_met.gpkg": random_bytes(50_000, seed=1),
+        "carreaux_200m_reun.gpkg": random_bytes(20_000, seed=2),
+        "carreaux_200m_mart.gpkg": random_bytes(10_000, seed=3),
+    }
+    url = server.serve("filo.zip", FILO_archive(files, tmp_path))
+    dataDir = tmp_path / "data"
+    download_extract_FILO(dataDir, territories=["974", 972], url=url)
+    # Neither the archives nor the other territories are left behind
+    assert sorted(path.name for path in dataDir.iterdir()) == [
+        "carreaux_200m_mart.gpkg",
+        "carreaux_200m_reun.gpkg",
+        DOWNLOADS_MANIFEST_FILENAME,
+    ]
+    for territory in ("974", "972"):
+        path = get_FILO_filename(territory, dataDir)
+        assert path.read_bytes() == files[path.name]
+        assert read_downloads_manifest(dataDir)[path.name]["url"] == url
+    # Already extracted: no request
+    download_extract_FILO(dataDir, territories=["974"], url=url)
+    assert len(server.requests) == 1
+    # Corrupted: extracted again
+    get_FILO_filename("974", dataDir).write_bytes(b"corrupted")
+    download_extract_FILO(dataDir, territories=["974"], url=url)
+    assert len(server.requests) == 2
+    assert get_FILO_filename("974", dataDir).read_bytes() == files["carreaux_200m_reun.gpkg"]
+
+
+def test_download_extract_FILO_missing_territory(server, tmp_path):
+    url = server.serve("filo.zip", FILO_archive({"carreaux_200m_met.gpkg": b"metro"}, tmp_path))
+    with pytest.raises(FileNotFoundError, match="carreaux_200m_reun.gpkg"):
+        download_extract_FILO(tmp_path / "data", territories=["974"], url=url)
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+from popdbgen import GeoJSONSeqSink, checkpoint_dir
+from scripts.generate_database import generate_households_population_databases
+
+SEED = 1703
+
+
+class Interrupted(Exception):
+    pass
+
+
+def generate(dataDir: Path, outputDir: Path, **options) -> None:
+    generate_households_population_databases(
+        territory="974",
+        dataDir=dataDir,
+        outputDir=outputDir,
+        seed=SEED,
+        batchSize=1500,
+        saveAsGeoPackage=True,
+        saveAsGeoParquet=True,
+        saveAsGeoJSONSeq=True,
+        **options,
+    )
+
+
+def outputs(folder: Path) -> list[str]:
+    return sorted(path.name for path in folder.iterdir() if path.is_file())
+
+
+@pytest.mark.parametrize("interrupted_batch", [1, 4])
+def test_resumed_run_is_identical(synthetic_dir, tmp_path, monkeypatch, interrupted_batch):
+    generate(synthetic_dir, tmp_path / "full")
+
+    # The run is interrupted while writing a batch of households in GeoJSONSeq,
+    # after it was written in the GeoPackage and GeoParquet outputs
+    write = GeoJSONSeqSink._write
+    calls = []
+
+    def interrupted_write(self, gdf):
+        if "households" in str(self.path):
+            calls.append(len(gdf))
+            if len(calls) == interrupted_batch:
+                write(self, gdf.iloc[: len(gdf) // 2])
+                raise Interrupted
+        write(self, gdf)
+
+    monkeypatch.setattr(GeoJSONSeqSink, "_write", interrupted_write)
+    with pytest.raises(Interrupted):
+        generate(synthetic_dir, tmp_path / "resumed", resume=True)
+    monkeypatch.setattr(GeoJSONSeqSink, "_write", write)
+    assert checkpoint_dir("974", tmp_path / "resumed").is_dir()
+    generate(synthetic_dir, tmp_path / "resumed", resume=True)
+
+    assert outputs(tmp_path / "resumed") == outputs(tmp_path / "full")
+    for name in ("households_974", "population_974"):
+        for suffix in (".parquet", ".geojsons", ".yaml"):
+            assert (tmp_path / "resumed" / f"{name}{suffix}").read_bytes() == (
+                tmp_path / "full" / f"{name}{suffix}"
+            ).read_bytes()
+        # The GeoPackage files record their modification time
+        pd.testing.assert_frame_equal(
+            gpd.read_file(tmp_path / "resumed" / f"{name}.gpkg"), gpd.read_file(tmp_path / "full" / f"{name}.gpkg")
+        )
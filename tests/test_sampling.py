@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from popdbgen import AddressIndex, alias_tables, compact_addresses
+from popdbgen.households_gen import MULTIPLICITY, draw_addresses
+
+# The kernel as compiled by Numba (if installed) and as plain Python
+ALIAS_TABLES = [alias_tables, *([alias_tables.py_func] if hasattr(alias_tables, "py_func") else [])]
+
+
+def alias_distribution(probabilities: np.ndarray, aliases: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Probabilities of the rows of a group drawn with its alias tables."""
+    n = end - start
+    distribution = probabilities[start:end] / n
+    np.add.at(distribution, aliases[start:end], (1 - probabilities[start:end]) / n)
+    return distribution
+
+
+@pytest.mark.parametrize("kernel", ALIAS_TABLES)
+def test_alias_tables(kernel):
+    rng = np.random.default_rng(0)
+    sizes = [1, 2, 5, 40, 3, 17]
+    weights = rng.exponential(size=sum(sizes))
+    weights[rng.random(len(weights)) < 0.2] = 0
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    # A group without weights is drawn uniformly
+    weights[starts[4] : ends[4]] = 0
+    probabilities, aliases = kernel(weights, starts, ends)
+    assert ((probabilities >= 0) & (probabilities <= 1)).all()
+    for start, end in zip(starts, ends, strict=True):
+        assert ((aliases[start:end] >= 0) & (aliases[start:end] < end - start)).all()
+        group = weights[start:end]
+        expected = group / group.sum() if group.sum() > 0 else np.full(end - start, 1 / (end - start))
+        np.testing.assert_allclose(alias_distribution(probabilities, aliases, start, end), expected, atol=1e-12)
+
+
+def addresses_with_weights(nb_addresses: int, tile_id: str = "CRS2975RES200mN7640000E320000") -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    return pd.DataFrame(
+        {
+            "x": 320_000 + rng.random(nb_addresses) * 200,
+            "y": 7_640_000 + rng.random(nb_addresses) * 200,
+            "tile_id": tile_id,
+            "dwellings": rng.choice([0, 1, 2, 5, 20], nb_addresses),
+        }
+    )
+
+
+def assert_frequencies(draws: list, points: pd.DataFrame, probabilities: np.ndarray) -> None:
+    """Checks the frequencies of the drawn points against their probabilities (within 5 standard deviations)."""
+    drawn = pd.Series([(point.x, point.y) for point in draws]).value_counts()
+    counts = np.array([drawn.get((x, y), 0) for x, y in zip(points["x"], points["y"], strict=True)])
+    assert counts.sum() == len(draws)
+    expected = len(draws) * probabilities
+    assert (np.abs(counts - expected) <= 5 * np.sqrt(expected * (1 - probabilities)) + 1e-9).all()
+
+
+def test_weighted_draw_frequencies():
+    index = AddressIndex(addresses_with_weights(30), weights="dwellings")
+    addresses = index("CRS2975RES200mN7640000E320000")
+    tile = pd.Series({"men": 20_000})
+    draws = draw_addresses(tile, addresses, "974", np.random.default_rng(2))
+    weights = addresses["dwellings"].to_numpy()
+    assert_frequencies(draws, addresses, weights / weights.sum())
+
+
+def test_uniform_draw_frequencies():
+    index = AddressIndex(addresses_with_weights(30))
+    addresses = index("CRS2975RES200mN7640000E320000")
+    draws = draw_addresses(pd.Series({"men": 10_000}), addresses, "974", np.random.default_rng(3))
+    assert_frequencies(draws, addresses, np.full(len(addresses), 1 / len(addresses)))
+
+
+def test_compacted_draw_frequencies():
+    # Addresses sharing their coordinates (e.g. the numbers of a building)
+    ban = addresses_with_weights(12)
+    ban = ban.iloc[np.random.default_rng(4).choice(len(ban), 60)].reset_index(drop=True)
+    compacted = compact_addresses(ban, weights="dwellings")
+    assert len(compacted) == len(ban.drop_duplicates(["x", "y"]))
+    assert compacted[MULTIPLICITY].sum() == len(ban)
+    assert compacted["dwellings"].sum() == ban["dwellings"].sum()
+
+    # Drawn proportionally to their multiplicity, like the addresses they stand for
+    addresses = AddressIndex(ban, compact=True)("CRS2975RES200mN7640000E320000")
+    draws = draw_addresses(pd.Series({"men": 20_000}), addresses, "974", np.random.default_rng(5))
+    multiplicities = addresses[MULTIPLICITY].to_numpy()
+    assert_frequencies(draws, addresses, multiplicities / multiplicities.sum())
+    # Or to the sum of their weights
+    addresses = AddressIndex(ban, weights="dwellings", compact=True)("CRS2975RES200mN7640000E320000")
+    draws = draw_addresses(pd.Series({"men": 20_000}), addresses, "974", np.random.default_rng(6))
+    weights = addresses["dwellings"].to_numpy()
+    assert_frequencies(draws, addresses, weights / weights.sum())
+
+
+def test_negative_weights():
+    ban = addresses_with_weights(10)
+    ban.loc[3, "dwellings"] = -1
+    with pytest.raises(ValueError, match="non-negative"):
+        AddressIndex(ban, weights="dwellings")
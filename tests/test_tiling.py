@@ -0,0 +1,151 @@
+import gzip
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from popdbgen.tiling import EXTENT_BITS, WORLD_BITS, VectorTilesBuilder, lonlat_to_world
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+
+def households(n: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """Points clustered around a few places of La Réunion."""
+    rng = np.random.default_rng(seed)
+    centers = np.array([[55.45, -20.9], [55.5, -21.0], [55.6, -21.2]])
+    lonlat = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 0.03, (n, 2))
+    return gpd.GeoDataFrame(
+        {
+            "ID": [f"{seed}-{i:06d}" for i in range(n)],
+            "SIZE": rng.integers(1, 6, n),
+            "NIVEAU_VIE": rng.random(n) * 20_000,
+        },
+        geometry=gpd.points_from_xy(lonlat[:, 0], lonlat[:, 1]),
+        crs="EPSG:4326",
+    )
+
+
+def filo_tiles() -> gpd.GeoDataFrame:
+    """1 km squares around the households."""
+    x, y = np.meshgrid(np.arange(330_000, 380_000, 1000), np.arange(7_630_000, 7_680_000, 1000))
+    return gpd.GeoDataFrame(
+        {"Idcar": [f"c{i}" for i in range(x.size)], "ind": np.arange(x.size) / 10},
+        geometry=[shapely.box(x0, y0, x0 + 1000, y0 + 1000) for x0, y0 in zip(x.ravel(), y.ravel(), strict=True)],
+        crs="EPSG:2975",
+    )
+
+
+def read_tiles(path: Path) -> dict[tuple[int, int, int], tuple[int, dict]]:
+    """Size and decoded layers of the tiles of a MBTiles file, by (z, x, y)."""
+    with closing(sqlite3.connect(path)) as con:
+        rows = con.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+    return {
+        (z, x, (1 << z) - 1 - row): (
+            len(data),
+            mapbox_vector_tile.decode(gzip.decompress(data), default_options={"y_coord_down": True}),
+        )
+        for z, x, row, data in rows
+    }
+
+
+def build(tmp_path: Path, batches: list[gpd.GeoDataFrame], squares: gpd.GeoDataFrame | None = None, **options):
+    builder = VectorTilesBuilder(workers=0, spill_dir=tmp_path, **options)
+    for batch in batches:
+        builder.add_points("households", batch)
+    if squares is not None:
+        builder.add_squares("filo", squares, min_zoom=10)
+    path = tmp_path / "households.mbtiles"
+    builder.write(path)
+    return read_tiles(path)
+
+
+def test_points_are_all_kept_at_max_zoom(tmp_path):
+    batches = [households(3000, seed=1), households(2000, seed=2)]
+    tiles = build(tmp_path, batches, min_zoom=6, max_zoom=12, max_features=500)
+    points = gpd.GeoDataFrame(pd.concat(batches, ignore_index=True))
+    wx, wy = lonlat_to_world(points.geometry.x.to_numpy(), points.geometry.y.to_numpy())
+    shift = WORLD_BITS - EXTENT_BITS - 12
+    expected = {
+        point_id: ((x >> (WORLD_BITS - 12), y >> (WORLD_BITS - 12)), ((x >> shift) & 4095, (y >> shift) & 4095))
+        for point_id, x, y in zip(points["ID"], wx.tolist(), wy.tolist(), strict=True)
+    }
+    found = {}
+    for (z, x, y), (_, layers) in tiles.items():
+        features = layers["households"]["features"]
+        assert layers["households"]["extent"] == 4096
+        if z < 12:
+            assert 0 < len(features) <= 500
+            continue
+        for feature in features:
+            assert feature["geometry"]["type"] == "Point"
+            found[feature["properties"]["ID"]] = ((x, y), tuple(feature["geometry"]["coordinates"]))
+    assert found == expected
+    # Attributes of a few points
+    decoded = {
+        feature["properties"]["ID"]: feature["properties"]
+        for (z, _, _), (_, layers) in tiles.items()
+        if z == 12
+        for feature in layers["households"]["features"]
+    }
+    for row in points.head(20).itertuples():
+        assert decoded[row.ID]["SIZE"] == row.SIZE
+        assert decoded[row.ID]["NIVEAU_VIE"] == pytest.approx(row.NIVEAU_VIE)
+
+
+def test_tiles_fit_max_tile_bytes(tmp_path):
+    batch = households(20_000)
+    max_tile_bytes = 30_000
+    tiles = build(tmp_path, [batch], filo_tiles(), max_zoom=12, max_features=50_000, max_tile_bytes=max_tile_bytes)
+    unbounded = build(tmp_path, [batch], filo_tiles(), max_zoom=12, max_features=50_000, max_tile_bytes=None)
+    assert tiles.keys() == unbounded.keys()
+    assert max(size for size, _ in unbounded.values()) > max_tile_bytes
+    ids = set(batch["ID"])
+    for key, (size, layers) in tiles.items():
+        assert size <= max_tile_bytes
+        if "households" in layers:
+            assert {feature["properties"]["ID"] for feature in layers["households"]["features"]} <= ids
+        if unbounded[key][0] <= max_tile_bytes:
+            assert layers == unbounded[key][1]
+    # The households of the lowest zoom level were dropped
+    _, z0 = next(layers for (z, _, _), layers in tiles.items() if z == 0)
+    assert len(z0["households"]["features"]) < len(batch)
+
+
+def test_squares_layer(tmp_path):
+    squares = filo_tiles()
+    tiles = build(tmp_path, [households(100)], squares, max_zoom=12)
+    for (z, _, _), (_, layers) in tiles.items():
+        assert z >= 10 or "filo" not in layers
+        for feature in layers.get("filo", {}).get("features", []):
+            assert feature["geometry"]["type"] == "Polygon"
+            assert feature["properties"]["Idcar"].startswith("c")
+    # Each square is in (at least) one tile of each zoom level
+    for z in range(10, 13):
+        names = {
+            feature["properties"]["Idcar"]
+            for (tz, _, _), (_, layers) in tiles.items()
+            if tz == z and "filo" in layers
+            for feature in layers["filo"]["features"]
+        }
+        assert names == set(squares["Idcar"])
+
+
+def test_pmtiles_same_tiles(tmp_path):
+    pmtiles_reader = pytest.importorskip("pmtiles.reader")
+    builder = VectorTilesBuilder(max_zoom=10, workers=0, spill_dir=tmp_path)
+    builder.add_points("households", households(2000))
+    builder.write([tmp_path / "households.mbtiles", tmp_path / "households.pmtiles"])
+    with closing(sqlite3.connect(tmp_path / "households.mbtiles")) as con:
+        mbtiles = {
+            (z, x, (1 << z) - 1 - row): data
+            for z, x, row, data in con.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles")
+        }
+    with open(tmp_path / "households.pmtiles", "rb") as file:
+        reader = pmtiles_reader.Reader(pmtiles_reader.MmapSource(file))
+        assert reader.header()["max_zoom"] == 10
+        assert {zxy: reader.get(*zxy) for zxy in mbtiles} == mbtiles